@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+محرك تحليلات عمودي لبنود المبيعات
+Columnar analytics over sales line items
+"""
+
+from array import array
+from datetime import date, datetime
+from typing import Dict, List, Any, Optional, Tuple
+
+from money import Money
+from records import Sale
+
+try:
+    import numpy as np
+except ImportError:  # NumPy اختياري؛ بدونه تستخدم الحلقات العادية فوق array
+    np = None
+
+EPOCH = datetime(1970, 1, 1)
+
+# أعمدة المفاتيح المسموح التجميع بها، وأعمدة القيم المسموح جمعها
+GROUP_KEYS = ('day', 'month', 'product', 'payment')
+VALUES = ('amount', 'quantity')
+
+
+def to_minor(value) -> int:
+    """تحويل مبلغ إلى عدد صحيح بالهللات (أجزاء المئة)."""
+    if type(value) is Money:
+        return value.minor
+    return Money.of(value).minor
+
+
+def from_minor(value: int) -> Money:
+    """تحويل عدد الهللات إلى Money."""
+    return Money(int(value))
+
+
+class SalesColumns:
+    """
+    بنود المبيعات مخزنة كأعمدة (array من أعداد صحيحة 64 بت) بدلاً من قوائم
+    قواميس متداخلة. كل بند في كل فاتورة صف واحد. المبالغ بالهللات، والمنتجات
+    وطرق الدفع مرمزة كأرقام. يبنى عند التحميل ثم يضاف إليه عند كل بيع، فالتقارير
+    تجمع الأعمدة مباشرة (NumPy إن وجد) دون المرور على السجلات.
+    """
+
+    COLUMNS = ('timestamp', 'day', 'month', 'product', 'payment', 'quantity', 'price', 'amount')
+
+    def __init__(self):
+        self.product_ids: List[str] = []
+        self.product_names: List[str] = []
+        self.payment_methods: List[str] = []
+        self._product_code: Dict[str, int] = {}
+        self._payment_code: Dict[str, int] = {}
+        self._reset()
+
+    def _reset(self):
+        # timestamp بالثواني منذ 1970، day رقم اليوم (toordinal)، month = سنة*12 + شهر-1
+        # السجلات بتاريخ غير صالح تأخذ 0 في الأعمدة الزمنية الثلاثة
+        for name in self.COLUMNS:
+            setattr(self, name, array('q'))
+        self.product_ids.clear()
+        self.product_names.clear()
+        self.payment_methods.clear()
+        self._product_code.clear()
+        self._payment_code.clear()
+        self._np_cache: Dict[str, Any] = {}
+
+    def __len__(self) -> int:
+        return len(self.amount)
+
+    def rebuild(self, sales: List[Sale], when):
+        """إعادة البناء من الفواتير. when(collection, record) تعيد التاريخ المحلل (DataIndex.when)."""
+        self._reset()
+        for sale in sales:
+            self.add_sale(sale, when('sales', sale))
+
+    def _code(self, codes: Dict[str, int], values: List[str], key: str) -> int:
+        code = codes.get(key)
+        if code is None:
+            code = codes[key] = len(values)
+            values.append(key)
+        return code
+
+    def add_sale(self, sale: Sale, dt: Optional[datetime]):
+        """إضافة بنود فاتورة واحدة."""
+        if dt is None:
+            timestamp = day = month = 0
+        else:
+            timestamp = int((dt - EPOCH).total_seconds())
+            day = dt.toordinal()
+            month = dt.year * 12 + dt.month - 1
+        payment = self._code(self._payment_code, self.payment_methods, sale.payment_method or '')
+        items = sale.items
+        for item in items:
+            product_id = item.id or item.name
+            product = self._product_code.get(product_id)
+            if product is None:
+                product = self._code(self._product_code, self.product_ids, product_id)
+                self.product_names.append(item.name)
+            else:
+                # آخر اسم معروف للمنتج هو المعروض في التقارير
+                self.product_names[product] = item.name
+            self.product.append(product)
+            self.quantity.append(int(item.quantity))
+            self.price.append(to_minor(item.price))
+            self.amount.append(to_minor(item.total))
+        # الأعمدة المشتركة بين بنود الفاتورة تضاف دفعة واحدة
+        count = len(items)
+        self.timestamp.extend((timestamp,) * count)
+        self.day.extend((day,) * count)
+        self.month.extend((month,) * count)
+        self.payment.extend((payment,) * count)
+        self._np_cache.clear()
+
+    # --- التجميع ---
+    def _np(self, name: str):
+        """نسخة NumPy من العمود؛ تخزن حتى الإضافة التالية (الإضافة إلى array تمنع مشاركة الذاكرة)."""
+        column = self._np_cache.get(name)
+        if column is None:
+            column = self._np_cache[name] = np.frombuffer(getattr(self, name), dtype=np.int64).copy()
+        return column
+
+    def _label(self, key: str, value: int):
+        if key == 'day':
+            return date.fromordinal(value) if value else None
+        if key == 'month':
+            return (value // 12, value % 12 + 1) if value else None
+        if key == 'product':
+            return self.product_ids[value]
+        return self.payment_methods[value]
+
+    def group(self, key: str, value: str = 'amount', start: Optional[datetime] = None,
+              end: Optional[datetime] = None) -> Dict[Any, int]:
+        """
+        جمع عمود value (amount بالهللات أو quantity) لكل قيمة من key
+        (day أو month أو product أو payment)، للبنود بين start و end (end غير مشمول).
+        عند التجميع باليوم أو الشهر تستبعد البنود بتاريخ غير صالح.
+        """
+        if key not in GROUP_KEYS or value not in VALUES:
+            raise ValueError(f"تجميع غير معروف: {key}/{value}")
+        if not len(self):
+            return {}
+        lo = int((start - EPOCH).total_seconds()) if start is not None else None
+        hi = int((end - EPOCH).total_seconds()) if end is not None else None
+        drop_undated = key in ('day', 'month') or lo is not None or hi is not None
+        if np is not None:
+            totals = self._group_np(key, value, lo, hi, drop_undated)
+        else:
+            totals = self._group_py(key, value, lo, hi, drop_undated)
+        return {self._label(key, k): v for k, v in totals}
+
+    def _group_np(self, key, value, lo, hi, drop_undated) -> List[Tuple[int, int]]:
+        keys, values = self._np(key), self._np(value)
+        mask = None
+        if drop_undated:
+            mask = self._np('day') != 0
+        if lo is not None or hi is not None:
+            stamps = self._np('timestamp')
+            if lo is not None:
+                mask &= stamps >= lo
+            if hi is not None:
+                mask &= stamps < hi
+        if mask is not None:
+            keys, values = keys[mask], values[mask]
+        if not len(keys):
+            return []
+        order = np.argsort(keys, kind='stable')
+        keys, values = keys[order], values[order]
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        sums = np.add.reduceat(values, starts)
+        return list(zip(keys[starts].tolist(), sums.tolist()))
+
+    def _group_py(self, key, value, lo, hi, drop_undated) -> List[Tuple[int, int]]:
+        totals: Dict[int, int] = {}
+        keys, values = getattr(self, key), getattr(self, value)
+        if not drop_undated:
+            for k, v in zip(keys, values):
+                totals[k] = totals.get(k, 0) + v
+        else:
+            for k, v, day, stamp in zip(keys, values, self.day, self.timestamp):
+                if not day or (lo is not None and stamp < lo) or (hi is not None and stamp >= hi):
+                    continue
+                totals[k] = totals.get(k, 0) + v
+        return sorted(totals.items())
+
+    def top_products(self, n: int = 10, value: str = 'quantity', start: Optional[datetime] = None,
+                     end: Optional[datetime] = None) -> List[Tuple[str, int]]:
+        """أعلى n منتجات حسب الكمية أو المبلغ، كأزواج (الاسم، القيمة)."""
+        totals = self.group('product', value, start, end)
+        best = sorted(totals.items(), key=lambda pair: pair[1], reverse=True)[:n]
+        return [(self.product_name(product_id), total) for product_id, total in best]
+
+    def product_name(self, product_id: str) -> str:
+        """آخر اسم معروف للمنتج (مفتاح product في group)."""
+        return self.product_names[self._product_code[product_id]]
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+أرشيف الأشهر المغلقة: ملف مضغوط لكل شهر يحمل عند الحاجة
+Date-partitioned archive for closed periods
+
+التخطيط داخل مجلد الأرشيف:
+    sales-YYYY-MM.json.gz و expenses-YYYY-MM.json.gz   سجلات الشهر (صيغة JSON المعتادة)
+    manifest.json                                      إجماليات كل شهر محسوبة مسبقاً
+    ids.json.gz                                        معرف الفاتورة -> الشهر (للبحث برقم الفاتورة)
+
+ملفات الأشهر لا تعدل بعد كتابتها إلا إذا أضيفت سجلات بتاريخ قديم لاحقاً،
+فيعاد كتابة الشهر كاملاً (ملف مؤقت ثم إعادة تسمية).
+"""
+
+import gzip
+import json
+import os
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Iterator, List, Any, Optional, Tuple
+
+from indexes import parse_datetime
+from money import Money, ZERO
+from records import Record
+from storage import Change, decode_record, encode_record
+
+ARCHIVED = ("sales", "expenses")
+MANIFEST_VERSION = 1
+
+Month = Tuple[int, int]
+
+
+def month_key(month: Month) -> str:
+    return f"{month[0]:04d}-{month[1]:02d}"
+
+
+def parse_month_key(key: str) -> Month:
+    year, month = key.split('-')
+    return int(year), int(month)
+
+
+def month_bounds(month: Month) -> Tuple[datetime, datetime]:
+    """بداية الشهر وبداية الشهر التالي."""
+    year, number = month
+    return datetime(year, number, 1), datetime(year + number // 12, number % 12 + 1, 1)
+
+
+def write_gzip_json(path: str, obj: Any):
+    tmp_path = path + '.tmp'
+    with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+        json.dump(obj, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+
+def read_gzip_json(path: str) -> Any:
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def summarize(collection: str, records: List[Record]) -> Dict[str, Any]:
+    """إجماليات شهر واحد بصيغة قابلة للحفظ (المبالغ كنصوص)."""
+    total = ZERO
+    days: Dict[str, List[Any]] = {}
+    summary: Dict[str, Any] = {'count': len(records)}
+    if collection == 'sales':
+        by_payment: Dict[str, Money] = {}
+        products: Dict[str, List[Any]] = {}
+        quantity = 0
+        for sale in records:
+            total += sale.total
+            method = sale.payment_method or ''
+            by_payment[method] = by_payment.get(method, ZERO) + sale.total
+            day = days.setdefault(parse_datetime(sale.date).strftime("%Y-%m-%d"), [ZERO, 0])
+            day[0] += sale.total
+            day[1] += 1
+            for item in sale.items:
+                quantity += item.quantity
+                product = products.setdefault(item.id or item.name, [item.name, 0, ZERO])
+                product[0] = item.name
+                product[1] += item.quantity
+                product[2] += item.total
+        summary['quantity'] = quantity
+        summary['by_payment'] = {method: str(amount) for method, amount in by_payment.items()}
+        summary['products'] = {pid: [name, units, str(revenue)] for pid, (name, units, revenue) in products.items()}
+    else:
+        for expense in records:
+            total += expense.amount
+            day = days.setdefault(parse_datetime(expense.date).strftime("%Y-%m-%d"), [ZERO, 0])
+            day[0] += expense.amount
+            day[1] += 1
+    summary['total'] = str(total)
+    summary['days'] = {day: [str(amount), count] for day, (amount, count) in days.items()}
+    return summary
+
+
+class Archive:
+    """
+    مجلد الأرشيف. الإجماليات (manifest) تقرأ عند الفتح لأنها صغيرة، أما سجلات
+    الأشهر فتحمل عند أول طلب وتبقى آخر cache_size أشهر في الذاكرة.
+    """
+
+    def __init__(self, directory: str, cache_size: int = 6):
+        self.directory = directory
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[Tuple[str, Month], List[Dict[str, Any]]]" = OrderedDict()
+        self._ids: Optional[Dict[str, str]] = None
+        self.manifest: Dict[str, Any] = {'version': MANIFEST_VERSION, 'months': {}}
+        manifest_path = self._path('manifest.json')
+        if os.path.exists(manifest_path):
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                self.manifest = json.load(f)
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _partition_path(self, collection: str, month: Month) -> str:
+        return self._path(f"{collection}-{month_key(month)}.json.gz")
+
+    # --- القراءة ---
+    def months(self, collection: str = 'sales') -> List[Month]:
+        """الأشهر المؤرشفة لهذه المجموعة، من الأقدم إلى الأحدث."""
+        return sorted(parse_month_key(key) for key, entry in self.manifest['months'].items() if collection in entry)
+
+    def summary(self, collection: str, month: Month) -> Optional[Dict[str, Any]]:
+        return self.manifest['months'].get(month_key(month), {}).get(collection)
+
+    def summaries(self, collection: str) -> List[Tuple[Month, Dict[str, Any]]]:
+        return [(month, self.summary(collection, month)) for month in self.months(collection)]
+
+    def load(self, collection: str, month: Month) -> List[Dict[str, Any]]:
+        """سجلات شهر مؤرشف (مرتبة زمنياً). لا تعدل القائمة المعادة، فهي مشتركة عبر التخزين المؤقت."""
+        key = (collection, month)
+        records = self._cache.get(key)
+        if records is not None:
+            self._cache.move_to_end(key)
+            return records
+        path = self._partition_path(collection, month)
+        raw = read_gzip_json(path) if os.path.exists(path) else []
+        records = [decode_record(collection, r) for r in raw]
+        self._cache[key] = records
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return records
+
+    def _overlapping(self, collection: str, start: Optional[datetime],
+                     end: Optional[datetime]) -> Iterator[Tuple[Month, bool]]:
+        """الأشهر المؤرشفة التي تتقاطع مع [start, end)، مع True إذا كان الشهر كله داخل الفترة."""
+        for month in self.months(collection):
+            first, after = month_bounds(month)
+            if (end is not None and first >= end) or (start is not None and after <= start):
+                continue
+            yield month, (start is None or start <= first) and (end is None or after <= end)
+
+    def load_between(self, collection: str, start: Optional[datetime] = None,
+                     end: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """السجلات المؤرشفة بين start و end (end غير مشمول)؛ تحمل الأشهر المعنية فقط."""
+        found = []
+        for month, whole in self._overlapping(collection, start, end):
+            records = self.load(collection, month)
+            if whole:
+                found.extend(records)
+            else:
+                found.extend(r for r in records if (start is None or parse_datetime(r['date']) >= start)
+                             and (end is None or parse_datetime(r['date']) < end))
+        return found
+
+    def summaries_between(self, collection: str, start: Optional[datetime] = None,
+                          end: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """
+        إجماليات الأرشيف بين start و end: الأشهر الداخلة كاملة من الإجماليات المحفوظة،
+        والأشهر المقطوعة تحمل سجلاتها وتلخص (بنفس صيغة summarize).
+        """
+        summaries = []
+        for month, whole in self._overlapping(collection, start, end):
+            if whole:
+                summaries.append(self.summary(collection, month))
+            else:
+                first, after = month_bounds(month)
+                records = self.load_between(collection, max(start or first, first), min(end or after, after))
+                if records:
+                    summaries.append(summarize(collection, records))
+        return summaries
+
+    def find_sales(self, prefix: str) -> List[Dict[str, Any]]:
+        """الفواتير المؤرشفة التي يبدأ رقمها بـ prefix (يحمل الأشهر المعنية فقط)."""
+        prefix = prefix.strip()
+        if not prefix:
+            return []
+        if self._ids is None:
+            path = self._path('ids.json.gz')
+            self._ids = read_gzip_json(path) if os.path.exists(path) else {}
+        wanted: Dict[str, List[str]] = {}
+        for sale_id, key in self._ids.items():
+            if sale_id.startswith(prefix):
+                wanted.setdefault(key, []).append(sale_id)
+        found = []
+        for key, ids in wanted.items():
+            ids = set(ids)
+            found.extend(sale for sale in self.load('sales', parse_month_key(key)) if sale['id'] in ids)
+        return found
+
+    # --- الأرشفة ---
+    def archive(self, data: Dict[str, List[Dict[str, Any]]], before: datetime) -> List[Change]:
+        """
+        نقل المبيعات والمصروفات الأقدم من before إلى ملفات الأشهر، وإزالتها من data.
+        يعيد تغييرات الحذف لتمريرها إلى طبقة التخزين. السجلات بتاريخ غير صالح لا تؤرشف.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        changes: List[Change] = []
+        new_ids: Dict[str, str] = {}
+        for collection in ARCHIVED:
+            by_month: Dict[Month, List[Dict[str, Any]]] = {}
+            keep = []
+            for record in data[collection]:
+                dt = parse_datetime(record.get('date'))
+                if dt is None or dt >= before:
+                    keep.append(record)
+                else:
+                    by_month.setdefault((dt.year, dt.month), []).append(record)
+            for month, records in by_month.items():
+                key = month_key(month)
+                existing = self.load(collection, month) if collection in self.manifest['months'].get(key, {}) else []
+                # الدمج حسب المعرف حتى لا تتكرر السجلات إذا أعيدت الأرشفة بعد انقطاع
+                merged = {r['id']: r for r in existing}
+                merged.update((r['id'], r) for r in records)
+                ordered = sorted(merged.values(), key=lambda r: parse_datetime(r['date']))
+                write_gzip_json(self._partition_path(collection, month), [encode_record(collection, r) for r in ordered])
+                self._cache.pop((collection, month), None)
+                self.manifest['months'].setdefault(key, {})[collection] = summarize(collection, ordered)
+                if collection == 'sales':
+                    new_ids.update((r['id'], key) for r in records)
+                changes.extend((collection, 'delete', r['id']) for r in records)
+            data[collection][:] = keep
+        if new_ids:
+            if self._ids is None:
+                path = self._path('ids.json.gz')
+                self._ids = read_gzip_json(path) if os.path.exists(path) else {}
+            self._ids.update(new_ids)
+            write_gzip_json(self._path('ids.json.gz'), self._ids)
+        # الإجماليات تكتب أخيراً: ملفات الأشهر المكتوبة قبلها تبقى صالحة عند أي انقطاع
+        tmp_path = self._path('manifest.json.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, ensure_ascii=False)
+        os.replace(tmp_path, self._path('manifest.json'))
+        return changes
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+قياس زمن المسارات الساخنة بدون واجهة على أحجام بيانات مختلفة
+Headless hot-path benchmarks at several dataset sizes
+
+    python benchmarks/bench_core.py [--sizes 1000,10000,100000,1000000] [--backend json]
+                                    [--output النتائج.json] [--compare نتائج-سابقة.json]
+
+يقيس: التحميل (مع بناء الفهارس والملخصات)، الحفظ الكامل، تحديث لوحة المعلومات،
+البيع (كما في الواجهة: الحفظ في الخيط الخلفي)، البحث في السجل، وأعمدة التقارير.
+النتائج (بالثواني) تحفظ في benchmarks/results ما لم يحدد --output، وتكتب بعد كل
+حجم فلا تضيع القياسات الأصغر إذا نفدت الذاكرة في الحجم الأكبر (مليون فاتورة
+تحتاج عدة جيجابايت).
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Any, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import analytics
+from benchmarks.dataset import make_data, write_json
+from core import Cart, Store
+
+DEFAULT_SIZES = (1000, 10000, 100000, 1000000)
+# تاريخ "اليوم" في البيانات المولدة، حتى تكون لوحة المعلومات ثابتة بين التشغيلات
+NOW = datetime(2024, 6, 30, 18, 0, 0)
+SEARCH_QUERIES = ("أحمد", "عثمان", "s0000", "البحر")
+CHECKOUTS = 200
+# الفرق الذي يعتبر تراجعاً عند المقارنة بنتائج سابقة
+REGRESSION_RATIO = 1.2
+
+
+def best_of(func: Callable[[], Any], repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def dashboard(store: Store, today):
+    """نفس حسابات update_displays بدون عناصر الواجهة."""
+    summary = store.rollups.day(today)
+    texts = [f"{summary.sales_total:.2f}", f"{summary.expenses_total:.2f}", f"{summary.profit:.2f}"]
+    texts.extend(f"{item['name']} ({item['stock']})" for item in store.data['inventory'] if item['stock'] <= 3)
+    texts.extend(f"{sale['date']} - {sale['customer']} - {sale['total']:.2f}"
+                 for sale in store.index.timeline['sales'].latest(8))
+    texts.extend(f"{name} - {units}" for name, units, _ in store.leaderboard.top(5, days=7, today=today))
+    return texts
+
+
+def bench_size(size: int, backend: str, seed: int) -> Dict[str, float]:
+    repeat = 3 if size <= 10000 else 1
+    results: Dict[str, float] = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'sales_data.json')
+        start = time.perf_counter()
+        data = make_data(size, seed=seed, now=NOW)
+        write_json(data, path)
+        results['generate'] = time.perf_counter() - start
+        results['file_mb'] = os.path.getsize(path) / 1e6
+        products = data['inventory'][:20]
+        del data
+        # التخزينات الأخرى تستورد ملف JSON عند أول فتح؛ يتم ذلك قبل القياس
+        Store(path, backend).close()
+
+        def load():
+            loaded = Store(path, backend)
+            loaded.load()
+            loaded.close()
+
+        results['load'] = best_of(load, repeat)
+        store = Store(path, backend)
+        store.load()
+        results['save_all'] = best_of(store.save_all, repeat)
+        results['dashboard'] = best_of(lambda: dashboard(store, NOW.date()), repeat)
+
+        start = time.perf_counter()
+        store.sales_search.search(SEARCH_QUERIES[0])
+        results['search_build'] = time.perf_counter() - start
+        results['search'] = best_of(lambda: [store.sales_search.search(q) for q in SEARCH_QUERIES], repeat) / len(SEARCH_QUERIES)
+
+        results['report_columns'] = best_of(lambda: (setattr(store, '_sales_columns', None), store.sales_columns()), 1)
+        month_start = datetime(NOW.year, NOW.month, 1)
+        results['report_month'] = best_of(
+            lambda: (store.sales_columns().group('day', start=month_start, end=NOW + timedelta(days=1)),
+                     store.sales_columns().top_products(10, start=month_start)), repeat)
+        store.close()
+
+        # البيع كما في الواجهة: تعديل الذاكرة والفهارس، والكتابة في الخيط الخلفي
+        store = Store(path, backend, background=True, save_window=3600)
+        store.load()
+        cart = Cart()
+        start = time.perf_counter()
+        for i in range(CHECKOUTS):
+            product = products[i % len(products)]
+            product = store.index.product(product['id'])
+            if product['stock'] < 1:
+                product['stock'] = 1000
+            cart.add(product, 1)
+            store.checkout(cart, "أحمد الأمين", "نقدي")
+        results['checkout'] = (time.perf_counter() - start) / CHECKOUTS
+        start = time.perf_counter()
+        store.flush()
+        results['checkout_flush'] = time.perf_counter() - start
+        store.close()
+    return results
+
+
+def git_version() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current: Dict[str, Any], previous_path: str):
+    with open(previous_path, 'r', encoding='utf-8') as f:
+        previous = json.load(f)
+    print(f"\nمقارنة مع {previous.get('version')} ({previous_path}):")
+    for size, metrics in current['results'].items():
+        old = previous.get('results', {}).get(size)
+        if not old:
+            continue
+        for name, value in metrics.items():
+            if name in ('generate', 'file_mb') or not old.get(name):
+                continue
+            ratio = value / old[name]
+            flag = "  ⚠️ تراجع" if ratio > REGRESSION_RATIO else ""
+            print(f"  {size:>8} {name:<16} {old[name] * 1000:10.2f} ms -> {value * 1000:10.2f} ms  x{ratio:.2f}{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="قياس أداء المسارات الساخنة")
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)), help="أعداد الفواتير مفصولة بفواصل")
+    parser.add_argument('--backend', default='json', choices=('json', 'sqlite', 'journal', 'sharded', 'binary'))
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output')
+    parser.add_argument('--compare', help="ملف نتائج سابق للمقارنة")
+    args = parser.parse_args()
+
+    output = args.output or os.path.join(ROOT, 'benchmarks', 'results',
+                                         datetime.now().strftime("%Y%m%d-%H%M%S") + '.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    report: Dict[str, Any] = {
+        'version': git_version(),
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'numpy': analytics.np is not None,
+        'backend': args.backend,
+        'seed': args.seed,
+        'results': {},
+    }
+    for size in (int(s) for s in args.sizes.split(',') if s.strip()):
+        print(f"الفواتير: {size}", flush=True)
+        results = bench_size(size, args.backend, args.seed)
+        for name, value in results.items():
+            unit = "MB" if name == 'file_mb' else "ms"
+            shown = value if name == 'file_mb' else value * 1000
+            print(f"  {name:<16} {shown:10.2f} {unit}", flush=True)
+        report['results'][str(size)] = results
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\nالنتائج: {output}")
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ذاكرة البيانات المحملة: قاموس لكل سجل (الصيغة السابقة) مقابل سجلات records
+Benchmark: resident memory of loaded data, per-record dicts vs. slotted records
+
+    python benchmarks/bench_memory.py [عدد الفواتير] [--seed 42]
+
+كل قياس في عملية مستقلة، والقيم لكل 100 ألف فاتورة:
+    RSS          زيادة الذاكرة المقيمة للعملية بعد التحميل (تشمل ما يحتفظ به Python
+                 من ذاكرة JSON الخام بعد تحريرها)
+    البيانات     ما يبقى محجوزاً بعد تحرير JSON الخام (tracemalloc): السجلات ونصوصها
+"""
+
+import argparse
+import gc
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+MODES = ('dicts', 'records')
+PER_SALES = 100000
+
+
+def decode_dicts(raw):
+    """التحويل السابق لكل سجل: نسخة قاموس مع Money للمبالغ (للمقارنة فقط)."""
+    from money import Money
+
+    def decode(collection, record):
+        if collection == 'inventory':
+            return {**record, 'price': Money.of(record.get('price'))}
+        if collection == 'sales':
+            return {**record, 'total': Money.of(record.get('total')),
+                    'items': [{**i, 'price': Money.of(i.get('price')), 'total': Money.of(i.get('total'))}
+                              for i in record.get('items', [])]}
+        return {**record, 'amount': Money.of(record.get('amount'))}
+    return {name: [decode(name, r) for r in raw.get(name, [])] for name in ('inventory', 'sales', 'expenses', 'rentals')}
+
+
+def resident_bytes():
+    """الذاكرة المقيمة الحالية من /proc (Linux)، أو None."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def child(mode: str, path: str, traced: bool):
+    import storage
+    import tracemalloc
+    decode = decode_dicts if mode == 'dicts' else storage.decode_data
+    gc.collect()
+    if traced:
+        tracemalloc.start()
+    before = resident_bytes()
+    with open(path, 'r', encoding='utf-8') as f:
+        raw = json.load(f)
+    data = decode(raw)
+    del raw
+    gc.collect()
+    result = {'sales': len(data['sales'])}
+    if traced:
+        result['traced'] = tracemalloc.get_traced_memory()[0]
+    elif before is not None:
+        result['rss'] = resident_bytes() - before
+    print(json.dumps(result))
+
+
+def measure(mode: str, path: str, traced: bool):
+    args = [sys.executable, os.path.abspath(__file__), '--child', mode, path] + (['--traced'] if traced else [])
+    output = subprocess.run(args, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="قياس ذاكرة البيانات المحملة")
+    parser.add_argument('sales', nargs='?', type=int, default=PER_SALES)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--child', nargs=2, metavar=('MODE', 'PATH'), help=argparse.SUPPRESS)
+    parser.add_argument('--traced', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args.child[0], args.child[1], args.traced)
+        return
+
+    from benchmarks.dataset import make_data, write_json
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'sales_data.json')
+        write_json(make_data(args.sales, seed=args.seed), path)
+        print(f"الفواتير: {args.sales}  (الملف {os.path.getsize(path) / 1e6:.1f} MB)")
+        print(f"{'':10} {'RSS':>14} {'البيانات':>14}")
+        scale = PER_SALES / max(args.sales, 1)
+        totals = {}
+        for mode in MODES:
+            rss = measure(mode, path, traced=False).get('rss')
+            traced = measure(mode, path, traced=True)['traced']
+            totals[mode] = traced
+            rss_text = f"{rss * scale / 1e6:11.1f} MB" if rss is not None else f"{'-':>14}"
+            print(f"{mode:10} {rss_text:>14} {traced * scale / 1e6:11.1f} MB")
+        print(f"التوفير: {1 - totals['records'] / totals['dicts']:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+مقارنة زمن التحميل: json.load مع التحويل إلى Money مقابل اللقطة الثنائية
+Benchmark: json.load + Money conversion vs. binary snapshot load
+
+    python benchmarks/bench_snapshot.py [عدد الفواتير]
+"""
+
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import snapshot
+import storage
+from benchmarks.dataset import make_data, write_json
+
+
+def best_of(func, repeat: int = 3) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    sales_count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = os.path.join(tmp, 'data.json')
+        snap_path = os.path.join(tmp, 'data.bbs')
+        write_json(make_data(sales_count), json_path, indent=4)
+        snapshot.json_to_snapshot(json_path, snap_path)
+
+        def load_json():
+            with open(json_path, 'r', encoding='utf-8') as f:
+                return storage.decode_data(json.load(f))
+
+        assert load_json() == snapshot.load(snap_path)
+        json_time = best_of(load_json)
+        snap_time = best_of(lambda: snapshot.load(snap_path))
+        print(f"الفواتير: {sales_count}")
+        print(f"JSON:   {os.path.getsize(json_path) / 1e6:8.1f} MB  {json_time * 1000:8.1f} ms")
+        print(f"ثنائي:  {os.path.getsize(snap_path) / 1e6:8.1f} MB  {snap_time * 1000:8.1f} ms")
+        print(f"التسريع: {json_time / snap_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
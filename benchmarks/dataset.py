@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+مولد بيانات اصطناعية ثابتة (بذرة عشوائية) لقياس الأداء
+Seeded synthetic dataset generator
+
+    python benchmarks/dataset.py 100000 data.json [--products 2000] [--seed 42]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+from typing import Dict, List, Any
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import storage
+from money import Money
+from records import Expense, Product, Rental, Sale, SaleItem
+
+FIRST_NAMES = ["أحمد", "محمد", "فاطمة", "عائشة", "عمر", "خالد", "مريم", "سارة", "يوسف", "إبراهيم",
+               "حسن", "زينب", "علي", "نور", "هبة", "طارق", "سلمى", "مصطفى", "آمنة", "عبدالله"]
+LAST_NAMES = ["الأمين", "عثمان", "الطيب", "إدريس", "بابكر", "النور", "حامد", "الصديق", "يعقوب", "سليمان"]
+TITLE_WORDS = ["رحلة", "أسرار", "تاريخ", "حكايات", "مدخل إلى", "فن", "علم", "ديوان", "قصص", "موسوعة"]
+TOPICS = ["البحر", "الصحراء", "النيل", "الرياضيات", "الفلك", "الشعر", "الطبخ", "البرمجة", "الأطفال", "الفلسفة"]
+PAYMENT_METHODS = ["نقدي", "نقدي", "نقدي", "بنكك", "آجل"]
+EXPENSES = ["إيجار", "كهرباء", "رواتب", "شحن كتب", "صيانة", "ضيافة"]
+# نسبة العملاء المسجلين بالاسم (الباقي "عميل")
+NAMED_CUSTOMERS = 0.6
+# ثلث الفواتير تقريباً في آخر 30 يوماً حتى تكون لوحة المعلومات وتقارير الأسبوع غير فارغة
+RECENT_SHARE = 0.3
+
+
+def default_products(sales_count: int) -> int:
+    return max(100, min(20000, sales_count // 50))
+
+
+def make_data(sales_count: int, products_count: int = None, seed: int = 42,
+              now: datetime = None) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    بيانات بصيغة الذاكرة (Money للمبالغ) بالترتيب الزمني: products_count منتجاً،
+    sales_count فاتورة (1-4 بنود)، مصروف لكل 20 فاتورة، وإعارة لكل 100 فاتورة.
+    نفس البذرة ونفس now تعطي نفس البيانات دائماً.
+    """
+    rng = random.Random(seed)
+    now = now or datetime(2024, 6, 30, 18, 0, 0)
+    products_count = products_count or default_products(sales_count)
+    inventory = []
+    for i in range(products_count):
+        inventory.append(Product(
+            id=f"p{i:06d}",
+            name=f"{rng.choice(TITLE_WORDS)} {rng.choice(TOPICS)} - {i}",
+            price=Money(rng.randint(5, 400) * 500),
+            stock=rng.randint(0, 60),
+            description='',
+            barcode=f"978{i:010d}",
+        ))
+
+    # الأوقات: ثلثا الفواتير موزعة على السنتين السابقتين والباقي على آخر 30 يوماً
+    recent = int(sales_count * RECENT_SHARE)
+    old_start, recent_start = now - timedelta(days=760), now - timedelta(days=30)
+    stamps = [old_start + timedelta(seconds=rng.randrange(730 * 86400)) for _ in range(sales_count - recent)]
+    stamps += [recent_start + timedelta(seconds=rng.randrange(30 * 86400)) for _ in range(recent)]
+    stamps.sort()
+    # المنتجات الأولى أكثر مبيعاً (توزيع غير منتظم كما في المكتبات)
+    weights = [1 / (rank + 1) for rank in range(products_count)]
+    sales = []
+    for i, stamp in enumerate(stamps):
+        items = []
+        for product in {p.id: p for p in rng.choices(inventory, weights, k=rng.randint(1, 4))}.values():
+            quantity = rng.randint(1, 3)
+            items.append(SaleItem(product.id, product.name, product.price, quantity, product.price * quantity))
+        customer = (f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+                    if rng.random() < NAMED_CUSTOMERS else "عميل")
+        sales.append(Sale(
+            id=f"s{i:08d}",
+            date=stamp.strftime("%Y-%m-%d %H:%M:%S"),
+            customer=customer,
+            payment_method=rng.choice(PAYMENT_METHODS),
+            items=items,
+            total=Money.sum(item.total for item in items),
+        ))
+
+    expenses = []
+    for i, stamp in enumerate(stamps[::20]):
+        expenses.append(Expense(id=f"e{i:07d}", date=stamp.strftime("%Y-%m-%d %H:%M:%S"),
+                                description=rng.choice(EXPENSES), amount=Money.of(rng.randint(10, 2000))))
+
+    rentals = []
+    for i, stamp in enumerate(stamps[::100]):
+        book = rng.choice(inventory)
+        due = stamp + timedelta(days=rng.choice((7, 14, 30)))
+        rentals.append(Rental(
+            id=f"r{i:06d}", book_id=book.id, book_name=book.name,
+            renter_name=f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+            rental_date=stamp.strftime("%Y-%m-%d"), due_date=due.strftime("%Y-%m-%d"),
+            status='مُعَار' if due > now else 'تم إرجاعه',
+        ))
+    return {'inventory': inventory, 'sales': sales, 'expenses': expenses, 'rentals': rentals}
+
+
+def write_json(data: Dict[str, List[Dict[str, Any]]], path: str, indent: int = 2):
+    """كتابة البيانات بصيغة ملف sales_data.json."""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(storage.encode_data(data), f, ensure_ascii=False, indent=indent)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="توليد ملف بيانات اصطناعي")
+    parser.add_argument('sales', type=int)
+    parser.add_argument('output')
+    parser.add_argument('--products', type=int)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    write_json(make_data(args.sales, args.products, args.seed), args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+سطر أوامر للعمليات المجمعة بدون واجهة
+Command line for bulk jobs (no display needed)
+
+    python cli.py report --from 2024-01-01 --to 2024-01-31
+    python cli.py export sales sales.csv --from 2024-01-01
+    python cli.py import-sales sales.json
+    python cli.py import-products catalogue.csv
+    python cli.py recompute-stock opening.csv --since 2024-01-01
+    python cli.py archive --before 2024-06
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+import exporter
+import importer
+import metrics
+import storage
+from analytics import from_minor
+from core import CoreError, Store
+from money import Money, ZERO
+
+
+def parse_day(text: str) -> datetime:
+    return datetime.strptime(text, "%Y-%m-%d")
+
+
+def open_store(args) -> Store:
+    store = Store(args.data, args.backend)
+    store.load()
+    if store.load_error is not None:
+        raise CoreError(f"خطأ في تحميل البيانات: {store.load_error}")
+    return store
+
+
+def date_range(args):
+    """الفترة [from, to] من الخيارات؛ to يشمل اليوم كاملاً."""
+    start = args.start
+    end = args.end + timedelta(days=1) if args.end else None
+    return start, end
+
+
+def cmd_report(store: Store, args) -> int:
+    start, end = date_range(args)
+    columns = store.sales_columns()
+    if start is None and end is None:
+        totals = store.rollups.all_time
+        sales_total, sales_count, expenses_total = totals.sales_total, totals.sales_count, totals.expenses_total
+        payments = totals.by_payment
+    else:
+        # الأشهر المؤرشفة في الفترة من إجمالياتها؛ الشهر المقطوع يحمل من الأرشيف
+        archived_sales = store.archive.summaries_between('sales', start, end)
+        archived_expenses = store.archive.summaries_between('expenses', start, end)
+        sales = store.index.timeline['sales'].range(start, end)
+        sales_total = Money.sum(sale['total'] for sale in sales) + Money.sum(Money.of(s['total']) for s in archived_sales)
+        sales_count = len(sales) + sum(s['count'] for s in archived_sales)
+        expenses_total = (Money.sum(e['amount'] for e in store.index.timeline['expenses'].range(start, end))
+                          + Money.sum(Money.of(s['total']) for s in archived_expenses))
+        payments = {method: from_minor(amount) for method, amount in columns.group('payment', start=start, end=end).items()}
+        for summary in archived_sales:
+            for method, amount in summary['by_payment'].items():
+                payments[method] = payments.get(method, ZERO) + Money.of(amount)
+    print(f"المبيعات: {sales_total:.2f} ({sales_count} فاتورة)")
+    print(f"المصروفات: {expenses_total:.2f}")
+    print(f"صافي الربح: {sales_total - expenses_total:.2f}")
+    for method, amount in sorted(payments.items()):
+        print(f"  {method or 'غير محدد'}: {amount:.2f}")
+    print("الأكثر مبيعاً:")
+    if start is None and end is None:
+        best = [(name, units) for name, units, _ in store.leaderboard.top(args.top)]
+    else:
+        quantities = columns.group('product', 'quantity', start=start, end=end)
+        names = {product_id: columns.product_name(product_id) for product_id in quantities}
+        for summary in archived_sales:
+            for product_id, (name, count, _) in summary['products'].items():
+                quantities[product_id] = quantities.get(product_id, 0) + count
+                names.setdefault(product_id, name)
+        best = [(names[product_id], count) for product_id, count
+                in sorted(quantities.items(), key=lambda pair: pair[1], reverse=True)[:args.top]]
+    for name, units in best:
+        print(f"  {name}: {units}")
+    return 0
+
+
+def cmd_export(store: Store, args) -> int:
+    start, end = date_range(args)
+    if args.collection == 'sales':
+        header, rows = exporter.SALES_HEADER, exporter.sales_rows
+    else:
+        header, rows = exporter.EXPENSES_HEADER, exporter.expense_rows
+    records = store.archive.load_between(args.collection, start, end) + store.index.timeline[args.collection].range(start, end)
+    job = exporter.ExportJob(args.output, header, records, rows)
+    job.start()
+    job.join()
+    if job.error is not None:
+        raise job.error
+    print(f"تم تصدير {job.rows_written} صف إلى {args.output}")
+    return 0
+
+
+def cmd_import_sales(store: Store, args) -> int:
+    """استيراد فواتير من ملف JSON (قائمة فواتير أو نسخة احتياطية كاملة) بحفظ واحد."""
+    with open(args.file, 'r', encoding='utf-8') as f:
+        raw = json.load(f)
+    if isinstance(raw, dict):
+        raw = raw.get('sales', [])
+    changes: List[storage.Change] = []
+    skipped = 0
+    for record in raw:
+        if store.index.sale(record['id']) is not None:
+            skipped += 1
+            continue
+        changes.extend(store.record_sale(storage.decode_record('sales', record), adjust_stock=not args.no_stock))
+    if changes:
+        store.commit(changes)
+    imported = sum(1 for collection, _, _ in changes if collection == 'sales')
+    print(f"تم استيراد {imported} فاتورة (تم تخطي {skipped} موجودة مسبقاً)")
+    return 0
+
+
+def cmd_import_products(store: Store, args) -> int:
+    """استيراد المنتجات (إضافة أو تعديل بالمعرف/الباركود) من CSV أو JSON."""
+    report = importer.import_products(store, importer.read_rows(args.file), skip_invalid=args.skip_invalid)
+    for message in report.messages():
+        print(message, file=sys.stderr)
+    if not report.applied:
+        print(f"لم يتم الاستيراد: {len(report.errors)} خطأ", file=sys.stderr)
+        return 1
+    print(f"تمت إضافة {report.created} منتج وتعديل {report.updated} منتج")
+    return 0
+
+
+def cmd_recompute_stock(store: Store, args) -> int:
+    """الجرد الافتتاحي: ملف CSV بعمودين id و stock (أو barcode بدل id)."""
+    opening = {}
+    with open(args.file, 'r', newline='', encoding='utf-8-sig') as f:
+        for row in csv.DictReader(f):
+            product = store.index.product(row['id']) if row.get('id') else store.index.product_by_code(row.get('barcode', ''))
+            if product is None:
+                print(f"تحذير: منتج غير موجود: {row}", file=sys.stderr)
+                continue
+            opening[product['id']] = int(row['stock'])
+    changed = store.recompute_stock(opening, args.since)
+    print(f"تم تعديل مخزون {changed} منتج")
+    return 0
+
+
+def cmd_archive(store: Store, args) -> int:
+    before = datetime.strptime(args.before, "%Y-%m")
+    print(f"تمت أرشفة {store.archive_closed(before)} سجل")
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="BookBliss - عمليات مجمعة بدون واجهة")
+    parser.add_argument('--data', default="sales_data.json", help="ملف البيانات")
+    parser.add_argument('--backend', default=os.environ.get('BOOKBLISS_STORAGE', 'json'),
+                        choices=('json', 'sqlite', 'journal', 'sharded', 'binary'))
+    parser.add_argument('--timings', metavar='FILE', help="حفظ أزمنة العمليات كملف JSON بعد التنفيذ")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    def with_range(command):
+        command.add_argument('--from', dest='start', type=parse_day, help="YYYY-MM-DD")
+        command.add_argument('--to', dest='end', type=parse_day, help="YYYY-MM-DD (مشمول)")
+        return command
+
+    report = with_range(commands.add_parser('report', help="ملخص المبيعات والمصروفات"))
+    report.add_argument('--top', type=int, default=10)
+    report.set_defaults(run=cmd_report)
+
+    export = with_range(commands.add_parser('export', help="تصدير CSV"))
+    export.add_argument('collection', choices=('sales', 'expenses'))
+    export.add_argument('output')
+    export.set_defaults(run=cmd_export)
+
+    import_sales = commands.add_parser('import-sales', help="استيراد فواتير من JSON")
+    import_sales.add_argument('file')
+    import_sales.add_argument('--no-stock', action='store_true', help="عدم خصم الكميات من المخزون")
+    import_sales.set_defaults(run=cmd_import_sales)
+
+    import_products = commands.add_parser('import-products', help="استيراد المنتجات من CSV أو JSON")
+    import_products.add_argument('file')
+    import_products.add_argument('--skip-invalid', action='store_true', help="استيراد الصفوف الصحيحة وتجاهل الباقي")
+    import_products.set_defaults(run=cmd_import_products)
+
+    recompute = commands.add_parser('recompute-stock', help="إعادة حساب المخزون من جرد افتتاحي")
+    recompute.add_argument('file')
+    recompute.add_argument('--since', type=parse_day, required=True, help="تاريخ الجرد YYYY-MM-DD")
+    recompute.set_defaults(run=cmd_recompute_stock)
+
+    archive = commands.add_parser('archive', help="أرشفة الأشهر المغلقة")
+    archive.add_argument('--before', required=True, help="YYYY-MM: أرشفة ما قبل هذا الشهر")
+    archive.set_defaults(run=cmd_archive)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    try:
+        store = open_store(args)
+        try:
+            return args.run(store, args)
+        finally:
+            store.close()
+            if args.timings:
+                metrics.dump(args.timings)
+    except (CoreError, OSError, ValueError, KeyError) as e:
+        print(f"خطأ: {e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
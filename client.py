@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+عميل خادم نقاط البيع: نسخة محلية من البيانات تتحدث من الخادم
+Thin POS client over server.py
+
+القراءة (الفهارس والملخصات والبحث) من النسخة المحلية كما في Store العادي،
+وكل تعديل يرسل إلى الخادم ثم تطبق التغييرات الناتجة محلياً. خيط خلفي ينتظر
+تغييرات الأجهزة الأخرى، وتطبق في خيط الواجهة عبر poll().
+"""
+
+import json
+import os
+import queue
+import threading
+from datetime import datetime
+from typing import Dict, List, Any, Optional
+from urllib.error import HTTPError, URLError
+from urllib.request import Request, urlopen
+
+import storage
+from archive import Archive
+from core import Cart, CoreError, Store
+from importer import ImportReport
+
+# مدة انتظار التغييرات في كل طلب (أقل من MAX_WAIT في الخادم)
+LONG_POLL_SECONDS = 25
+REQUEST_TIMEOUT = 15
+# الانتظار قبل إعادة المحاولة عند انقطاع الاتصال
+RETRY_SECONDS = 3
+
+
+class RemoteStorage:
+    """طبقة تخزين للقراءة فقط: التحميل من الخادم، والحفظ يتم في الخادم نفسه."""
+
+    needs_full_data = False
+
+    def __init__(self, client: "RemoteStore"):
+        self.client = client
+
+    def exists(self) -> bool:
+        return True
+
+    def load(self) -> Dict[str, List[Dict[str, Any]]]:
+        snapshot = self.client.request('GET', '/data')
+        self.client.seq = snapshot['seq']
+        self.client.instance = snapshot.get('instance')
+        return storage.decode_data(snapshot['data'])
+
+    def commit(self, data, changes):
+        raise CoreError("التعديل يتم عبر الخادم")
+
+    save_all = commit
+
+    def close(self):
+        pass
+
+
+class RemoteStore(Store):
+    """Store يعمل على نسخة من بيانات الخادم؛ نفس واجهة Store للواجهة الرسومية."""
+
+    def __init__(self, url: str, token: Optional[str] = None):
+        self.url = url.rstrip('/')
+        self.token = token
+        self.data_file = self.url
+        self.storage = RemoteStorage(self)
+        # الأرشيف في جهاز الخادم؛ الأجهزة تعرض البيانات الحالية فقط
+        self.archive = Archive(os.path.join(os.path.expanduser('~'), '.bookbliss_remote_archive'))
+        self.load_error: Optional[Exception] = None
+        self.data = {name: [] for name in storage.COLLECTIONS}
+        self._sales_columns = None
+        self.listeners = []
+        self.seq = 0
+        # معرف تشغيل الخادم الذي تتبع له seq؛ يتغير إذا أعيد تشغيل الخادم
+        self.instance: Optional[str] = None
+        self._inbox: "queue.Queue[Dict[str, Any]]" = queue.Queue()
+        self._closing = threading.Event()
+        self._watcher: Optional[threading.Thread] = None
+
+    # --- الاتصال ---
+    def request(self, method: str, path: str, body: Any = None, timeout: float = REQUEST_TIMEOUT) -> Any:
+        data = json.dumps(body, ensure_ascii=False).encode('utf-8') if body is not None else None
+        req = Request(self.url + path, data=data, method=method)
+        req.add_header('Content-Type', 'application/json; charset=utf-8')
+        if self.token:
+            req.add_header('X-BookBliss-Token', self.token)
+        try:
+            with urlopen(req, timeout=timeout) as response:
+                return json.loads(response.read())
+        except HTTPError as e:
+            try:
+                reply = json.loads(e.read())
+            except ValueError:
+                raise CoreError(f"خطأ من الخادم: {e.code}")
+            if e.code == 409:
+                # العملية رفضت؛ ما نفذ قبلها في الدفعة يطبق من سجل التغييرات
+                self.sync()
+            raise CoreError(reply.get('error', f"خطأ من الخادم: {e.code}"))
+        except (URLError, OSError) as e:
+            raise CoreError(f"تعذر الاتصال بالخادم: {e}")
+
+    def batch(self, ops: List[Dict[str, Any]]) -> List[Any]:
+        """تنفيذ عدة عمليات في طلب واحد ثم تطبيق تغييراتها محلياً."""
+        reply = self.request('POST', '/batch', {'ops': ops})
+        self.sync()
+        return reply['results']
+
+    def call(self, op: str, **args) -> Any:
+        return self.batch([{'op': op, 'args': args}])[0]
+
+    # --- التحميل والمزامنة ---
+    def load(self):
+        super().load()
+        if self._watcher is None and self.load_error is None:
+            self._watcher = threading.Thread(target=self._watch, name="store-watcher", daemon=True)
+            self._watcher.start()
+
+    def _watch(self):
+        """ينتظر تغييرات الخادم ويضعها في الصندوق؛ لا يلمس البيانات (خيط الواجهة يطبقها)."""
+        since, instance = self.seq, self.instance
+        while not self._closing.is_set():
+            try:
+                reply = self.request('GET', f"/changes?since={since}&wait={LONG_POLL_SECONDS}",
+                                     timeout=LONG_POLL_SECONDS + REQUEST_TIMEOUT)
+            except CoreError:
+                self._closing.wait(RETRY_SECONDS)
+                continue
+            if reply['changes'] or reply['reset'] or reply.get('instance') != instance:
+                self._inbox.put(reply)
+            since, instance = reply['seq'], reply.get('instance')
+
+    def _apply(self, reply: Dict[str, Any]) -> bool:
+        # خادم أعيد تشغيله: أرقام التسلسل لا تقارن بما قبله
+        if (reply.get('instance') != self.instance or reply['reset']
+                or any(action == 'reset' for seq, _, action, _ in reply['changes'] if seq > self.seq)):
+            self.reload()
+            return True
+        changes = []
+        for seq, collection, action, payload in reply['changes']:
+            if seq <= self.seq:
+                continue
+            if action != 'delete':
+                payload = storage.decode_record(collection, payload)
+            changes.append((collection, action, payload))
+            self.seq = seq
+        if changes:
+            self.apply_changes(changes)
+        return bool(changes)
+
+    def sync(self) -> bool:
+        """جلب التغييرات الحالية وتطبيقها فوراً (بعد كل عملية من هذا الجهاز)."""
+        return self._apply(self.request('GET', f"/changes?since={self.seq}"))
+
+    def poll(self) -> bool:
+        """تطبيق تغييرات الأجهزة الأخرى التي وصلت؛ يعيد True إذا تغير شيء (يستدعى من خيط الواجهة)."""
+        changed = False
+        while True:
+            try:
+                reply = self._inbox.get_nowait()
+            except queue.Empty:
+                return changed
+            changed = self._apply(reply) or changed
+
+    def reload(self):
+        self.data = self.storage.load()
+        self.index.rebuild(self.data)
+        self.rebuild_derived()
+
+    def flush(self):
+        pass
+
+    def close(self, discard: bool = False):
+        self._closing.set()
+
+    def commit(self, changes):
+        raise CoreError("التعديل يتم عبر الخادم")
+
+    def save_all(self):
+        raise CoreError("التعديل يتم عبر الخادم")
+
+    # --- العمليات (تنفذ في الخادم) ---
+    @staticmethod
+    def _text(value) -> str:
+        return '' if value is None else str(value)
+
+    def checkout(self, cart: Cart, customer: str = '', payment_method: str = 'نقدي', status: Optional[str] = None,
+                 bank_details: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        if not len(cart):
+            raise CoreError("السلة فارغة")
+        items = [{'id': item['id'], 'quantity': item['quantity']} for item in cart]
+        reply = self.request('POST', '/checkout', {'items': items, 'customer': customer, 'payment_method': payment_method,
+                                                   'status': status, 'bank_details': bank_details})
+        self.sync()
+        cart.clear()
+        result = reply['results'][0]
+        # الفاتورة من رد الخادم إن لم تصل في سجل التغييرات
+        return self.index.sale(result['id']) or storage.decode_record('sales', result['sale'])
+
+    def save_product(self, name: str, price, stock, description: str = '', barcode: str = '',
+                     product: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        result = self.call('save_product', id=product['id'] if product else None, name=name, price=self._text(price),
+                           stock=self._text(stock), description=description, barcode=barcode)
+        return self.index.product(result['id'])
+
+    def delete_product(self, product_id: str):
+        self.call('delete_product', id=product_id)
+
+    def add_expense(self, description: str, amount) -> Dict[str, Any]:
+        return self.index.expense(self.call('add_expense', description=description, amount=self._text(amount))['id'])
+
+    def delete_expense(self, expense_id: str):
+        self.call('delete_expense', id=expense_id)
+
+    def add_rental(self, book_name: str, renter_name: str, duration) -> Dict[str, Any]:
+        result = self.call('add_rental', book_name=book_name, renter_name=renter_name, duration=self._text(duration))
+        return self.index.rental(result['id'])
+
+    def return_rental(self, rental_id: str) -> bool:
+        return self.call('return_rental', id=rental_id)
+
+    def recompute_stock(self, opening: Dict[str, int], since: datetime) -> int:
+        return self.call('recompute_stock', opening=opening, since=since.isoformat())
+
+    def import_products(self, rows, skip_invalid: bool = False) -> ImportReport:
+        result = self.call('import_products', rows=rows, skip_invalid=skip_invalid)
+        report = ImportReport()
+        report.created, report.updated, report.applied = result['created'], result['updated'], result['applied']
+        report.errors = [tuple(error) for error in result['errors']]
+        return report
+
+    def archive_closed(self, before: datetime) -> int:
+        return self.call('archive_closed', before=before.isoformat())
+
+    def replace_data(self, data: Dict[str, List[Dict[str, Any]]]):
+        self.call('replace_data', data=storage.encode_data(data))
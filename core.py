@@ -0,0 +1,433 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+منطق النظام بدون واجهة: السلة والبيع والمخزون والمصروفات والإعارات
+Headless core: cart, checkout, stock, expenses and rentals
+"""
+
+import os
+import queue
+import uuid
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Any, Iterator, Optional, Tuple
+
+import metrics
+import storage
+from analytics import SalesColumns
+from archive import Archive
+from indexes import DataIndex, parse_datetime
+from money import Money
+from records import Expense, Product, Rental, Sale, SaleItem
+from rollups import Leaderboard, Rollups
+from search import SalesSearch
+
+RENTED = 'مُعَار'
+RETURNED = 'تم إرجاعه'
+
+
+class CoreError(ValueError):
+    """خطأ في عملية (بيانات غير صالحة أو مخزون غير كافٍ)؛ الرسالة تعرض للمستخدم كما هي."""
+
+
+def parse_price(value) -> Money:
+    try:
+        price = Money.of(value if isinstance(value, Money) else str(value))
+    except ValueError:
+        raise CoreError("يرجى إدخال قيم صحيحة للسعر والكمية")
+    if price < 0:
+        raise CoreError("يرجى إدخال قيم صحيحة للسعر والكمية")
+    return price
+
+
+def parse_stock(value) -> int:
+    try:
+        stock = int(str(value).strip())
+    except ValueError:
+        raise CoreError("يرجى إدخال قيم صحيحة للسعر والكمية")
+    if stock < 0:
+        raise CoreError("يرجى إدخال قيم صحيحة للسعر والكمية")
+    return stock
+
+
+def now_text() -> str:
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+class Cart:
+    """سلة البيع: بنود بصيغة عناصر الفاتورة (تكرار المنتج يزيد كميته)."""
+
+    def __init__(self):
+        self.items: List[SaleItem] = []
+
+    def __iter__(self) -> Iterator[SaleItem]:
+        return iter(self.items)
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    @property
+    def total(self) -> Money:
+        return Money.sum(item['total'] for item in self.items)
+
+    def add(self, product: Dict[str, Any], quantity: int):
+        """إضافة كمية من منتج. يرفع CoreError إذا تجاوزت الكمية المخزون المتوفر."""
+        if quantity <= 0:
+            raise CoreError("يرجى إدخال كمية صحيحة")
+        existing = next((item for item in self.items if item['id'] == product['id']), None)
+        in_cart = existing['quantity'] if existing else 0
+        if product['stock'] < in_cart + quantity:
+            raise CoreError(f"الكمية المطلوبة تتجاوز المتوفر. المتوفر: {product['stock']}")
+        if existing:
+            existing['quantity'] += quantity
+            existing['total'] = existing['price'] * existing['quantity']
+        else:
+            self.items.append(SaleItem(product['id'], product['name'], product['price'], quantity,
+                                       product['price'] * quantity))
+
+    def clear(self):
+        self.items.clear()
+
+
+class Store:
+    """
+    البيانات وكل الفهارس والملخصات المشتقة منها مع طبقة التخزين والأرشيف.
+    كل عملية تعدل البيانات والفهارس معاً ثم تمرر التغييرات إلى التخزين،
+    وترفع CoreError بدل عرض أي رسالة، فتستخدم من الواجهة ومن سطر الأوامر.
+    """
+
+    def __init__(self, data_file: str, backend: str = 'json', indent: Optional[int] = 2,
+                 background: bool = False, on_error: Optional[Callable[[Exception], None]] = None,
+                 save_window: float = 1.0):
+        self.data_file = data_file
+        # تغييرات كتبتها نسخة أخرى من البرنامج في نفس الملف، تطبق عبر poll()
+        self._external: "queue.Queue[Tuple[List[storage.Change], Dict[str, int], int]]" = queue.Queue()
+        backend_storage = storage.open_storage(data_file, backend, indent=indent)
+        if background:
+            backend_storage = storage.BackgroundStorage(backend_storage, on_error=on_error, window=save_window,
+                                                        on_external=self._on_external)
+        self.storage = backend_storage
+        # الأشهر المغلقة تحفظ في الأرشيف ولا تحمل إلا عند الحاجة
+        self.archive = Archive(os.path.splitext(data_file)[0] + '_archive')
+        self.load_error: Optional[Exception] = None
+        self.data: Dict[str, List[Dict[str, Any]]] = {name: [] for name in storage.COLLECTIONS}
+        self._sales_columns: Optional[SalesColumns] = None
+        # تستدعى بعد كل حفظ بالتغييرات نفسها (خادم نقاط البيع ينشرها للأجهزة الأخرى)
+        self.listeners: List[Callable[[List[storage.Change]], None]] = []
+
+    @metrics.measured('load')
+    def load(self):
+        """تحميل البيانات وبناء الفهارس. عند فشل القراءة تبدأ البيانات فارغة ويحفظ الخطأ في load_error."""
+        try:
+            self.data = self.storage.load()
+        except Exception as e:
+            self.load_error = e
+            self.data = {name: [] for name in storage.COLLECTIONS}
+        self.index = DataIndex(self.data)
+        self.rebuild_derived()
+
+    def rebuild_derived(self):
+        """إعادة بناء الملخصات والبحث من البيانات الحالية (بعد الاستعادة أو الأرشفة)."""
+        self.rollups = Rollups()
+        self.rollups.rebuild(self.data, self.index.when)
+        self.sales_search = SalesSearch(self.data['sales'])
+        self.leaderboard = Leaderboard()
+        self.leaderboard.rebuild(self.data['sales'], self.index.when)
+        for month in sorted(set(self.archive.months('sales')) | set(self.archive.months('expenses'))):
+            sales_summary = self.archive.summary('sales', month)
+            self.rollups.add_archived(month, sales_summary, self.archive.summary('expenses', month))
+            if sales_summary:
+                self.leaderboard.add_archived(sales_summary)
+        # الأعمدة التحليلية تبنى عند أول طلب
+        self._sales_columns = None
+
+    def sales_columns(self) -> SalesColumns:
+        """بنود المبيعات كأعمدة للتقارير (تبنى مرة واحدة ثم تحدث مع كل بيع)."""
+        if self._sales_columns is None:
+            self._sales_columns = SalesColumns()
+            self._sales_columns.rebuild(self.data['sales'], self.index.when)
+        return self._sales_columns
+
+    # --- التخزين ---
+    @metrics.measured('commit')
+    def commit(self, changes: List[storage.Change]):
+        try:
+            external = self.storage.commit(self.data, changes)
+        except storage.StockConflict as e:
+            # نسخة أخرى باعت آخر القطع: الفاتورة حذفت من الملف فتحذف من هنا أيضاً
+            self.apply_changes(e.changes)
+            raise CoreError(str(e))
+        for listener in self.listeners:
+            listener(changes)
+        if external:
+            self.apply_changes(external)
+
+    def _on_external(self, changes: List[storage.Change], deltas: Dict[str, int], seq: int):
+        self._external.put((changes, deltas, seq))
+
+    def poll(self) -> bool:
+        """
+        تطبيق تغييرات النسخ الأخرى التي وصلت مع الحفظ الخلفي؛ يعيد True إذا تغير شيء
+        (من خيط الواجهة). الرصيد يضاف إليه الفرق لأن بيع هذا الجهاز قد يكون لم يحفظ بعد.
+        """
+        changed = False
+        while True:
+            try:
+                changes, deltas, seq = self._external.get_nowait()
+            except queue.Empty:
+                return changed
+            for collection, action, payload in changes:
+                product = self.index.product(payload['id']) if collection == 'inventory' and action != 'delete' else None
+                if product is not None and payload['id'] in deltas:
+                    payload['stock'] = product['stock'] + deltas[payload['id']]
+            self.apply_changes(changes)
+            self.storage.absorbed(seq)
+            changed = True
+
+    def apply_changes(self, changes: List[storage.Change]):
+        """
+        تطبيق تغييرات حفظت في مكان آخر (نسخة الخادم) على البيانات والفهارس
+        والملخصات دون حفظ. السجلات الموجودة تعدل في مكانها.
+        """
+        for collection, action, payload in changes:
+            record_id = payload if action == 'delete' else payload['id']
+            existing = self.index.by_id[collection].get(record_id)
+            if existing is not None and (action == 'delete' or collection in ('sales', 'expenses')):
+                # الفواتير والمصروفات تدخل في الملخصات، فتحذف ثم تضاف من جديد
+                if collection == 'sales':
+                    dt = self.index.when('sales', existing)
+                    self.rollups.remove_sale(existing, dt)
+                    self.leaderboard.remove_sale(existing, dt)
+                    self.sales_search.remove(existing)
+                    self._sales_columns = None
+                elif collection == 'expenses':
+                    self.rollups.remove_expense(existing, self.index.when('expenses', existing))
+                self.index.remove(collection, record_id)
+                existing = None
+            if action == 'delete':
+                continue
+            if collection == 'sales':
+                self.record_sale(payload, adjust_stock=False)
+            elif collection == 'expenses':
+                self.index.insert('expenses', payload)
+                self.rollups.add_expense(payload, self.index.when('expenses', payload))
+            elif existing is not None:
+                self.index.update(collection, existing, {key: payload[key] for key in payload.keys() if key != 'id'})
+            else:
+                self.index.insert(collection, payload)
+
+    def save_all(self):
+        self.storage.save_all(self.data)
+
+    def flush(self):
+        if hasattr(self.storage, 'flush'):
+            self.storage.flush()
+
+    def close(self, discard: bool = False):
+        if isinstance(self.storage, storage.BackgroundStorage):
+            self.storage.close(discard=discard)
+        else:
+            self.storage.close()
+
+    def replace_data(self, data: Dict[str, List[Dict[str, Any]]]):
+        """استبدال كل البيانات (الاستعادة من نسخة احتياطية)."""
+        self.data = data
+        self.index.rebuild(self.data)
+        self.rebuild_derived()
+        self.save_all()
+
+    @metrics.measured('archive')
+    def archive_closed(self, before: datetime) -> int:
+        """نقل المبيعات والمصروفات الأقدم من before إلى الأرشيف. يعيد عدد السجلات المنقولة."""
+        changes = self.archive.archive(self.data, before)
+        if changes:
+            self.commit(changes)
+            self.index.rebuild(self.data)
+            self.rebuild_derived()
+        return len(changes)
+
+    # --- المنتجات ---
+    def find_product(self, text: str) -> Optional[Dict[str, Any]]:
+        """المنتج بالاسم أو الباركود تماماً (بعد توحيد الحروف والتشكيل)؛ لا يختار اسماً جزئياً أو مشابهاً."""
+        return self.index.product_named(text) or self.index.product_by_code(text) or self.index.finder.best(text)
+
+    def save_product(self, name: str, price, stock, description: str = '', barcode: str = '',
+                     product: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """إضافة منتج جديد أو تعديل product. السعر والكمية قد تكون نصوصاً."""
+        name, description, barcode = name.strip(), description.strip(), barcode.strip()
+        if not name or price in (None, '') or stock in (None, ''):
+            raise CoreError("يرجى ملء جميع الحقول المطلوبة")
+        price, stock = parse_price(price), parse_stock(stock)
+        existing = self.index.product_named(name)
+        if existing and (product is None or existing['id'] != product['id']):
+            raise CoreError("اسم المنتج موجود بالفعل.")
+        existing = self.index.product_by_code(barcode) if barcode else None
+        if existing and (product is None or existing['id'] != product['id']):
+            raise CoreError(f"الباركود مستخدم للمنتج '{existing['name']}'")
+        fields = {'name': name, 'price': price, 'stock': stock, 'description': description, 'barcode': barcode}
+        if product is not None:
+            self.index.update('inventory', product, fields)
+            record = product
+        else:
+            record = Product(id=str(uuid.uuid4()), **fields)
+            self.index.insert('inventory', record)
+        self.commit([('inventory', 'upsert', record)])
+        return record
+
+    def import_products(self, rows, skip_invalid: bool = False):
+        """استيراد المنتجات بالجملة (انظر importer.import_products)."""
+        # الاستيراد هنا لأن importer يعتمد على هذه الوحدة
+        import importer
+        return importer.import_products(self, rows, skip_invalid)
+
+    def delete_product(self, product_id: str):
+        if self.index.remove('inventory', product_id) is not None:
+            self.commit([('inventory', 'delete', product_id)])
+
+    # --- المبيعات ---
+    def record_sale(self, sale: Dict[str, Any], adjust_stock: bool = True) -> List[storage.Change]:
+        """
+        إضافة فاتورة جاهزة إلى البيانات وكل الفهارس دون حفظ؛ يعيد التغييرات.
+        تستخدم في البيع وفي الاستيراد بالجملة (حفظ واحد للدفعة كلها).
+        """
+        self.index.insert('sales', sale)
+        dt = self.index.when('sales', sale)
+        self.rollups.add_sale(sale, dt)
+        self.sales_search.add(sale)
+        self.leaderboard.add_sale(sale, dt)
+        if self._sales_columns is not None:
+            self._sales_columns.add_sale(sale, dt)
+        changes = [('sales', 'upsert', sale)]
+        if adjust_stock:
+            for item in sale['items']:
+                product = self.index.product(item['id'])
+                if product:
+                    product['stock'] -= item['quantity']
+                    changes.append(('inventory', 'upsert', product))
+        return changes
+
+    @metrics.measured('checkout')
+    def checkout(self, cart: Cart, customer: str = '', payment_method: str = 'نقدي', status: Optional[str] = None,
+                 bank_details: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        إتمام البيع: تسجيل الفاتورة وخصم المخزون ثم تفريغ السلة. الكميات يعاد التحقق منها
+        على الرصيد الحالي، فقد يتغير بعد الإضافة إلى السلة (تعديل أو تغييرات نسخة أخرى).
+        """
+        if not len(cart):
+            raise CoreError("السلة فارغة")
+        for item in cart:
+            product = self.index.product(item['id'])
+            if product is None:
+                raise CoreError(f"المنتج '{item['name']}' لم يعد موجوداً")
+            if product['stock'] < item['quantity']:
+                raise CoreError(f"الكمية المطلوبة من '{item['name']}' تتجاوز المتوفر. المتوفر: {product['stock']}")
+        sale = Sale(
+            id=str(uuid.uuid4()),
+            date=now_text(),
+            customer=customer.strip() or "عميل",
+            payment_method=payment_method,
+            status=status,
+            items=[item.copy() for item in cart],
+            total=cart.total,
+            bank_details=bank_details
+        )
+        self.commit(self.record_sale(sale))
+        cart.clear()
+        return sale
+
+    # --- المصروفات ---
+    def add_expense(self, description: str, amount) -> Dict[str, Any]:
+        description = description.strip()
+        if not description or amount in (None, ''):
+            raise CoreError("يرجى ملء جميع الحقول")
+        try:
+            amount = Money.of(amount if isinstance(amount, Money) else str(amount))
+        except ValueError:
+            raise CoreError("يرجى إدخال مبلغ صحيح")
+        if amount <= 0:
+            raise CoreError("يرجى إدخال مبلغ صحيح")
+        expense = Expense(id=str(uuid.uuid4()), date=now_text(), description=description, amount=amount)
+        self.index.insert('expenses', expense)
+        self.rollups.add_expense(expense, self.index.when('expenses', expense))
+        self.commit([('expenses', 'upsert', expense)])
+        return expense
+
+    def delete_expense(self, expense_id: str):
+        expense = self.index.expense(expense_id)
+        if expense is None:
+            return
+        self.rollups.remove_expense(expense, self.index.when('expenses', expense))
+        self.index.remove('expenses', expense_id)
+        self.commit([('expenses', 'delete', expense_id)])
+
+    # --- الإعارات ---
+    def add_rental(self, book_name: str, renter_name: str, duration) -> Dict[str, Any]:
+        renter_name = renter_name.strip()
+        if not book_name or not renter_name or duration in (None, ''):
+            raise CoreError("يرجى ملء جميع الحقول")
+        try:
+            duration = int(str(duration).strip())
+        except ValueError:
+            raise CoreError("يرجى إدخال مدة صحيحة")
+        if duration <= 0:
+            raise CoreError("يرجى إدخال مدة صحيحة")
+        book = self.index.product_named(book_name)
+        if not book:
+            raise CoreError("الكتاب غير موجود")
+        if book['stock'] < 1:
+            raise CoreError(f"لا توجد نسخة متوفرة من '{book['name']}'. المتوفر: {book['stock']}")
+        book['stock'] -= 1
+        today = datetime.now()
+        rental = Rental(
+            id=str(uuid.uuid4()), book_id=book['id'], book_name=book_name,
+            renter_name=renter_name, rental_date=today.strftime("%Y-%m-%d"),
+            due_date=(today + timedelta(days=duration)).strftime("%Y-%m-%d"),
+            status=RENTED
+        )
+        self.index.insert('rentals', rental)
+        self.commit([('rentals', 'upsert', rental), ('inventory', 'upsert', book)])
+        return rental
+
+    def return_rental(self, rental_id: str) -> bool:
+        """تسجيل إرجاع كتاب معار وإعادته للمخزون. يعيد False إذا كان مرجعاً مسبقاً."""
+        rental = self.index.rental(rental_id)
+        if rental is None or rental['status'] == RETURNED:
+            return False
+        rental['status'] = RETURNED
+        changes = [('rentals', 'upsert', rental)]
+        book = self.index.product(rental['book_id'])
+        if book:
+            book['stock'] += 1
+            changes.append(('inventory', 'upsert', book))
+        self.commit(changes)
+        return True
+
+    @metrics.measured('recompute_stock')
+    def recompute_stock(self, opening: Dict[str, int], since: datetime) -> int:
+        """
+        إعادة حساب المخزون من جرد افتتاحي: الرصيد عند since (معرف المنتج -> الكمية)
+        ناقص ما بيع بعده وناقص الكتب المعارة حالياً منذ ذلك التاريخ. يعيد عدد المنتجات المعدلة.
+        المبيعات المؤرشفة منذ since تحسب أيضاً (تحمل أشهرها من الأرشيف فقط).
+        """
+        stock = dict(opening)
+        sales = []
+        for month in self.archive.months('sales'):
+            if month >= (since.year, since.month):
+                sales.extend(sale for sale in self.archive.load('sales', month)
+                             if (parse_datetime(sale.date) or datetime.min) >= since)
+        sales.extend(self.index.timeline['sales'].range(since))
+        for sale in sales:
+            for item in sale.items:
+                if item.id in stock:
+                    stock[item.id] -= item.quantity
+        for rental in self.index.timeline['rentals'].range(since):
+            if rental['status'] == RENTED and rental['book_id'] in stock:
+                stock[rental['book_id']] -= 1
+        changes = []
+        for product_id, count in stock.items():
+            product = self.index.product(product_id)
+            if product is not None and product['stock'] != count:
+                product['stock'] = count
+                changes.append(('inventory', 'upsert', product))
+        if changes:
+            self.commit(changes)
+        return len(changes)
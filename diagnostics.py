@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+نافذة التشخيص المخفية (Ctrl+Shift+D): أزمنة العمليات والتقاط cProfile
+Hidden diagnostics window over metrics.timings
+"""
+
+import tkinter as tk
+from datetime import datetime
+from tkinter import ttk, messagebox, filedialog
+
+import metrics
+
+# فترة تحديث الجدول (بالمللي ثانية)
+REFRESH_MS = 1000
+
+
+class DiagnosticsWindow:
+    """جدول p50/p95/الأقصى لكل عملية مع العدادات، وحفظ JSON، وتشغيل/إيقاف cProfile."""
+
+    COLUMNS = ('العملية', 'العدد', 'p50 (ms)', 'p95 (ms)', 'الأقصى (ms)', 'الأخير (ms)')
+
+    def __init__(self, parent):
+        self.win = tk.Toplevel(parent)
+        self.win.title("التشخيص")
+        self.win.geometry("760x560")
+
+        self.tree = ttk.Treeview(self.win, columns=self.COLUMNS, show='headings', height=12)
+        for col in self.COLUMNS:
+            self.tree.heading(col, text=col)
+            self.tree.column(col, width=110, anchor='center')
+        self.tree.column(self.COLUMNS[0], width=170, anchor='w')
+        self.tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=(10, 5))
+
+        self.counters_label = tk.Label(self.win, anchor='w', justify=tk.LEFT)
+        self.counters_label.pack(fill=tk.X, padx=10)
+
+        buttons = tk.Frame(self.win)
+        buttons.pack(fill=tk.X, padx=10, pady=5)
+        tk.Button(buttons, text="حفظ JSON", command=self.save_json).pack(side=tk.LEFT, padx=5)
+        self.profile_button = tk.Button(buttons, command=self.toggle_profile)
+        self.profile_button.pack(side=tk.LEFT, padx=5)
+        tk.Button(buttons, text="تصفير", command=self.reset).pack(side=tk.LEFT, padx=5)
+        tk.Button(buttons, text="إغلاق", command=self.win.destroy).pack(side=tk.RIGHT, padx=5)
+
+        self.profile_text = tk.Text(self.win, height=10, wrap=tk.NONE, font=('Courier', 9))
+        self.profile_text.pack(fill=tk.BOTH, expand=True, padx=10, pady=(0, 10))
+
+        self._after = None
+        self.win.bind('<Destroy>', self._on_destroy)
+        self.update_profile_button()
+        self.refresh()
+
+    def refresh(self):
+        report = metrics.snapshot()
+        self.tree.delete(*self.tree.get_children())
+        for name, stats in report['operations'].items():
+            self.tree.insert('', 'end', values=(name, stats['count'], f"{stats['p50_ms']:.1f}", f"{stats['p95_ms']:.1f}",
+                                                f"{stats['max_ms']:.1f}", f"{stats['last_ms']:.1f}"))
+        counters = "  ".join(f"{name}: {value}" for name, value in sorted(report['counters'].items()))
+        self.counters_label.config(text=f"منذ {report['since']}   {counters}")
+        self._after = self.win.after(REFRESH_MS, self.refresh)
+
+    def _on_destroy(self, event):
+        if event.widget is self.win and self._after is not None:
+            self.win.after_cancel(self._after)
+            self._after = None
+
+    def save_json(self):
+        path = filedialog.asksaveasfilename(
+            defaultextension=".json", filetypes=[("JSON files", "*.json")], parent=self.win,
+            initialfile=f"timings_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+        if not path:
+            return
+        try:
+            metrics.dump(path)
+        except OSError as e:
+            messagebox.showerror("خطأ", f"خطأ في الحفظ: {e}", parent=self.win)
+
+    def reset(self):
+        metrics.timings.reset()
+
+    def update_profile_button(self):
+        self.profile_button.config(text="⏹ إيقاف cProfile" if metrics.profiler.running else "⏺ بدء cProfile")
+
+    def toggle_profile(self):
+        if not metrics.profiler.running:
+            metrics.profiler.start()
+            self.update_profile_button()
+            return
+        path = filedialog.asksaveasfilename(
+            defaultextension=".prof", filetypes=[("cProfile", "*.prof")], parent=self.win,
+            title="حفظ الالتقاط (اختياري)", initialfile=f"profile_{datetime.now().strftime('%Y%m%d_%H%M%S')}.prof")
+        try:
+            text = metrics.profiler.stop(path or None)
+        except OSError as e:
+            messagebox.showerror("خطأ", f"خطأ في الحفظ: {e}", parent=self.win)
+            text = ''
+        self.update_profile_button()
+        self.profile_text.delete('1.0', tk.END)
+        self.profile_text.insert('1.0', text)
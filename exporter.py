@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+تصدير CSV تدريجي في خيط خلفي مع تقدم وإلغاء
+Streaming, cancellable CSV export
+"""
+
+import csv
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Any, Iterable, Iterator, Optional
+
+import metrics
+
+SALES_HEADER = ['رقم الفاتورة', 'التاريخ', 'العميل', 'طريقة الدفع', 'الحالة', 'اسم المنتج', 'الكمية', 'السعر', 'الإجمالي للمنتج', 'الإجمالي للفاتورة']
+EXPENSES_HEADER = ['التاريخ', 'الوصف', 'المبلغ (SDG)']
+
+
+def sales_rows(sale: Dict[str, Any]) -> Iterator[List[Any]]:
+    """صف لكل بند في الفاتورة."""
+    for item in sale['items']:
+        yield [sale['id'], sale['date'], sale['customer'], sale['payment_method'], sale.get('status', ''),
+               item['name'], item['quantity'], item['price'], item['total'], sale['total']]
+
+
+def expense_rows(expense: Dict[str, Any]) -> Iterator[List[Any]]:
+    yield [expense['date'], expense['description'], expense['amount']]
+
+
+class ExportJob:
+    """
+    كتابة السجلات إلى CSV في خيط خلفي على دفعات. الصفوف تولد عند الحاجة
+    من rows(record)، والملف يكتب أولاً باسم مؤقت ثم يعاد تسميته عند الاكتمال،
+    فالإلغاء أو الفشل لا يترك ملفاً ناقصاً. done و total و finished تقرأ من
+    خيط الواجهة (عبر root.after) لعرض التقدم.
+    """
+
+    def __init__(self, path: str, header: List[str], records: List[Dict[str, Any]],
+                 rows: Callable[[Dict[str, Any]], Iterable[List[Any]]], chunk_size: int = 1000):
+        self.path = path
+        self.header = header
+        # records نسخة (شريحة) من القائمة تؤخذ في خيط الواجهة قبل البدء
+        self.records = records
+        self.rows = rows
+        self.chunk_size = chunk_size
+        self.total = len(records)
+        self.done = 0
+        self.rows_written = 0
+        self.error: Optional[Exception] = None
+        self.finished = False
+        self._cancel = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="csv-export", daemon=True)
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def start(self):
+        self._thread.start()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def join(self, timeout: Optional[float] = None):
+        self._thread.join(timeout)
+
+    def _run(self):
+        tmp_path = self.path + '.part'
+        started = time.perf_counter()
+        try:
+            with open(tmp_path, 'w', newline='', encoding='utf-8-sig', buffering=1024 * 1024) as f:
+                writer = csv.writer(f)
+                writer.writerow(self.header)
+                for start in range(0, self.total, self.chunk_size):
+                    if self._cancel.is_set():
+                        break
+                    chunk = [row for record in self.records[start:start + self.chunk_size] for row in self.rows(record)]
+                    writer.writerows(chunk)
+                    self.rows_written += len(chunk)
+                    self.done = min(start + self.chunk_size, self.total)
+            if self._cancel.is_set():
+                os.remove(tmp_path)
+            else:
+                os.replace(tmp_path, self.path)
+                metrics.timings.record('export', time.perf_counter() - started)
+                metrics.count('export_rows', self.rows_written)
+        except Exception as e:
+            self.error = e
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        finally:
+            self.finished = True
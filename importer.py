@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+استيراد المنتجات بالجملة من CSV أو JSON
+Bulk inventory import
+
+كل صف يطابق منتجاً موجوداً بالمعرف (id) ثم بالباركود، فيعدل؛ وإلا يضاف منتج جديد.
+التحقق يتم على الملف كاملاً قبل أي تعديل، وتجمع كل الأخطاء في مرور واحد.
+"""
+
+import csv
+import json
+import os
+import uuid
+from typing import Dict, List, Any, Optional, Tuple
+
+import metrics
+from core import CoreError, parse_price, parse_stock
+from indexes import DataIndex, normalize_name
+from records import Product
+from scanner import normalize_barcode
+
+# أسماء الأعمدة المقبولة (الإنجليزية كما في ملف البيانات، والعربية كما في الواجهة)
+COLUMNS = {
+    'id': 'id', 'المعرف': 'id',
+    'barcode': 'barcode', 'isbn': 'barcode', 'الباركود': 'barcode', 'الباركود / isbn': 'barcode',
+    'name': 'name', 'الاسم': 'name', 'اسم المنتج': 'name',
+    'price': 'price', 'السعر': 'price',
+    'stock': 'stock', 'المخزون': 'stock', 'الكمية': 'stock',
+    'description': 'description', 'الوصف': 'description',
+}
+
+# (المنتج الموجود أو None، الحقول الجديدة، المعرف المطلوب للمنتج الجديد)
+Plan = Tuple[Optional[Dict[str, Any]], Dict[str, Any], str]
+
+
+def _normalize_row(raw: Dict[str, Any]) -> Dict[str, Any]:
+    row = {}
+    for key, value in raw.items():
+        field = COLUMNS.get(str(key).strip().casefold()) if key is not None else None
+        if field is not None:
+            row[field] = value
+    return row
+
+
+def read_rows(path: str) -> List[Tuple[int, Dict[str, Any]]]:
+    """
+    قراءة ملف CSV (بصف عناوين) أو JSON (قائمة منتجات أو نسخة احتياطية كاملة).
+    يعيد أزواج (رقم السطر، الصف) ليشير إليها تقرير الأخطاء.
+    """
+    if os.path.splitext(path)[1].lower() == '.json':
+        with open(path, 'r', encoding='utf-8') as f:
+            raw = json.load(f)
+        if isinstance(raw, dict):
+            raw = raw.get('inventory', [])
+        if not isinstance(raw, list):
+            raise CoreError("ملف JSON يجب أن يحتوي قائمة منتجات")
+        return [(number, _normalize_row(item) if isinstance(item, dict) else {})
+                for number, item in enumerate(raw, 1)]
+    with open(path, 'r', newline='', encoding='utf-8-sig') as f:
+        # السطر 1 هو صف العناوين
+        return [(number, _normalize_row(item)) for number, item in enumerate(csv.DictReader(f), 2)]
+
+
+def _text(value) -> str:
+    return '' if value is None else str(value).strip()
+
+
+class ImportReport:
+    """نتيجة الاستيراد: عدد المضاف والمعدل، والأخطاء كأزواج (رقم السطر، الرسالة)."""
+
+    def __init__(self):
+        self.created = 0
+        self.updated = 0
+        self.errors: List[Tuple[int, str]] = []
+        self.applied = False
+
+    def messages(self, limit: Optional[int] = None) -> List[str]:
+        errors = self.errors if limit is None else self.errors[:limit]
+        return [f"السطر {number}: {message}" for number, message in errors]
+
+
+def plan_products(rows: List[Tuple[int, Dict[str, Any]]], index: DataIndex) -> Tuple[List[Plan], List[Tuple[int, str]]]:
+    """
+    التحقق من كل الصفوف دون تعديل أي شيء. التكرار داخل الملف يكشف بمجموعة
+    مفاتيح (المعرف والباركود والاسم الموحد) بدل مقارنة كل صف بكل المنتجات.
+    """
+    plans: List[Plan] = []
+    errors: List[Tuple[int, str]] = []
+    seen: Dict[Tuple[str, str], int] = {}
+    for number, row in rows:
+        problems = []
+        product_id, barcode, name = _text(row.get('id')), _text(row.get('barcode')), _text(row.get('name'))
+        target = index.product(product_id) if product_id else None
+        if target is None and barcode and not product_id:
+            target = index.product_by_code(barcode)
+
+        fields: Dict[str, Any] = {}
+        if name:
+            fields['name'] = name
+        elif target is None:
+            problems.append("اسم المنتج مطلوب")
+        for field, parse, label in (('price', parse_price, "السعر"), ('stock', parse_stock, "الكمية")):
+            value = _text(row.get(field))
+            if value:
+                try:
+                    fields[field] = parse(value)
+                except CoreError:
+                    problems.append(f"قيمة {label} غير صالحة: {value}")
+            elif target is None:
+                problems.append(f"حقل {label} مطلوب")
+        if 'description' in row:
+            fields['description'] = _text(row['description'])
+        if 'barcode' in row:
+            fields['barcode'] = barcode
+
+        keys = [('id', target['id'] if target else product_id), ('barcode', normalize_barcode(barcode)),
+                ('name', normalize_name(name))]
+        for kind, key in keys:
+            if not key:
+                continue
+            first = seen.setdefault((kind, key), number)
+            if first != number:
+                problems.append(f"مكرر في الملف مع السطر {first}")
+        if name:
+            other = index.product_named(name)
+            if other is not None and other is not target:
+                problems.append(f"اسم المنتج موجود بالفعل: {name}")
+        if barcode:
+            other = index.product_by_code(barcode)
+            if other is not None and other is not target:
+                problems.append(f"الباركود مستخدم للمنتج '{other['name']}'")
+
+        if problems:
+            errors.extend((number, problem) for problem in problems)
+        else:
+            plans.append((target, fields, product_id))
+    return plans, errors
+
+
+@metrics.measured('import_products')
+def import_products(store, rows: List[Tuple[int, Dict[str, Any]]], skip_invalid: bool = False) -> ImportReport:
+    """
+    تطبيق الاستيراد على store (core.Store) بحفظ واحد للدفعة كلها. إذا وجدت أخطاء
+    لا يعدل شيء إلا مع skip_invalid، فتطبق الصفوف الصحيحة وتبقى الأخطاء في التقرير.
+    """
+    report = ImportReport()
+    plans, report.errors = plan_products(rows, store.index)
+    if report.errors and not skip_invalid:
+        return report
+    changes = []
+    for target, fields, product_id in plans:
+        if target is not None:
+            store.index.update('inventory', target, fields)
+            record = target
+            report.updated += 1
+        else:
+            record = Product(**{'id': product_id or str(uuid.uuid4()), 'description': '', 'barcode': '', **fields})
+            store.index.insert('inventory', record)
+            report.created += 1
+        changes.append(('inventory', 'upsert', record))
+    if changes:
+        store.commit(changes)
+    report.applied = True
+    return report
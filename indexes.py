@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+فهارس البحث السريع في بيانات النظام
+Hash indexes over inventory, sales, expenses and rentals
+"""
+
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from typing import Dict, List, Any, Iterator, Optional, Tuple
+
+from scanner import normalize_barcode
+from search import ProductFinder
+
+INDEXED = ("inventory", "sales", "expenses", "rentals")
+
+# المجموعات التي تحفظ مرتبة زمنياً، وحقل التاريخ المستخدم للترتيب
+TIMELINES = {"sales": "date", "expenses": "date", "rentals": "rental_date"}
+
+# حقول التاريخ التي تحلل مرة واحدة عند التحميل والإضافة
+DATE_FIELDS = {
+    "sales": ("date",),
+    "expenses": ("date",),
+    "rentals": ("rental_date", "due_date"),
+}
+DATE_FORMATS = ("%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S.%f", "%Y-%m-%d")
+
+
+def parse_datetime(value) -> Optional[datetime]:
+    """تحليل سلسلة التاريخ بأحد التنسيقات المعروفة. يعيد None إذا فشل التحليل."""
+    try:
+        # fromisoformat يغطي التنسيقات الثلاثة وهو أسرع بكثير من strptime
+        dt = datetime.fromisoformat(value)
+        return dt.replace(tzinfo=None) if dt.tzinfo else dt
+    except (ValueError, TypeError):
+        pass
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt)
+        except (ValueError, TypeError):
+            continue
+    return None
+
+
+def normalize_name(name: str) -> str:
+    """توحيد اسم المنتج للمقارنة: إزالة المسافات الزائدة وتجاهل حالة الأحرف."""
+    return ' '.join(str(name).split()).casefold()
+
+
+class NewestFirst:
+    """عرض بدون نسخ لقائمة مرتبة زمنياً، من الأحدث إلى الأقدم."""
+
+    __slots__ = ('records',)
+
+    def __init__(self, records: List[Dict[str, Any]]):
+        self.records = records
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __getitem__(self, index: int) -> Dict[str, Any]:
+        return self.records[-1 - index]
+
+
+class TimeIndex:
+    """
+    قائمة سجلات مرتبة زمنياً (أغلب الإضافات في النهاية، وإلا bisect).
+    السجلات بتاريخ غير صالح تعامل كأقدم السجلات.
+    """
+
+    def __init__(self):
+        self.keys: List[datetime] = []
+        self.records: List[Dict[str, Any]] = []
+
+    def build(self, pairs: List[Tuple[datetime, Dict[str, Any]]]):
+        """البناء دفعة واحدة من أزواج (التاريخ، السجل)؛ البيانات غالباً مرتبة مسبقاً."""
+        pairs = sorted(pairs, key=lambda pair: pair[0])
+        self.keys = [key for key, _ in pairs]
+        self.records = [record for _, record in pairs]
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def insert(self, key: Optional[datetime], record: Dict[str, Any]):
+        key = key or datetime.min
+        if not self.keys or key >= self.keys[-1]:
+            self.keys.append(key)
+            self.records.append(record)
+            return
+        pos = bisect_right(self.keys, key)
+        self.keys.insert(pos, key)
+        self.records.insert(pos, record)
+
+    def remove(self, key: Optional[datetime], record: Dict[str, Any]):
+        key = key or datetime.min
+        pos = bisect_left(self.keys, key)
+        while pos < len(self.keys) and self.keys[pos] == key:
+            if self.records[pos] is record:
+                del self.keys[pos]
+                del self.records[pos]
+                return
+            pos += 1
+
+    def latest(self, n: int) -> List[Dict[str, Any]]:
+        """أحدث n سجلات، الأحدث أولاً."""
+        return self.records[:-n - 1:-1] if n > 0 else []
+
+    def range(self, start: Optional[datetime] = None, end: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """السجلات في الفترة [start, end) بالترتيب الزمني."""
+        lo = bisect_left(self.keys, start) if start is not None else 0
+        hi = bisect_left(self.keys, end) if end is not None else len(self.keys)
+        return self.records[lo:hi]
+
+    def newest_first(self) -> Iterator[Dict[str, Any]]:
+        """المرور على السجلات من الأحدث إلى الأقدم."""
+        return reversed(self.records)
+
+    def newest_view(self) -> NewestFirst:
+        """تسلسل مفهرس من الأحدث إلى الأقدم (للجداول الافتراضية)."""
+        return NewestFirst(self.records)
+
+
+class DataIndex:
+    """
+    فهارس تحافظ على نفسها عند كل إضافة وتعديل وحذف:
+    المنتج بالمعرف وبالاسم الموحد وبالباركود وبالبحث التقريبي، والفاتورة والمصروف والإعارة بالمعرف،
+    والتواريخ المحللة مسبقاً مع قائمة السجلات ذات التواريخ غير الصالحة،
+    وترتيب زمني للمبيعات والمصروفات والإعارات.
+    كل التعديلات على القوائم يجب أن تمر عبر هذه الفئة حتى تبقى الفهارس صحيحة.
+    """
+
+    def __init__(self, data: Dict[str, List[Dict[str, Any]]]):
+        self.data = data
+        self.rebuild()
+
+    def rebuild(self, data: Optional[Dict[str, List[Dict[str, Any]]]] = None):
+        """إعادة بناء كل الفهارس (عند التحميل أو الاستعادة فقط)."""
+        if data is not None:
+            self.data = data
+        self.by_id: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self.positions: Dict[str, Dict[str, int]] = {}
+        for collection in INDEXED:
+            records = self.data[collection]
+            self.by_id[collection] = {r.id: r for r in records}
+            self.positions[collection] = {r.id: i for i, r in enumerate(records)}
+        # كل الأسماء الموحدة مع المنتجات التي تحملها بترتيب الإضافة؛ البحث يعيد أولها،
+        # وحذف أحد منتجين بنفس الاسم ('Book' و 'book ') يبقي الآخر قابلاً للبحث
+        self.product_by_name: Dict[str, List[Dict[str, Any]]] = {}
+        for product in self.data['inventory']:
+            self._add_name(product)
+        # مثل الأسماء: باركود مكرر بين منتجين لا يضيع عند حذف أحدهما
+        self.product_by_barcode: Dict[str, List[Dict[str, Any]]] = {}
+        for product in self.data['inventory']:
+            self._add_barcode(product)
+        # البحث التقريبي بالاسم لنقطة البيع (يبنى عند أول بحث)
+        self.finder = ProductFinder(self.data['inventory'])
+        self.dates: Dict[Tuple[str, str], Dict[str, datetime]] = {
+            (collection, field): {} for collection, fields in DATE_FIELDS.items() for field in fields
+        }
+        # السجلات التي تعذر تحليل تاريخها: (المجموعة، الحقل، السجل)
+        self.quarantine: List[Tuple[str, str, Dict[str, Any]]] = []
+        for collection in DATE_FIELDS:
+            for record in self.data[collection]:
+                self._parse_dates(collection, record)
+        self.timeline: Dict[str, TimeIndex] = {}
+        for collection, field in TIMELINES.items():
+            dates = self.dates[(collection, field)]
+            self.timeline[collection] = TimeIndex()
+            self.timeline[collection].build([(dates.get(r.id, datetime.min), r) for r in self.data[collection]])
+
+    # --- البحث ---
+    def get(self, collection: str, record_id: str) -> Optional[Dict[str, Any]]:
+        return self.by_id[collection].get(record_id)
+
+    def product(self, product_id: str) -> Optional[Dict[str, Any]]:
+        return self.by_id['inventory'].get(product_id)
+
+    def product_named(self, name: str) -> Optional[Dict[str, Any]]:
+        products = self.product_by_name.get(normalize_name(name))
+        return products[0] if products else None
+
+    def product_by_code(self, code: str) -> Optional[Dict[str, Any]]:
+        """المنتج بالباركود أو ISBN (بدون مسافات أو شرطات)."""
+        products = self.product_by_barcode.get(normalize_barcode(code))
+        return products[0] if products else None
+
+    def sale(self, sale_id: str) -> Optional[Dict[str, Any]]:
+        return self.by_id['sales'].get(sale_id)
+
+    def expense(self, expense_id: str) -> Optional[Dict[str, Any]]:
+        return self.by_id['expenses'].get(expense_id)
+
+    def rental(self, rental_id: str) -> Optional[Dict[str, Any]]:
+        return self.by_id['rentals'].get(rental_id)
+
+    def when(self, collection: str, record: Dict[str, Any], field: str = 'date') -> Optional[datetime]:
+        """التاريخ المحلل مسبقاً للسجل، أو None إذا كان التاريخ غير صالح."""
+        return self.dates[(collection, field)].get(record.id)
+
+    def sort_key(self, collection: str, field: str = 'date'):
+        """دالة ترتيب حسب التاريخ المحلل مسبقاً (السجلات غير الصالحة في النهاية)."""
+        dates = self.dates[(collection, field)]
+        return lambda record: dates.get(record.id, datetime.min)
+
+    def quarantine_summary(self, limit: int = 20) -> List[str]:
+        """وصف مختصر للسجلات المعزولة بسبب تاريخ غير صالح."""
+        names = {'sales': "فاتورة", 'expenses': "مصروف", 'rentals': "إعارة"}
+        lines = [f"{names[c]} {str(r['id'])[:8]}: {f} = '{r.get(f)}'" for c, f, r in self.quarantine[:limit]]
+        if len(self.quarantine) > limit:
+            lines.append(f"... و {len(self.quarantine) - limit} سجلات أخرى")
+        return lines
+
+    # --- تحليل التواريخ ---
+    def _parse_dates(self, collection: str, record: Dict[str, Any]):
+        for field in DATE_FIELDS.get(collection, ()):
+            dt = parse_datetime(getattr(record, field))
+            if dt is None:
+                self.quarantine.append((collection, field, record))
+            else:
+                self.dates[(collection, field)][record.id] = dt
+
+    def _forget_dates(self, collection: str, record: Dict[str, Any]):
+        for field in DATE_FIELDS.get(collection, ()):
+            self.dates[(collection, field)].pop(record['id'], None)
+        if self.quarantine:
+            self.quarantine = [q for q in self.quarantine if q[2] is not record]
+
+    # --- التعديل ---
+    def insert(self, collection: str, record: Dict[str, Any]):
+        """إضافة سجل جديد إلى القائمة والفهارس."""
+        records = self.data[collection]
+        self.positions[collection][record['id']] = len(records)
+        records.append(record)
+        self.by_id[collection][record['id']] = record
+        if collection == 'inventory':
+            self._add_name(record)
+            self._add_barcode(record)
+            self.finder.add(record)
+        self._parse_dates(collection, record)
+        if collection in TIMELINES:
+            self.timeline[collection].insert(self.when(collection, record, TIMELINES[collection]), record)
+
+    def update(self, collection: str, record: Dict[str, Any], fields: Dict[str, Any]):
+        """تعديل حقول سجل موجود مع تحديث فهرس الاسم والباركود إذا تغيرا."""
+        if collection == 'inventory' and 'barcode' in fields:
+            self._drop_barcode(record)
+            fields = dict(fields)
+            record['barcode'] = fields.pop('barcode')
+            self._add_barcode(record)
+        if collection == 'inventory' and 'name' in fields:
+            self._drop_name(record)
+            record.update(fields)
+            self._add_name(record)
+            self.finder.rename(record)
+        elif any(field in fields for field in DATE_FIELDS.get(collection, ())):
+            if collection in TIMELINES:
+                self.timeline[collection].remove(self.when(collection, record, TIMELINES[collection]), record)
+            self._forget_dates(collection, record)
+            record.update(fields)
+            self._parse_dates(collection, record)
+            if collection in TIMELINES:
+                self.timeline[collection].insert(self.when(collection, record, TIMELINES[collection]), record)
+        else:
+            record.update(fields)
+
+    def remove(self, collection: str, record_id: str) -> Optional[Dict[str, Any]]:
+        """
+        حذف سجل بمعرفه في O(1): ينقل آخر عنصر إلى مكان المحذوف بدل إعادة
+        بناء القائمة. ترتيب القائمة لا يحفظ بعد الحذف؛ الترتيب الزمني في timeline.
+        """
+        record = self.by_id[collection].pop(record_id, None)
+        if record is None:
+            return None
+        records = self.data[collection]
+        positions = self.positions[collection]
+        pos = positions.pop(record_id)
+        last = records.pop()
+        if last is not record:
+            records[pos] = last
+            positions[last['id']] = pos
+        if collection == 'inventory':
+            self._drop_name(record)
+            self._drop_barcode(record)
+            self.finder.remove(record)
+        if collection in TIMELINES:
+            self.timeline[collection].remove(self.when(collection, record, TIMELINES[collection]), record)
+        self._forget_dates(collection, record)
+        return record
+
+    def _add_name(self, product: Dict[str, Any]):
+        self.product_by_name.setdefault(normalize_name(product.name), []).append(product)
+
+    def _drop_name(self, product: Dict[str, Any]):
+        key = normalize_name(product.name)
+        products = self.product_by_name.get(key)
+        if products:
+            products[:] = [p for p in products if p is not product]
+            if not products:
+                del self.product_by_name[key]
+
+    def _add_barcode(self, product: Dict[str, Any]):
+        code = normalize_barcode(product.barcode)
+        if code:
+            self.product_by_barcode.setdefault(code, []).append(product)
+
+    def _drop_barcode(self, product: Dict[str, Any]):
+        code = normalize_barcode(product.barcode)
+        products = self.product_by_barcode.get(code) if code else None
+        if products:
+            products[:] = [p for p in products if p is not product]
+            if not products:
+                del self.product_by_barcode[code]
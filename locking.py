@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+قفل استشاري بين العمليات على ملف البيانات
+Advisory cross-process file lock (fcntl on POSIX, msvcrt on Windows)
+"""
+
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# فترة إعادة المحاولة على Windows (msvcrt لا ينتظر أكثر من 10 ثوانٍ)
+RETRY_SECONDS = 0.05
+
+
+class FileLock:
+    """
+    قفل حصري على ملف جانبي (path.lock) طوال كتلة with. يحترمه كل من يستخدم
+    نفس القفل فقط (استشاري)، ويحرر تلقائياً إذا انتهت العملية. غير قابل لإعادة الدخول.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    def __enter__(self):
+        self._file = open(self.path, 'a+b')
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+            else:
+                self._file.seek(0)
+                while True:
+                    try:
+                        msvcrt.locking(self._file.fileno(), msvcrt.LK_NBLCK, 1)
+                        break
+                    except OSError:
+                        time.sleep(RETRY_SECONDS)
+        except BaseException:
+            self._file.close()
+            self._file = None
+            raise
+        return self
+
+    def __exit__(self, *exc):
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            else:
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+        finally:
+            self._file.close()
+            self._file = None
+        return False
@@ -27,12 +27,38 @@ import json
 import os
 from datetime import datetime, timedelta
 import uuid
-from decimal import Decimal, getcontext
-import csv
+from itertools import islice
 from typing import Dict, List, Any, Optional
 
-# ضبط دقة الحسابات المالية
-getcontext().prec = 10  # Precision for Decimal calculations
+import exporter
+import importer
+import metrics
+import storage
+from analytics import from_minor
+from client import RemoteStore
+from core import Cart, CoreError, Store
+from diagnostics import DiagnosticsWindow
+from indexes import NewestFirst
+from money import Money, ZERO
+from search import SalesSearch
+from scanner import ScanListener
+from virtual_tree import VirtualTree
+
+# نوع التخزين: json (الافتراضي) أو sqlite أو journal أو sharded أو binary
+STORAGE_BACKEND = os.environ.get('BOOKBLISS_STORAGE', 'json')
+# نافذة دمج عمليات الحفظ في الخيط الخلفي (بالثواني): كل التغييرات خلالها تكتب مرة واحدة
+SAVE_WINDOW_SECONDS = 10.0
+# عنوان خادم نقاط البيع المشترك (server.py)؛ إذا حدد يعمل البرنامج كجهاز بيع متصل به
+SERVER_URL = os.environ.get('BOOKBLISS_SERVER')
+SERVER_TOKEN = os.environ.get('BOOKBLISS_TOKEN')
+# فترة تطبيق تغييرات الأجهزة الأخرى أو النسخ الأخرى على نفس الملف (بالمللي ثانية)
+STORE_POLL_MS = 500
+# مهلة انتظار توقف الكتابة قبل تنفيذ البحث (بالمللي ثانية)
+SEARCH_DEBOUNCE_MS = 250
+# أقصى عدد من المنتجات المقترحة في قائمة نقطة البيع
+PRODUCT_SUGGESTIONS = 30
+# أقصى عدد من أخطاء الاستيراد المعروضة في رسالة واحدة
+IMPORT_ERRORS_SHOWN = 20
 
 # --- واجهة وتصميم ---
 # استخدام نفس الألوان المطلوبة في ثيم مخصص
@@ -60,87 +86,69 @@ class SalesManagementSystem:
         self.data_file = "bookbliss_data.json"
         self.load_data()
 
-        self.cart = []
-        self.cart_total = Decimal('0.00')
+        self.cart = Cart()
         
         self.create_widgets()
         self.update_dashboard()
+        self.root.after(STORE_POLL_MS, self.poll_store)
 
         # الحفظ التلقائي عند الإغلاق
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
 
     def on_closing(self):
         """يتم استدعاؤها عند إغلاق النافذة الرئيسية."""
-        if messagebox.askokcancel("إغلاق", "هل تريد إغلاق البرنامج؟ سيتم حفظ البيانات تلقائياً."):
-            self.save_data()
-            self.root.destroy()
+        if not messagebox.askokcancel("إغلاق", "هل تريد إغلاق البرنامج؟ سيتم حفظ البيانات تلقائياً."):
+            return
+        if self.export_job is not None:
+            # تصدير غير مكتمل لا يترك ملفاً ناقصاً
+            self.export_job.cancel()
+            self.export_job.join()
+        try:
+            self.store.flush()
+        except Exception as e:
+            # الحفظ الأخير فشل: لا نغلق إلا بموافقة المستخدم
+            if not messagebox.askyesno("خطأ في الحفظ", f"لم يتمكن من حفظ البيانات: {e}\nهل تريد الإغلاق رغم ذلك؟ ستفقد التغييرات غير المحفوظة."):
+                return
+        self.store.close(discard=True)
+        self.root.destroy()
 
     def load_data(self):
-        """تحميل البيانات من ملف JSON وتحويل الأرقام إلى Decimal."""
-        default_data = {"inventory": [], "sales": [], "expenses": [], "rentals": []}
-        if os.path.exists(self.data_file):
-            try:
-                with open(self.data_file, 'r', encoding='utf-8') as f:
-                    raw_data = json.load(f)
-                
-                self.data = default_data
-                self.data['inventory'] = [
-                    {**item, 'price': Decimal(item.get('price', '0'))} 
-                    for item in raw_data.get('inventory', [])
-                ]
-                self.data['sales'] = [
-                    {**sale, 'total': Decimal(sale.get('total', '0')), 
-                     'items': [{**i, 'price': Decimal(i.get('price', '0')), 'total': Decimal(i.get('total', '0'))} for i in sale.get('items', [])]}
-                    for sale in raw_data.get('sales', [])
-                ]
-                self.data['expenses'] = [
-                    {**exp, 'amount': Decimal(exp.get('amount', '0'))} 
-                    for exp in raw_data.get('expenses', [])
-                ]
-                self.data['rentals'] = [
-                    {**rent, 'amount': Decimal(rent.get('amount', '0'))}
-                    for rent in raw_data.get('rentals', [])
-                ]
-
-            except (json.JSONDecodeError, KeyError) as e:
-                messagebox.showerror("خطأ في تحميل البيانات", f"الملف تالف أو غير متوافق. سيتم إنشاء ملف جديد.\n{e}")
-                self.data = default_data
+        """تحميل البيانات عبر core.Store، أو من خادم نقاط البيع إذا حدد BOOKBLISS_SERVER."""
+        if SERVER_URL:
+            self.store = RemoteStore(SERVER_URL, SERVER_TOKEN)
         else:
-            self.data = default_data
-        
-        if not self.data['inventory']:
-            self.data['inventory'].append({
-                'id': str(uuid.uuid4()), 'name': 'منتج افتراضي', 'price': Decimal('500.00'), 
-                'stock': 10, 'description': 'منتج للاختبار'
-            })
+            self.store = Store(self.data_file, STORAGE_BACKEND, indent=4, background=True,
+                               on_error=self.report_save_error, save_window=SAVE_WINDOW_SECONDS)
+        self.store.load()
+        if self.store.load_error is not None and SERVER_URL:
+            messagebox.showerror("خطأ في الاتصال بالخادم", f"تعذر تحميل البيانات من الخادم: {self.store.load_error}")
+            return
+        if self.store.load_error is not None:
+            messagebox.showerror("خطأ في تحميل البيانات", f"الملف تالف أو غير متوافق. سيتم إنشاء ملف جديد.\n{self.store.load_error}")
 
-    def save_data(self):
-        """حفظ البيانات إلى ملف JSON مع تحويل Decimal إلى string."""
-        try:
-            data_to_save = {
-                'inventory': [{**item, 'price': str(item['price'])} for item in self.data['inventory']],
-                'sales': [
-                    {**sale, 'total': str(sale['total']), 
-                     'items': [{**i, 'price': str(i['price']), 'total': str(i['total'])} for i in sale['items']]}
-                    for sale in self.data['sales']
-                ],
-                'expenses': [{**exp, 'amount': str(exp['amount'])} for exp in self.data['expenses']],
-                'rentals': [{**rent, 'amount': str(rent['amount'])} for rent in self.data['rentals']]
-            }
-            with open(self.data_file, 'w', encoding='utf-8') as f:
-                json.dump(data_to_save, f, ensure_ascii=False, indent=4)
-        except Exception as e:
-            messagebox.showerror("خطأ في الحفظ", f"لم يتمكن من حفظ البيانات: {e}")
+        if not self.store.data['inventory']:
+            self.store.save_product('منتج افتراضي', Money.of('500.00'), 10, 'منتج للاختبار')
 
-    def parse_datetime_flexible(self, date_string: str) -> Optional[datetime]:
-        """تحليل سلسلة التاريخ بتنسيقات متعددة."""
-        formats_to_try = ["%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S.%f", "%Y-%m-%d"]
-        for fmt in formats_to_try:
-            try:
-                return datetime.strptime(date_string, fmt)
-            except (ValueError, TypeError):
-                continue
-        return None
+    def report_save_error(self, error):
+        """يستدعى من خيط الحفظ؛ عرض الخطأ يتم في خيط الواجهة."""
+        if isinstance(error, storage.StockConflict):
+            # الفاتورة المرفوضة تحذف من الواجهة مع التغييرات التالية (poll_store)
+            self.root.after(0, lambda: messagebox.showwarning("تم إلغاء البيع", str(error)))
+            return
+        self.root.after(0, lambda: messagebox.showerror("خطأ في الحفظ", f"لم يتمكن من حفظ البيانات: {error}\nستتم إعادة المحاولة تلقائياً."))
+
+    def poll_store(self):
+        """تطبيق تغييرات أجهزة البيع الأخرى أو النسخ الأخرى على نفس الملف؛ الرصيد يضاف إليه الفرق."""
+        if self.store.poll():
+            self.update_dashboard()
+            self.update_inventory_display()
+        self.root.after(STORE_POLL_MS, self.poll_store)
+
+    def show_quarantine(self, event=None):
+        """عرض السجلات التي تعذر تحليل تاريخها."""
+        lines = self.store.index.quarantine_summary()
+        if lines:
+            messagebox.showwarning("سجلات بتواريخ غير صالحة", "\n".join(lines))
 
     def create_widgets(self):
         """إنشاء الواجهة الرئيسية باستخدام نظام التبويبات."""
@@ -174,6 +182,8 @@ class SalesManagementSystem:
         self.create_reports_tab()
         
         self.notebook.bind("<<NotebookTabChanged>>", self.on_tab_change)
+        # نافذة التشخيص المخفية للدعم الفني
+        self.root.bind_all("<Control-D>", lambda event: DiagnosticsWindow(self.root))
 
     def on_tab_change(self, event):
         """تحديث البيانات عند تغيير التبويب."""
@@ -216,6 +226,9 @@ class SalesManagementSystem:
         self.daily_expenses_label.pack(pady=5)
         self.daily_profit_label = b.Label(sales_frame, text="صافي الربح: 0.00 SDG", font=("Arial", 18, "bold"))
         self.daily_profit_label.pack(pady=10)
+        self.quarantine_label = b.Label(sales_frame, text="", font=("Arial", 11), bootstyle=DANGER, cursor="hand2")
+        self.quarantine_label.pack(pady=5)
+        self.quarantine_label.bind("<Button-1>", self.show_quarantine)
 
         self.low_stock_list = b.Treeview(stock_frame, columns=("product", "stock"), show="", height=8)
         self.low_stock_list.column("product", width=200)
@@ -225,24 +238,29 @@ class SalesManagementSystem:
         self.overdue_rentals_list.column("book", width=200)
         self.overdue_rentals_list.pack(fill=BOTH, expand=YES)
         
+    @metrics.measured('dashboard')
     def update_dashboard(self):
         today = datetime.now().date()
         
-        daily_sales = sum(s['total'] for s in self.data['sales'] if (dt := self.parse_datetime_flexible(s['date'])) and dt.date() == today)
-        daily_expenses = sum(e['amount'] for e in self.data['expenses'] if (dt := self.parse_datetime_flexible(e['date'])) and dt.date() == today)
-        profit = daily_sales - daily_expenses
+        summary = self.store.rollups.day(today)
+        daily_sales = summary.sales_total
+        daily_expenses = summary.expenses_total
+        profit = summary.profit
         
         self.daily_sales_label.config(text=f"إجمالي المبيعات: {daily_sales:.2f} SDG")
         self.daily_expenses_label.config(text=f"إجمالي المصروفات: {daily_expenses:.2f} SDG")
         self.daily_profit_label.config(text=f"صافي الربح: {profit:.2f} SDG", bootstyle=(SUCCESS if profit >= 0 else DANGER))
+        quarantined = len(self.store.index.quarantine)
+        self.quarantine_label.config(text=f"⚠️ سجلات بتواريخ غير صالحة: {quarantined} (اضغط للعرض)" if quarantined else "")
 
         for i in self.low_stock_list.get_children(): self.low_stock_list.delete(i)
-        low_stock_items = [p for p in self.data['inventory'] if p['stock'] <= 5]
+        low_stock_items = [p for p in self.store.data['inventory'] if p['stock'] <= 5]
         for item in low_stock_items:
             self.low_stock_list.insert("", END, values=(f"{item['name']}", f"المتبقي: {item['stock']}"))
 
         for i in self.overdue_rentals_list.get_children(): self.overdue_rentals_list.delete(i)
-        overdue_rentals = [r for r in self.data['rentals'] if r['status'] == 'مُعَار' and (dt := self.parse_datetime_flexible(r['due_date'])) and dt.date() < today]
+        when = self.store.index.when
+        overdue_rentals = [r for r in self.store.data['rentals'] if r['status'] == 'مُعَار' and (dt := when('rentals', r, 'due_date')) and dt.date() < today]
         for rental in overdue_rentals:
             self.overdue_rentals_list.insert("", END, values=(f"{rental['book_name']}", f"المستأجر: {rental['renter_name']}"))
 
@@ -265,6 +283,8 @@ class SalesManagementSystem:
         self.pos_product_var = b.StringVar()
         self.pos_product_combo = b.Combobox(form_frame, textvariable=self.pos_product_var, font=("Arial", 14), width=25)
         self.pos_product_combo.grid(row=0, column=1, padx=5, pady=10)
+        self._suggest_after = None
+        self.pos_product_var.trace_add("write", self.schedule_product_suggestions)
         
         b.Label(form_frame, text="الكمية:", font=("Arial", 14)).grid(row=1, column=0, padx=5, pady=10, sticky='w')
         self.pos_quantity_var = b.StringVar(value="1")
@@ -272,6 +292,12 @@ class SalesManagementSystem:
 
         b.Button(form_frame, text="إضافة للسلة", command=self.add_to_cart, bootstyle=SUCCESS, width=20).grid(row=2, column=0, columnspan=2, pady=20)
 
+        # وضع الماسح: قراءة الباركود تضيف المنتج مباشرة للسلة
+        self.scan_mode_var = b.BooleanVar(value=True)
+        self.scanner = ScanListener(self.root, self.on_barcode_scan)
+        b.Checkbutton(form_frame, text="وضع الماسح (باركود)", variable=self.scan_mode_var, bootstyle="round-toggle",
+                      command=lambda: setattr(self.scanner, 'enabled', self.scan_mode_var.get())).grid(row=3, column=0, columnspan=2, pady=5)
+
         cart_frame = b.Frame(pos_pane, padding=10)
         pos_pane.add(cart_frame, weight=2)
         
@@ -326,43 +352,51 @@ class SalesManagementSystem:
             messagebox.showerror("خطأ", "الكمية يجب أن تكون رقماً صحيحاً وأكبر من صفر.")
             return
         
-        product = next((p for p in self.data['inventory'] if p['name'] == product_name), None)
+        product = self.store.find_product(product_name)
         if not product:
-            messagebox.showerror("خطأ", "المنتج المحدد غير موجود.")
-            return
-            
-        if product['stock'] < quantity:
-            messagebox.showwarning("المخزون لا يكفي", f"الكمية المطلوبة ({quantity}) أكبر من المتوفر ({product['stock']}).")
+            messagebox.showerror("خطأ", "المنتج المحدد غير موجود. اختر الاسم من قائمة الاقتراحات.")
             return
 
-        existing_item = next((item for item in self.cart if item['id'] == product['id']), None)
-        if existing_item:
-            existing_item['quantity'] += quantity
-        else:
-            self.cart.append({'id': product['id'], 'name': product['name'], 'price': product['price'], 'quantity': quantity})
-        
+        if self.add_product_to_cart(product, quantity):
+            self.pos_product_var.set('')
+            self.pos_quantity_var.set('1')
+
+    def add_product_to_cart(self, product, quantity):
+        """إضافة منتج معروف للسلة؛ تكرار المنتج يزيد كميته."""
+        try:
+            self.cart.add(product, quantity)
+        except CoreError as e:
+            messagebox.showwarning("المخزون لا يكفي", str(e))
+            return False
         self.update_cart_display()
-        self.pos_product_var.set('')
-        self.pos_quantity_var.set('1')
+        return True
+
+    def on_barcode_scan(self, code):
+        """قراءة من الماسح: بحث في فهرس الباركود ثم إضافة قطعة واحدة للسلة."""
+        product = self.store.index.product_by_code(code)
+        if not product:
+            messagebox.showerror("خطأ", f"لا يوجد منتج بالباركود: {code}")
+            return
+        if self.notebook.select() != str(self.pos_tab):
+            self.notebook.select(self.pos_tab)
+        self.add_product_to_cart(product, 1)
 
     def update_cart_display(self):
         for i in self.cart_tree.get_children(): self.cart_tree.delete(i)
         
-        self.cart_total = Decimal('0.00')
         for item in self.cart:
-            item_total = item['price'] * item['quantity']
-            self.cart_tree.insert("", END, values=(f"{item_total:.2f}", f"{item['price']:.2f}", item['quantity'], item['name']))
-            self.cart_total += item_total
+            self.cart_tree.insert("", END, values=(f"{item['total']:.2f}", f"{item['price']:.2f}", item['quantity'], item['name']))
             
-        self.cart_total_label.config(text=f"الإجمالي: {self.cart_total:.2f} SDG")
+        self.cart_total_label.config(text=f"الإجمالي: {self.cart.total:.2f} SDG")
 
     def clear_cart(self):
-        if self.cart and messagebox.askyesno("تأكيد", "هل تريد بالتأكيد إفراغ السلة؟"):
-            self.cart = []
+        if len(self.cart) and messagebox.askyesno("تأكيد", "هل تريد بالتأكيد إفراغ السلة؟"):
+            self.cart.clear()
             self.update_cart_display()
 
+    @metrics.measured('checkout')
     def checkout(self):
-        if not self.cart:
+        if not len(self.cart):
             messagebox.showwarning("السلة فارغة", "لا يمكن إتمام البيع لأن السلة فارغة.")
             return
 
@@ -374,28 +408,16 @@ class SalesManagementSystem:
             if not bank_details:
                 return
 
-        sale_record = {
-            'id': str(uuid.uuid4()),
-            'date': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            'customer': self.pos_customer_var.get().strip() or "عميل نقدي",
-            'payment_method': payment_method,
-            'status': 'مدفوعة' if payment_method != 'آجل' else 'آجل',
-            'items': [{'id': i['id'], 'name': i['name'], 'price': i['price'], 'quantity': i['quantity'], 'total': i['price'] * i['quantity']} for i in self.cart],
-            'total': self.cart_total,
-            'bank_details': bank_details
-        }
-
-        for item in self.cart:
-            product = next((p for p in self.data['inventory'] if p['id'] == item['id']), None)
-            if product:
-                product['stock'] -= item['quantity']
-        
-        self.data['sales'].append(sale_record)
-        self.save_data()
+        try:
+            sale_record = self.store.checkout(self.cart, self.pos_customer_var.get().strip() or "عميل نقدي", payment_method,
+                                              status='مدفوعة' if payment_method != 'آجل' else 'آجل',
+                                              bank_details=bank_details)
+        except CoreError as e:
+            messagebox.showwarning("تعذر إتمام البيع", str(e))
+            return
         
         messagebox.showinfo("نجاح", f"تم تسجيل الفاتورة بنجاح برقم: {sale_record['id'][:8]}")
 
-        self.cart = []
         self.update_cart_display()
         self.pos_customer_var.set('')
         self.update_dashboard()
@@ -457,18 +479,34 @@ class SalesManagementSystem:
         self.inventory_tree.configure(yscrollcommand=scrollbar.set)
         scrollbar.pack(side=RIGHT, fill=Y)
 
+    @metrics.measured('inventory_refresh')
     def update_inventory_display(self):
         for i in self.inventory_tree.get_children(): self.inventory_tree.delete(i)
-        for item in sorted(self.data['inventory'], key=lambda x: x['name']):
+        for item in sorted(self.store.data['inventory'], key=lambda x: x['name']):
             self.inventory_tree.insert("", END, iid=item['id'], values=(item.get('description', ''), item['stock'], f"{item['price']:.2f}", item['name']))
         
-        product_names = [item['name'] for item in self.data['inventory'] if item['stock'] > 0]
-        self.pos_product_combo['values'] = product_names
+        self.update_product_suggestions()
+
+    def schedule_product_suggestions(self, *args):
+        """تحديث المقترحات بعد توقف الكاشير عن الكتابة."""
+        if self._suggest_after is not None:
+            self.root.after_cancel(self._suggest_after)
+        self._suggest_after = self.root.after(SEARCH_DEBOUNCE_MS, self.update_product_suggestions)
+
+    def update_product_suggestions(self):
+        """ملء قائمة نقطة البيع بأقرب المنتجات المتوفرة إلى النص المكتوب."""
+        self._suggest_after = None
+        query = self.pos_product_var.get()
+        if query.strip():
+            products = self.store.index.finder.find(query, PRODUCT_SUGGESTIONS, in_stock=True)
+        else:
+            products = islice((item for item in self.store.data['inventory'] if item['stock'] > 0), PRODUCT_SUGGESTIONS)
+        self.pos_product_combo['values'] = [item['name'] for item in products]
 
     def add_or_edit_product_dialog(self, product=None):
         is_edit = product is not None
         dialog = b.Toplevel(self.root, title="تعديل منتج" if is_edit else "إضافة منتج جديد")
-        dialog.geometry("500x400")
+        dialog.geometry("500x450")
         dialog.transient(self.root)
         dialog.grab_set()
 
@@ -478,7 +516,8 @@ class SalesManagementSystem:
         fields = {"اسم المنتج": b.StringVar(value=product['name'] if is_edit else ""),
                   "السعر": b.StringVar(value=str(product['price']) if is_edit else ""),
                   "الكمية": b.StringVar(value=str(product['stock']) if is_edit else ""),
-                  "الوصف": b.StringVar(value=product.get('description', '') if is_edit else "")}
+                  "الوصف": b.StringVar(value=product.get('description', '') if is_edit else ""),
+                  "الباركود / ISBN": b.StringVar(value=product.get('barcode', '') if is_edit else "")}
 
         for i, (label, var) in enumerate(fields.items()):
             b.Label(frame, text=label, font=("Arial", 12)).grid(row=i, column=0, padx=10, pady=10, sticky='w')
@@ -487,33 +526,13 @@ class SalesManagementSystem:
         frame.grid_columnconfigure(1, weight=1)
 
         def save():
-            name = fields["اسم المنتج"].get().strip()
-            price_str = fields["السعر"].get().strip()
-            stock_str = fields["الكمية"].get().strip()
-            
-            if not all([name, price_str, stock_str]):
-                messagebox.showerror("خطأ", "يجب ملء حقول الاسم والسعر والكمية.", parent=dialog)
-                return
-            
             try:
-                price = Decimal(price_str)
-                stock = int(stock_str)
-            except Exception:
-                messagebox.showerror("خطأ", "السعر والكمية يجب أن تكون أرقاماً صالحة.", parent=dialog)
+                self.store.save_product(fields["اسم المنتج"].get(), fields["السعر"].get(), fields["الكمية"].get(),
+                                        fields["الوصف"].get(), fields["الباركود / ISBN"].get(), product=product)
+            except CoreError as e:
+                messagebox.showerror("خطأ", str(e), parent=dialog)
                 return
-
-            name_lower = name.lower()
-            for p in self.data['inventory']:
-                if p['name'].lower() == name_lower and (not is_edit or p['id'] != product['id']):
-                    messagebox.showerror("خطأ", "اسم المنتج موجود بالفعل.", parent=dialog)
-                    return
-
-            if is_edit:
-                product.update({'name': name, 'price': price, 'stock': stock, 'description': fields["الوصف"].get().strip()})
-            else:
-                self.data['inventory'].append({'id': str(uuid.uuid4()), 'name': name, 'price': price, 'stock': stock, 'description': fields["الوصف"].get().strip()})
             
-            self.save_data()
             self.update_inventory_display()
             self.update_dashboard()
             dialog.destroy()
@@ -525,7 +544,7 @@ class SalesManagementSystem:
             messagebox.showwarning("تنبيه", "يرجى تحديد منتج لتعديله.")
             return
         prod_id = self.inventory_tree.selection()[0]
-        product = next((p for p in self.data['inventory'] if p['id'] == prod_id), None)
+        product = self.store.index.product(prod_id)
         if product:
             self.add_or_edit_product_dialog(product)
 
@@ -534,10 +553,13 @@ class SalesManagementSystem:
             messagebox.showwarning("تنبيه", "يرجى تحديد منتج لحذفه.")
             return
         prod_id = self.inventory_tree.selection()[0]
-        product = next((p for p in self.data['inventory'] if p['id'] == prod_id), None)
+        product = self.store.index.product(prod_id)
         if product and messagebox.askyesno("تأكيد الحذف", f"هل تريد بالتأكيد حذف المنتج '{product['name']}'؟"):
-            self.data['inventory'] = [p for p in self.data['inventory'] if p['id'] != prod_id]
-            self.save_data()
+            try:
+                self.store.delete_product(prod_id)
+            except CoreError as e:
+                messagebox.showerror("خطأ", str(e))
+                return
             self.update_inventory_display()
             self.update_dashboard()
 
@@ -565,47 +587,87 @@ class SalesManagementSystem:
         export_frame.pack(fill=X, pady=20)
         b.Button(export_frame, text="تصدير المبيعات إلى Excel", command=self.export_sales_to_csv, bootstyle=(INFO, OUTLINE)).pack(side=RIGHT, padx=10)
         b.Button(export_frame, text="تصدير المصروفات إلى Excel", command=self.export_expenses_to_csv, bootstyle=(INFO, OUTLINE)).pack(side=RIGHT, padx=10)
-        pass
+
+        # فترة التصدير (اختيارية، بصيغة YYYY-MM-DD وتشمل اليومين)
+        range_frame = b.Frame(self.reports_tab)
+        range_frame.pack(fill=X, pady=5)
+        self.export_from_var = b.StringVar()
+        self.export_to_var = b.StringVar()
+        b.Label(range_frame, text="من تاريخ:").pack(side=RIGHT, padx=5)
+        b.Entry(range_frame, textvariable=self.export_from_var, width=12).pack(side=RIGHT, padx=5)
+        b.Label(range_frame, text="إلى تاريخ:").pack(side=RIGHT, padx=5)
+        b.Entry(range_frame, textvariable=self.export_to_var, width=12).pack(side=RIGHT, padx=5)
+
+        progress_frame = b.Frame(self.reports_tab)
+        progress_frame.pack(fill=X, pady=5)
+        self.export_cancel_button = b.Button(progress_frame, text="إلغاء التصدير", command=self.cancel_export, bootstyle=(DANGER, OUTLINE), state=DISABLED)
+        self.export_cancel_button.pack(side=RIGHT, padx=10)
+        self.export_progress = b.Progressbar(progress_frame, maximum=1, bootstyle=INFO)
+        self.export_progress.pack(side=RIGHT, fill=X, expand=YES, padx=10)
+        self.export_status_label = b.Label(self.reports_tab, text="")
+        self.export_status_label.pack(anchor=E, padx=10)
+        self.export_job = None
+
+    def export_range(self):
+        """فترة التصدير من الحقول؛ يعيد (start, end) حيث end غير مشمول، أو يرفع ValueError."""
+        start_text, end_text = self.export_from_var.get().strip(), self.export_to_var.get().strip()
+        start = datetime.strptime(start_text, "%Y-%m-%d") if start_text else None
+        end = datetime.strptime(end_text, "%Y-%m-%d") + timedelta(days=1) if end_text else None
+        return start, end
 
     def export_sales_to_csv(self):
-        if not self.data['sales']:
-            messagebox.showinfo("لا توجد بيانات", "سجل المبيعات فارغ.")
-            return
-        
-        file_path = filedialog.asksaveasfilename(defaultextension=".csv", filetypes=[("CSV files", "*.csv")], title="تصدير المبيعات")
-        if not file_path: return
-        
-        try:
-            with open(file_path, 'w', newline='', encoding='utf-8-sig') as f:
-                writer = csv.writer(f)
-                writer.writerow(['رقم الفاتورة', 'التاريخ', 'العميل', 'طريقة الدفع', 'الحالة', 'اسم المنتج', 'الكمية', 'السعر', 'الإجمالي للمنتج', 'الإجمالي للفاتورة'])
-                for sale in self.data['sales']:
-                    for item in sale['items']:
-                        writer.writerow([
-                            sale['id'], sale['date'], sale['customer'], sale['payment_method'], sale['status'],
-                            item['name'], item['quantity'], item['price'], item['total'], sale['total']
-                        ])
-            messagebox.showinfo("نجاح", f"تم تصدير المبيعات بنجاح إلى:\n{file_path}")
-        except Exception as e:
-            messagebox.showerror("خطأ", f"فشل تصدير البيانات: {e}")
+        self.start_export('sales', "تصدير المبيعات", exporter.SALES_HEADER, exporter.sales_rows)
 
     def export_expenses_to_csv(self):
-        if not self.data['expenses']:
-            messagebox.showinfo("لا توجد بيانات", "سجل المصروفات فارغ.")
+        self.start_export('expenses', "تصدير المصروفات", exporter.EXPENSES_HEADER, exporter.expense_rows)
+
+    def start_export(self, collection, title, header, rows):
+        """بدء التصدير في خيط خلفي؛ التقدم يعرض عبر root.after."""
+        if self.export_job is not None and not self.export_job.finished:
+            messagebox.showwarning("تصدير جارٍ", "يوجد تصدير قيد التنفيذ. يرجى الانتظار أو إلغاؤه.")
             return
-        
-        file_path = filedialog.asksaveasfilename(defaultextension=".csv", filetypes=[("CSV files", "*.csv")], title="تصدير المصروفات")
+        try:
+            start, end = self.export_range()
+        except ValueError:
+            messagebox.showerror("خطأ", "صيغة التاريخ غير صحيحة (YYYY-MM-DD).")
+            return
+        # الشريحة تؤخذ هنا في خيط الواجهة، فالبيع أثناء التصدير لا يؤثر عليه
+        # الأشهر المؤرشفة في الفترة تحمل من الأرشيف وتسبق البيانات الحالية
+        records = self.store.archive.load_between(collection, start, end) + self.store.index.timeline[collection].range(start, end)
+        if not records:
+            messagebox.showinfo("لا توجد بيانات", "لا توجد سجلات في الفترة المحددة.")
+            return
+
+        file_path = filedialog.asksaveasfilename(defaultextension=".csv", filetypes=[("CSV files", "*.csv")], title=title)
         if not file_path: return
 
-        try:
-            with open(file_path, 'w', newline='', encoding='utf-8-sig') as f:
-                writer = csv.writer(f)
-                writer.writerow(['التاريخ', 'الوصف', 'المبلغ (SDG)'])
-                for exp in self.data['expenses']:
-                    writer.writerow([exp['date'], exp['description'], exp['amount']])
-            messagebox.showinfo("نجاح", f"تم تصدير المصروفات بنجاح إلى:\n{file_path}")
-        except Exception as e:
-            messagebox.showerror("خطأ", f"فشل تصدير البيانات: {e}")
+        self.export_job = exporter.ExportJob(file_path, header, records, rows)
+        self.export_progress.config(maximum=self.export_job.total, value=0)
+        self.export_cancel_button.config(state=NORMAL)
+        self.export_status_label.config(text=f"جارٍ التصدير: 0 / {self.export_job.total}")
+        self.export_job.start()
+        self.root.after(100, self.poll_export)
+
+    def poll_export(self):
+        job = self.export_job
+        self.export_progress.config(value=job.done)
+        self.export_status_label.config(text=f"جارٍ التصدير: {job.done} / {job.total}")
+        if not job.finished:
+            self.root.after(100, self.poll_export)
+            return
+        self.export_cancel_button.config(state=DISABLED)
+        if job.error is not None:
+            self.export_status_label.config(text="")
+            messagebox.showerror("خطأ", f"فشل تصدير البيانات: {job.error}")
+        elif job.cancelled:
+            self.export_status_label.config(text="تم إلغاء التصدير")
+        else:
+            self.export_status_label.config(text=f"تم تصدير {job.rows_written} صف")
+            messagebox.showinfo("نجاح", f"تم التصدير بنجاح إلى:\n{job.path}")
+
+    def cancel_export(self):
+        if self.export_job is not None:
+            self.export_job.cancel()
             
     def update_rentals_display(self): pass
     def update_expenses_display(self): pass
@@ -726,81 +788,88 @@ class SalesManagementSystem:
         self.data_file = "sales_data.json"
         self.load_data()
         
-        # متغيرات السلة
-        self.cart = []
-        self.cart_total = 0.0
+        # السلة
+        self.cart = Cart()
+        # دوال تحديث النوافذ المفتوحة عند وصول تغييرات من أجهزة أخرى
+        self.open_views = set()
         
         # إنشاء الواجهة
         self.create_widgets()
         
         # تحديث العرض
         self.update_displays()
+        self.root.after(STORE_POLL_MS, self.poll_store)
+
+        # انتظار اكتمال الحفظ عند الإغلاق
+        self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
+
+    def on_closing(self):
+        """حفظ التغييرات المعلقة قبل إغلاق النافذة"""
+        try:
+            self.store.flush()
+        except Exception as e:
+            if not messagebox.askyesno("خطأ", f"خطأ في حفظ البيانات: {str(e)}\nهل تريد الإغلاق رغم ذلك؟ ستفقد التغييرات غير المحفوظة."):
+                return
+        self.store.close(discard=True)
+        self.root.destroy()
     
     def load_data(self):
         """تحميل البيانات من الملف"""
-        default_data = {
-            "sales": [],
-            "expenses": [],
-            "inventory": [],
-            "rentals": []
-        }
-        
-        if os.path.exists(self.data_file):
-            try:
-                with open(self.data_file, 'r', encoding='utf-8') as f:
-                    self.data = json.load(f)
-                for key in default_data:
-                    if key not in self.data:
-                        self.data[key] = default_data[key]
-            except Exception as e:
-                messagebox.showerror("خطأ", f"خطأ في تحميل البيانات: {str(e)}")
-                self.data = default_data
+        if SERVER_URL:
+            self.store = RemoteStore(SERVER_URL, SERVER_TOKEN)
         else:
-            self.data = default_data
+            self.store = Store(self.data_file, STORAGE_BACKEND, indent=2, background=True,
+                               on_error=self.report_save_error, save_window=SAVE_WINDOW_SECONDS)
+        self.store.load()
+        if self.store.load_error is not None:
+            messagebox.showerror("خطأ", f"خطأ في تحميل البيانات: {str(self.store.load_error)}")
+            return
 
         # إضافة منتج افتراضي إذا كان المخزون فارغاً
-        if not self.data['inventory']:
-            self.data['inventory'].append({
-                'id': str(uuid.uuid4()),
-                'name': 'كتاب افتراضي',
-                'price': 10.0,
-                'stock': 5,
-                'description': 'منتج افتراضي للاختبار'
-            })
-            self.save_data()
-    
-    def save_data(self):
-        """حفظ البيانات في الملف"""
+        if not self.store.data['inventory']:
+            self.store.save_product('كتاب افتراضي', Money.of('10.00'), 5, 'منتج افتراضي للاختبار')
+
+    def poll_store(self):
+        """تطبيق تغييرات الأجهزة الأخرى أو النسخ الأخرى على نفس الملف (المخزون والمبيعات) على الواجهة"""
+        if self.store.poll():
+            self.update_displays()
+            for refresh in list(self.open_views):
+                refresh()
+        self.root.after(STORE_POLL_MS, self.poll_store)
+
+    def report_save_error(self, error):
+        """يستدعى من خيط الحفظ، فيمرر الخطأ إلى خيط الواجهة"""
+        if isinstance(error, storage.StockConflict):
+            # الفاتورة المرفوضة تحذف من الواجهة مع التغييرات التالية (poll_store)
+            self.root.after(0, lambda: messagebox.showwarning("تم إلغاء البيع", str(error)))
+            return
+        self.root.after(0, lambda: messagebox.showerror("خطأ", f"خطأ في حفظ البيانات: {str(error)}\nستتم إعادة المحاولة تلقائياً."))
+
+    def archive_closed_months(self):
+        """نقل المبيعات والمصروفات الأقدم من الشهر السابق إلى الأرشيف"""
+        today = datetime.now()
+        # الشهر السابق يبقى في البيانات الحالية حتى تبقى نوافذ الـ 7 و 30 يوماً كاملة
+        year, month = (today.year, today.month - 1) if today.month > 1 else (today.year - 1, 12)
+        before = datetime(year, month, 1)
+        if not messagebox.askyesno("أرشفة", f"سيتم نقل المبيعات والمصروفات قبل {before:%Y-%m} إلى الأرشيف.\nهل تريد المتابعة؟"):
+            return
         try:
-            with open(self.data_file, 'w', encoding='utf-8') as f:
-                json.dump(self.data, f, ensure_ascii=False, indent=2)
+            archived = self.store.archive_closed(before)
         except Exception as e:
-            messagebox.showerror("خطأ", f"خطأ في حفظ البيانات: {str(e)}")
-
-    # =================================================================
-    # == الدالة الجديدة لحل مشكلة التواريخ ==
-    # =================================================================
-    def parse_datetime_flexible(self, date_string: str) -> Optional[datetime]:
-        """
-        تحلل سلسلة نصية للتاريخ قد تكون بأحد التنسيقات المعروفة.
-        Handles parsing a date string that might be in one of several formats.
-        """
-        # قائمة التنسيقات المحتملة بالترتيب
-        formats_to_try = [
-            "%Y-%m-%d %H:%M:%S",        # التنسيق القياسي الحالي
-            "%Y-%m-%dT%H:%M:%S.%f",     # تنسيق ISO مع أجزاء الثانية (سبب الخطأ)
-            "%Y-%m-%d",                # تنسيق التاريخ فقط (للإعارات)
-        ]
-        for fmt in formats_to_try:
-            try:
-                return datetime.strptime(date_string, fmt)
-            except (ValueError, TypeError):
-                continue
-        
-        # إذا فشلت كل المحاولات، يتم تسجيل تحذير وتجاهل السجل
-        print(f"تحذير: لم يتمكن من تحليل التاريخ '{date_string}'.")
-        return None
-    
+            messagebox.showerror("خطأ", f"فشلت الأرشفة: {str(e)}")
+            return
+        if not archived:
+            messagebox.showinfo("أرشفة", "لا توجد سجلات لأرشفتها.")
+            return
+        self.update_displays()
+        messagebox.showinfo("أرشفة", f"تمت أرشفة {archived} سجل.")
+
+    def show_quarantine(self, event=None):
+        """عرض السجلات التي تعذر تحليل تاريخها"""
+        lines = self.store.index.quarantine_summary()
+        if lines:
+            messagebox.showwarning("سجلات بتواريخ غير صالحة", "\n".join(lines))
+
     def create_widgets(self):
         """إنشاء عناصر الواجهة"""
         main_frame = tk.Frame(self.root, bg=COLORS['background'])
@@ -827,6 +896,8 @@ class SalesManagementSystem:
         self.create_info_section(right_frame)
         
         self.create_bottom_bar(main_frame)
+        # نافذة التشخيص المخفية للدعم الفني
+        self.root.bind_all("<Control-D>", lambda event: DiagnosticsWindow(self.root))
     
     def create_sales_section(self, parent):
         """إنشاء قسم المبيعات"""
@@ -840,12 +911,20 @@ class SalesManagementSystem:
         self.product_var = tk.StringVar()
         self.product_combo = ttk.Combobox(add_frame, textvariable=self.product_var, width=20, font=('Arial', FONT_SIZES['medium']))
         self.product_combo.grid(row=0, column=1, padx=5, pady=5)
+        self._suggest_after = None
+        self.product_var.trace_add("write", self.schedule_product_suggestions)
         
         tk.Label(add_frame, text="الكمية:", bg=COLORS['light'], font=('Arial', FONT_SIZES['medium'])).grid(row=0, column=2, padx=5, pady=5, sticky='w')
         self.quantity_var = tk.StringVar(value="1")
         tk.Entry(add_frame, textvariable=self.quantity_var, width=10, font=('Arial', FONT_SIZES['medium'])).grid(row=0, column=3, padx=5, pady=5)
         
         ModernButton(add_frame, text="إضافة للسلة", command=self.add_to_cart).grid(row=0, column=4, padx=10, pady=5)
+
+        # وضع الماسح: قراءة الباركود تضيف المنتج مباشرة للسلة
+        self.scan_mode_var = tk.BooleanVar(value=True)
+        self.scanner = ScanListener(self.root, self.on_barcode_scan)
+        tk.Checkbutton(add_frame, text="وضع الماسح (باركود)", variable=self.scan_mode_var, bg=COLORS['light'], font=('Arial', FONT_SIZES['small']),
+                       command=lambda: setattr(self.scanner, 'enabled', self.scan_mode_var.get())).grid(row=1, column=0, columnspan=5, padx=5, sticky='w')
         
         cart_label = tk.Label(parent, text="🛍️ السلة", font=('Arial', FONT_SIZES['large'], 'bold'), bg=COLORS['background'], fg=COLORS['accent'])
         cart_label.pack(anchor='w', pady=(10, 5))
@@ -897,6 +976,9 @@ class SalesManagementSystem:
         self.daily_expenses_label.pack(anchor='w', pady=2)
         self.daily_profit_label = tk.Label(stats_frame, text="الربح: 0.00 ريال", bg=COLORS['background'], font=('Arial', FONT_SIZES['medium']))
         self.daily_profit_label.pack(anchor='w', pady=2)
+        self.quarantine_label = tk.Label(stats_frame, text="", bg=COLORS['background'], fg=COLORS['danger'], font=('Arial', FONT_SIZES['small']), cursor='hand2')
+        self.quarantine_label.pack(anchor='w', pady=2)
+        self.quarantine_label.bind("<Button-1>", self.show_quarantine)
         
         low_stock_frame = tk.LabelFrame(parent, text="⚠️ تنبيهات المخزون", font=('Arial', FONT_SIZES['medium'], 'bold'), bg=COLORS['background'], fg=COLORS['warning'], padx=10, pady=10)
         low_stock_frame.pack(fill=tk.BOTH, expand=True, pady=(0, 10))
@@ -907,6 +989,11 @@ class SalesManagementSystem:
         recent_sales_frame.pack(fill=tk.BOTH, expand=True)
         self.recent_sales_listbox = tk.Listbox(recent_sales_frame, height=8, font=('Arial', FONT_SIZES['small']))
         self.recent_sales_listbox.pack(fill=tk.BOTH, expand=True)
+
+        best_sellers_frame = tk.LabelFrame(parent, text="🏆 الأكثر مبيعاً (7 أيام)", font=('Arial', FONT_SIZES['medium'], 'bold'), bg=COLORS['background'], fg=COLORS['accent'], padx=10, pady=10)
+        best_sellers_frame.pack(fill=tk.BOTH, expand=True, pady=(10, 0))
+        self.best_sellers_listbox = tk.Listbox(best_sellers_frame, height=5, font=('Arial', FONT_SIZES['small']))
+        self.best_sellers_listbox.pack(fill=tk.BOTH, expand=True)
     
     def create_bottom_bar(self, parent):
         """إنشاء الشريط السفلي مع أزرار الإدارة"""
@@ -923,6 +1010,7 @@ class SalesManagementSystem:
         backup_frame.pack(side=tk.RIGHT, padx=10)
         ModernButton(backup_frame, text="💾 نسخ احتياطي", command=self.backup_data, style="secondary").pack(side=tk.LEFT, padx=5)
         ModernButton(backup_frame, text="🔄 استعادة نسخة", command=self.restore_data, style="secondary").pack(side=tk.LEFT, padx=5)
+        ModernButton(backup_frame, text="🗄️ أرشفة الأشهر المغلقة", command=self.archive_closed_months, style="secondary").pack(side=tk.LEFT, padx=5)
 
     def add_to_cart(self):
         """إضافة منتج للسلة"""
@@ -940,79 +1028,59 @@ class SalesManagementSystem:
             messagebox.showerror("خطأ", "يرجى إدخال كمية صحيحة")
             return
         
-        product = next((item for item in self.data['inventory'] if item['name'] == product_name), None)
+        product = self.store.find_product(product_name)
         
         if not product:
-            messagebox.showerror("خطأ", "المنتج غير موجود في المخزون")
+            messagebox.showerror("خطأ", "المنتج غير موجود في المخزون. اختر الاسم من قائمة الاقتراحات.")
             return
         
-        existing_item_in_cart = next((item for item in self.cart if item['id'] == product['id']), None)
-        current_quantity_in_cart = existing_item_in_cart['quantity'] if existing_item_in_cart else 0
-        
-        if product['stock'] < current_quantity_in_cart + quantity:
-            messagebox.showerror("خطأ", f"الكمية المطلوبة تتجاوز المتوفر. المتوفر: {product['stock']}")
-            return
-        
-        if existing_item_in_cart:
-            existing_item_in_cart['quantity'] += quantity
-            existing_item_in_cart['total'] = existing_item_in_cart['price'] * existing_item_in_cart['quantity']
-        else:
-            self.cart.append({
-                'id': product['id'], 'name': product['name'], 'price': product['price'],
-                'quantity': quantity, 'total': product['price'] * quantity
-            })
-        
+        if self.add_product_to_cart(product, quantity):
+            self.product_var.set("")
+            self.quantity_var.set("1")
+
+    def add_product_to_cart(self, product, quantity):
+        """إضافة منتج معروف للسلة (تكرار المنتج يزيد كميته)"""
+        try:
+            self.cart.add(product, quantity)
+        except CoreError as e:
+            messagebox.showerror("خطأ", str(e))
+            return False
         self.update_cart_display()
-        self.product_var.set("")
-        self.quantity_var.set("1")
+        return True
+
+    def on_barcode_scan(self, code):
+        """قراءة من الماسح: بحث في فهرس الباركود ثم إضافة قطعة واحدة للسلة"""
+        product = self.store.index.product_by_code(code)
+        if not product:
+            messagebox.showerror("خطأ", f"لا يوجد منتج بالباركود: {code}")
+            return
+        self.add_product_to_cart(product, 1)
 
     def update_cart_display(self):
         """تحديث عرض السلة"""
         for item in self.cart_tree.get_children():
             self.cart_tree.delete(item)
         
-        self.cart_total = sum(item['total'] for item in self.cart)
-        
         for item in self.cart:
             self.cart_tree.insert('', 'end', values=(item['name'], item['quantity'], f"{item['price']:.2f}", f"{item['total']:.2f}"))
         
-        self.total_label.config(text=f"الإجمالي: {self.cart_total:.2f} ريال")
+        self.total_label.config(text=f"الإجمالي: {self.cart.total:.2f} ريال")
 
     def clear_cart(self):
         """مسح السلة"""
-        if self.cart and messagebox.askyesno("تأكيد", "هل تريد مسح جميع عناصر السلة؟"):
+        if len(self.cart) and messagebox.askyesno("تأكيد", "هل تريد مسح جميع عناصر السلة؟"):
             self.cart.clear()
             self.update_cart_display()
 
     def checkout(self):
         """إتمام البيع"""
-        if not self.cart:
-            messagebox.showwarning("تحذير", "السلة فارغة")
+        try:
+            sale_record = self.store.checkout(self.cart, self.customer_var.get(), self.payment_var.get())
+        except CoreError as e:
+            messagebox.showwarning("تحذير", str(e))
             return
-        
-        customer_name = self.customer_var.get().strip() or "عميل"
-        
-        sale_record = {
-            'id': str(uuid.uuid4()),
-            'date': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            'customer': customer_name,
-            'payment_method': self.payment_var.get(),
-            'items': self.cart.copy(),
-            'total': self.cart_total
-        }
-        
-        self.data['sales'].append(sale_record)
-        
-        for cart_item in self.cart:
-            for inv_item in self.data['inventory']:
-                if inv_item['id'] == cart_item['id']:
-                    inv_item['stock'] -= cart_item['quantity']
-                    break
-        
-        self.save_data()
         self.show_print_options(sale_record)
         
-        self.cart.clear()
         self.customer_var.set("")
         self.payment_var.set("نقدي")
         self.update_cart_display()
@@ -1063,9 +1131,11 @@ class SalesManagementSystem:
 
         def update_display():
             for item in tree.get_children(): tree.delete(item)
-            for item in sorted(self.data['inventory'], key=lambda x: x['name']):
+            for item in sorted(self.store.data['inventory'], key=lambda x: x['name']):
                 tree.insert('', 'end', iid=item['id'], values=(item['name'], f"{item['price']:.2f}", item['stock'], item.get('description', '')))
         update_display()
+        self.open_views.add(update_display)
+        win.bind('<Destroy>', lambda event: self.open_views.discard(update_display) if event.widget is win else None)
 
         buttons_frame = tk.Frame(win, bg=COLORS['background'])
         buttons_frame.pack(fill=tk.X, padx=20, pady=10)
@@ -1076,7 +1146,7 @@ class SalesManagementSystem:
                 messagebox.showwarning("تحذير", "يرجى اختيار منتج لتعديله", parent=win)
                 return
             prod_id = tree.selection()[0]
-            prod = next((p for p in self.data['inventory'] if p['id'] == prod_id), None)
+            prod = self.store.index.product(prod_id)
             if prod: self.add_or_edit_product_dialog(product=prod, callback=update_display, parent=win)
         
         def delete_prod():
@@ -1084,16 +1154,44 @@ class SalesManagementSystem:
                 messagebox.showwarning("تحذير", "يرجى اختيار منتج لحذفه", parent=win)
                 return
             prod_id = tree.selection()[0]
-            prod = next((p for p in self.data['inventory'] if p['id'] == prod_id), None)
+            prod = self.store.index.product(prod_id)
             if prod and messagebox.askyesno("تأكيد الحذف", f"هل أنت متأكد من حذف المنتج '{prod['name']}'؟", parent=win):
-                self.data['inventory'] = [p for p in self.data['inventory'] if p['id'] != prod_id]
-                self.save_data()
+                try:
+                    self.store.delete_product(prod_id)
+                except CoreError as e:
+                    messagebox.showerror("خطأ", str(e), parent=win)
+                    return
                 update_display()
                 self.update_displays()
 
+        def import_prods():
+            file_path = filedialog.askopenfilename(
+                filetypes=[("CSV / JSON", "*.csv *.json"), ("CSV files", "*.csv"), ("JSON files", "*.json")],
+                title="استيراد المنتجات", parent=win)
+            if not file_path:
+                return
+            try:
+                rows = importer.read_rows(file_path)
+                report = self.store.import_products(rows)
+                if not report.applied:
+                    shown = "\n".join(report.messages(IMPORT_ERRORS_SHOWN))
+                    more = len(report.errors) - IMPORT_ERRORS_SHOWN
+                    if more > 0:
+                        shown += f"\n... و {more} خطأ آخر"
+                    if not messagebox.askyesno("أخطاء في الملف", f"{shown}\n\nاستيراد الصفوف الصحيحة فقط؟", parent=win):
+                        return
+                    report = self.store.import_products(rows, skip_invalid=True)
+            except (CoreError, OSError, ValueError) as e:
+                messagebox.showerror("خطأ", f"خطأ في قراءة الملف: {e}", parent=win)
+                return
+            update_display()
+            self.update_displays()
+            messagebox.showinfo("نجح", f"تمت إضافة {report.created} منتج وتعديل {report.updated} منتج", parent=win)
+
         ModernButton(buttons_frame, text="إضافة منتج", command=add_prod, style="success").pack(side=tk.LEFT, padx=10)
         ModernButton(buttons_frame, text="تعديل المنتج", command=edit_prod, style="primary").pack(side=tk.LEFT, padx=10)
         ModernButton(buttons_frame, text="حذف المنتج", command=delete_prod, style="danger").pack(side=tk.LEFT, padx=10)
+        ModernButton(buttons_frame, text="📥 استيراد", command=import_prods, style="primary").pack(side=tk.LEFT, padx=10)
         ModernButton(buttons_frame, text="إغلاق", command=win.destroy, style="secondary").pack(side=tk.RIGHT, padx=10)
 
     def add_or_edit_product_dialog(self, product=None, callback=None, parent=None):
@@ -1101,7 +1199,7 @@ class SalesManagementSystem:
         is_edit = product is not None
         win = tk.Toplevel(parent or self.root)
         win.title("تعديل منتج" if is_edit else "إضافة منتج جديد")
-        win.geometry("400x350")
+        win.geometry("400x400")
         win.configure(bg=COLORS['background'])
         win.grab_set()
 
@@ -1126,39 +1224,17 @@ class SalesManagementSystem:
         desc_var = tk.StringVar(value=product.get('description', '') if is_edit else "")
         tk.Entry(frame, textvariable=desc_var, width=30, font=('Arial', FONT_SIZES['medium'])).grid(row=3, column=1, padx=5, pady=5)
 
-        def save():
-            name = name_var.get().strip()
-            price_str = price_var.get().strip()
-            stock_str = stock_var.get().strip()
-            description = desc_var.get().strip()
+        tk.Label(frame, text="الباركود / ISBN:", bg=COLORS['background'], font=('Arial', FONT_SIZES['medium'])).grid(row=4, column=0, padx=5, pady=5, sticky='w')
+        barcode_var = tk.StringVar(value=product.get('barcode', '') if is_edit else "")
+        tk.Entry(frame, textvariable=barcode_var, width=30, font=('Arial', FONT_SIZES['medium'])).grid(row=4, column=1, padx=5, pady=5)
 
-            if not name or not price_str or not stock_str:
-                messagebox.showerror("خطأ", "يرجى ملء جميع الحقول المطلوبة", parent=win)
-                return
-            
+        def save():
             try:
-                price = float(price_str)
-                stock = int(stock_str)
-                if price < 0 or stock < 0: raise ValueError()
-            except ValueError:
-                messagebox.showerror("خطأ", "يرجى إدخال قيم صحيحة للسعر والكمية", parent=win)
+                self.store.save_product(name_var.get(), price_var.get(), stock_var.get(), desc_var.get(), barcode_var.get(),
+                                        product=product if is_edit else None)
+            except CoreError as e:
+                messagebox.showerror("خطأ", str(e), parent=win)
                 return
-            
-            if not is_edit and any(p['name'].lower() == name.lower() for p in self.data['inventory']):
-                 messagebox.showerror("خطأ", "اسم المنتج موجود بالفعل.", parent=win)
-                 return
-            if is_edit and any(p['name'].lower() == name.lower() and p['id'] != product['id'] for p in self.data['inventory']):
-                messagebox.showerror("خطأ", "اسم المنتج موجود بالفعل.", parent=win)
-                return
-
-            if is_edit:
-                product.update({'name': name, 'price': price, 'stock': stock, 'description': description})
-            else:
-                self.data['inventory'].append({
-                    'id': str(uuid.uuid4()), 'name': name, 'price': price, 'stock': stock, 'description': description
-                })
-            
-            self.save_data()
             self.update_displays()
             if callback: callback()
             win.destroy()
@@ -1168,6 +1244,7 @@ class SalesManagementSystem:
         ModernButton(buttons_frame, text="حفظ", command=save, style="success").pack(side=tk.LEFT, padx=10)
         ModernButton(buttons_frame, text="إلغاء", command=win.destroy, style="secondary").pack(side=tk.LEFT, padx=10)
 
+    @metrics.measured('history_window')
     def show_sales_history_window(self):
         """عرض نافذة سجل المبيعات"""
         win = tk.Toplevel(self.root)
@@ -1185,34 +1262,66 @@ class SalesManagementSystem:
         search_entry = tk.Entry(search_frame, textvariable=search_var, width=40, font=('Arial', FONT_SIZES['medium']))
         search_entry.pack(side=tk.LEFT, padx=5, fill=tk.X, expand=True)
 
+        # الأشهر المؤرشفة تحمل عند اختيارها فقط
+        current_period = "الفترة الحالية"
+        archived_months = {f"{year}-{month:02d}": (year, month) for year, month in reversed(self.store.archive.months('sales'))}
+        period_var = tk.StringVar(value=current_period)
+        tk.Label(search_frame, text="الفترة:", bg=COLORS['background'], font=('Arial', FONT_SIZES['medium'])).pack(side=tk.LEFT, padx=5)
+        ttk.Combobox(search_frame, textvariable=period_var, values=[current_period] + list(archived_months), state='readonly', width=15,
+                     font=('Arial', FONT_SIZES['medium'])).pack(side=tk.LEFT, padx=5)
+
         tree_frame = tk.Frame(win, bg=COLORS['background'])
         tree_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=10)
 
         columns = ('رقم الفاتورة', 'التاريخ', 'العميل', 'الإجمالي', 'طريقة الدفع')
-        tree = ttk.Treeview(tree_frame, columns=columns, show='headings', height=15)
-        for col in columns:
-            tree.heading(col, text=col)
-            tree.column(col, width=150, anchor='center')
-        
-        scrollbar = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL, command=tree.yview)
-        tree.configure(yscrollcommand=scrollbar.set)
-        tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        # جدول افتراضي: لا تنشأ إلا صفوف الصفحة الظاهرة
+        tree = VirtualTree(tree_frame, columns, lambda sale: (sale['id'][:8], sale['date'], sale['customer'], f"{sale['total']:.2f}", sale['payment_method']))
 
-        def update_display(filter_term=""):
-            for item in tree.get_children(): tree.delete(item)
-            
-            # Use the flexible parser for sorting
-            sorted_sales = sorted(self.data['sales'], key=lambda s: self.parse_datetime_flexible(s['date']) or datetime.min, reverse=True)
+        # فهارس بحث الأشهر المؤرشفة التي فتحت في هذه النافذة، والفواتير المعروضة حالياً حسب المعرف
+        archived_search = {}
+        shown = {}
 
-            sales_to_display = sorted_sales
-            if filter_term:
-                sales_to_display = [s for s in sorted_sales if filter_term.lower() in s.get('customer', '').lower() or filter_term in s.get('id', '')]
-            
-            for sale in sales_to_display:
-                tree.insert('', 'end', iid=sale['id'], values=(sale['id'][:8], sale['date'], sale['customer'], f"{sale['total']:.2f}", sale['payment_method']))
-        
-        search_var.trace_add("write", lambda *args: update_display(search_var.get()))
+        def update_display(filter_term=""):
+            month = archived_months.get(period_var.get())
+            if month is None:
+                # الفهرس الزمني مرتب مسبقاً، فلا حاجة لإعادة الترتيب عند كل ضغطة مفتاح
+                sales_to_display = self.store.index.timeline['sales'].newest_view()
+                if filter_term.strip():
+                    # البحث في الفهرس النصي ثم ترتيب النتائج فقط
+                    with metrics.timed('history_search'):
+                        found = self.store.sales_search.search(filter_term)
+                    matches = (self.store.index.sale(sale_id) for sale_id in found)
+                    sales_to_display = sorted(matches, key=self.store.index.sort_key('sales'), reverse=True)
+                    if not sales_to_display:
+                        # رقم فاتورة قديمة: البحث في الأرشيف بالمعرف
+                        sales_to_display = sorted(self.store.archive.find_sales(filter_term), key=lambda sale: sale['date'], reverse=True)
+                        shown.update((sale['id'], sale) for sale in sales_to_display)
+            else:
+                records = self.store.archive.load('sales', month)
+                sales_to_display = NewestFirst(records)
+                if filter_term.strip():
+                    if month not in archived_search:
+                        archived_search[month] = SalesSearch(records)
+                    ids = archived_search[month].search(filter_term)
+                    sales_to_display = [sale for sale in sales_to_display if sale['id'] in ids]
+                shown.update((sale['id'], sale) for sale in records)
+            tree.set_rows(sales_to_display)
+
+        # تأجيل البحث حتى يتوقف المستخدم عن الكتابة، وإلغاء أي بحث سابق لم ينفذ بعد
+        pending_search = {'after': None}
+
+        def run_search():
+            pending_search['after'] = None
+            if win.winfo_exists():
+                update_display(search_var.get())
+
+        def schedule_search(*args):
+            if pending_search['after'] is not None:
+                win.after_cancel(pending_search['after'])
+            pending_search['after'] = win.after(SEARCH_DEBOUNCE_MS, run_search)
+
+        search_var.trace_add("write", schedule_search)
+        period_var.trace_add("write", lambda *args: update_display(search_var.get()))
         update_display()
 
         def view_invoice_details():
@@ -1220,7 +1329,7 @@ class SalesManagementSystem:
                 messagebox.showwarning("تحذير", "يرجى اختيار فاتورة لعرضها", parent=win)
                 return
             sale_id = tree.selection()[0]
-            sale = next((s for s in self.data['sales'] if s['id'] == sale_id), None)
+            sale = self.store.index.sale(sale_id) or shown.get(sale_id)
             if sale: self.show_invoice_details_window(sale, parent=win)
 
         buttons_frame = tk.Frame(win, bg=COLORS['background'])
@@ -1284,23 +1393,11 @@ class SalesManagementSystem:
         tk.Entry(add_frame, textvariable=amount_var, width=15, font=('Arial', FONT_SIZES['medium'])).grid(row=1, column=1, padx=5, pady=5)
         
         def add_expense():
-            desc = desc_var.get().strip()
-            amount_str = amount_var.get().strip()
-            if not desc or not amount_str:
-                messagebox.showerror("خطأ", "يرجى ملء جميع الحقول", parent=win)
-                return
             try:
-                amount = float(amount_str)
-                if amount <= 0: raise ValueError()
-            except ValueError:
-                messagebox.showerror("خطأ", "يرجى إدخال مبلغ صحيح", parent=win)
+                self.store.add_expense(desc_var.get(), amount_var.get())
+            except CoreError as e:
+                messagebox.showerror("خطأ", str(e), parent=win)
                 return
-            
-            self.data['expenses'].append({
-                'id': str(uuid.uuid4()), 'date': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                'description': desc, 'amount': amount
-            })
-            self.save_data()
             update_display()
             self.update_displays()
             desc_var.set("")
@@ -1311,21 +1408,10 @@ class SalesManagementSystem:
         tree_frame = tk.Frame(win, bg=COLORS['background'])
         tree_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=10)
         columns = ('التاريخ', 'الوصف', 'المبلغ')
-        tree = ttk.Treeview(tree_frame, columns=columns, show='headings', height=15)
-        for col in columns:
-            tree.heading(col, text=col)
-            tree.column(col, width=200, anchor='center')
-        
-        scrollbar = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL, command=tree.yview)
-        tree.configure(yscrollcommand=scrollbar.set)
-        tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        tree = VirtualTree(tree_frame, columns, lambda expense: (expense['date'], expense['description'], f"{expense['amount']:.2f}"), width=200)
 
         def update_display():
-            for item in tree.get_children(): tree.delete(item)
-            sorted_expenses = sorted(self.data['expenses'], key=lambda e: self.parse_datetime_flexible(e['date']) or datetime.min, reverse=True)
-            for expense in sorted_expenses:
-                tree.insert('', 'end', iid=expense['id'], values=(expense['date'], expense['description'], f"{expense['amount']:.2f}"))
+            tree.set_rows(self.store.index.timeline['expenses'].newest_view(), keep_position=True)
         update_display()
 
         buttons_frame = tk.Frame(win, bg=COLORS['background'])
@@ -1336,16 +1422,20 @@ class SalesManagementSystem:
                 messagebox.showwarning("تحذير", "يرجى اختيار مصروف لحذفه", parent=win)
                 return
             exp_id = tree.selection()[0]
-            exp = next((e for e in self.data['expenses'] if e['id'] == exp_id), None)
+            exp = self.store.index.expense(exp_id)
             if exp and messagebox.askyesno("تأكيد الحذف", f"هل أنت متأكد من حذف المصروف '{exp['description']}'؟", parent=win):
-                self.data['expenses'] = [e for e in self.data['expenses'] if e['id'] != exp_id]
-                self.save_data()
+                try:
+                    self.store.delete_expense(exp_id)
+                except CoreError as e:
+                    messagebox.showerror("خطأ", str(e), parent=win)
+                    return
                 update_display()
                 self.update_displays()
         
         ModernButton(buttons_frame, text="حذف المصروف", command=delete_expense, style="danger").pack(side=tk.LEFT, padx=10)
         ModernButton(buttons_frame, text="إغلاق", command=win.destroy, style="secondary").pack(side=tk.RIGHT, padx=10)
 
+    @metrics.measured('reports_window')
     def show_reports_window(self):
         """عرض نافذة التقارير"""
         win = tk.Toplevel(self.root)
@@ -1362,16 +1452,18 @@ class SalesManagementSystem:
         summary_tab = tk.Frame(notebook, bg=COLORS['background'], padx=10, pady=10)
         sales_tab = tk.Frame(notebook, bg=COLORS['background'], padx=10, pady=10)
         notebook.add(summary_tab, text="الملخص المالي")
+        periods_tab = tk.Frame(notebook, bg=COLORS['background'], padx=10, pady=10)
         notebook.add(sales_tab, text="تحليل المبيعات")
+        notebook.add(periods_tab, text="الفترات")
 
         # --- تبويب الملخص ---
         today = datetime.now().date()
         
-        daily_sales = sum(s['total'] for s in self.data['sales'] if (dt := self.parse_datetime_flexible(s['date'])) and dt.date() == today)
-        daily_expenses = sum(e['amount'] for e in self.data['expenses'] if (dt := self.parse_datetime_flexible(e['date'])) and dt.date() == today)
+        daily_sales = self.store.rollups.day(today).sales_total
+        daily_expenses = self.store.rollups.day(today).expenses_total
         
-        total_sales = sum(s['total'] for s in self.data['sales'])
-        total_expenses = sum(e['amount'] for e in self.data['expenses'])
+        total_sales = self.store.rollups.all_time.sales_total
+        total_expenses = self.store.rollups.all_time.expenses_total
 
         tk.Label(summary_tab, text="ملخص اليوم", font=('Arial', FONT_SIZES['large'], 'bold'), bg=COLORS['background'], fg=COLORS['accent']).pack(anchor='w', pady=5)
         tk.Label(summary_tab, text=f"إجمالي المبيعات: {daily_sales:.2f} ريال", bg=COLORS['background'], font=('Arial', FONT_SIZES['medium'])).pack(anchor='w')
@@ -1388,15 +1480,37 @@ class SalesManagementSystem:
         # --- تبويب تحليل المبيعات ---
         tk.Label(sales_tab, text="المنتجات الأكثر مبيعاً", font=('Arial', FONT_SIZES['large'], 'bold'), bg=COLORS['background'], fg=COLORS['accent']).pack(anchor='w', pady=5)
         
-        product_sales = {}
-        for sale in self.data['sales']:
-            for item in sale['items']:
-                product_sales[item['name']] = product_sales.get(item['name'], 0) + item['quantity']
-        
-        best_selling = sorted(product_sales.items(), key=lambda x: x[1], reverse=True)[:10]
-        
-        for name, qty in best_selling:
-            tk.Label(sales_tab, text=f"- {name}: {qty} قطعة", bg=COLORS['background'], font=('Arial', FONT_SIZES['medium'])).pack(anchor='w')
+        best_frame = tk.Frame(sales_tab, bg=COLORS['background'])
+        best_frame.pack(fill=tk.BOTH, expand=True)
+        for column, (title, days) in enumerate((("الإجمالي", None), ("آخر 30 يوماً", 30), ("آخر 7 أيام", 7))):
+            tk.Label(best_frame, text=title, font=('Arial', FONT_SIZES['medium'], 'bold'), bg=COLORS['background']).grid(row=0, column=column, sticky='nw', padx=10)
+            lines = [f"- {name}: {units} قطعة ({revenue:.2f} ريال)" for name, units, revenue in self.store.leaderboard.top(10, days)]
+            tk.Label(best_frame, text="\n".join(lines) or "لا توجد مبيعات", justify=tk.LEFT, bg=COLORS['background'], font=('Arial', FONT_SIZES['small'])).grid(row=1, column=column, sticky='nw', padx=10)
+
+        # --- تبويب الفترات ---
+        columns = self.store.sales_columns()
+        tk.Label(periods_tab, text="المبيعات حسب الشهر", font=('Arial', FONT_SIZES['large'], 'bold'), bg=COLORS['background'], fg=COLORS['accent']).pack(anchor='w', pady=5)
+        months_tree = ttk.Treeview(periods_tab, columns=('الشهر', 'المبيعات', 'القطع'), show='headings', height=8)
+        for col in ('الشهر', 'المبيعات', 'القطع'):
+            months_tree.heading(col, text=col)
+            months_tree.column(col, width=150, anchor='center')
+        months_tree.pack(fill=tk.X)
+        monthly_amount = {month: from_minor(amount) for month, amount in columns.group('month').items()}
+        monthly_quantity = columns.group('month', 'quantity')
+        payments = {method: from_minor(amount) for method, amount in columns.group('payment').items()}
+        # الأشهر المؤرشفة من إجمالياتها المحفوظة دون تحميل سجلاتها
+        for month, summary in self.store.archive.summaries('sales'):
+            monthly_amount[month] = monthly_amount.get(month, ZERO) + Money.of(summary['total'])
+            monthly_quantity[month] = monthly_quantity.get(month, 0) + summary['quantity']
+            for method, amount in summary['by_payment'].items():
+                payments[method] = payments.get(method, ZERO) + Money.of(amount)
+        for (year, month) in sorted(monthly_amount, reverse=True):
+            months_tree.insert('', tk.END, values=(f"{year}-{month:02d}", f"{monthly_amount[(year, month)]:.2f} ريال",
+                                                   monthly_quantity[(year, month)]))
+
+        tk.Label(periods_tab, text="المبيعات حسب طريقة الدفع", font=('Arial', FONT_SIZES['large'], 'bold'), bg=COLORS['background'], fg=COLORS['accent']).pack(anchor='w', pady=(15, 5))
+        for method, amount in payments.items():
+            tk.Label(periods_tab, text=f"- {method or 'غير محدد'}: {amount:.2f} ريال", bg=COLORS['background'], font=('Arial', FONT_SIZES['medium'])).pack(anchor='w')
 
     def show_rental_window(self):
         """عرض نافذة إدارة تأجير الكتب"""
@@ -1412,33 +1526,22 @@ class SalesManagementSystem:
         frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=10)
 
         columns = ('اسم الكتاب', 'اسم المستعير', 'تاريخ التأجير', 'تاريخ الإرجاع', 'الحالة')
-        tree = ttk.Treeview(frame, columns=columns, show='headings', height=15)
-        for col in columns:
-            tree.heading(col, text=col)
-            tree.column(col, width=150, anchor='center')
-        
-        scrollbar = ttk.Scrollbar(frame, orient=tk.VERTICAL, command=tree.yview)
-        tree.configure(yscrollcommand=scrollbar.set)
-        tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        today = datetime.now().date()
+
+        def rental_status(rental):
+            due_date_dt = self.store.index.when('rentals', rental, 'due_date')
+            if rental['status'] == 'مُعَار' and due_date_dt and due_date_dt.date() < today:
+                return "متأخر"
+            return rental['status']
+
+        # الحالة تحسب للصفوف الظاهرة فقط
+        tree = VirtualTree(frame, columns,
+                           lambda rental: (rental['book_name'], rental['renter_name'], rental['rental_date'], rental['due_date'], rental_status(rental)),
+                           row_tags=lambda rental: ('late',) if rental_status(rental) == "متأخر" else ())
+        tree.tree.tag_configure('late', background=COLORS['warning'], foreground=COLORS['dark'])
 
         def update_display():
-            for item in tree.get_children(): tree.delete(item)
-            
-            sorted_rentals = sorted(self.data['rentals'], key=lambda r: self.parse_datetime_flexible(r['rental_date']) or datetime.min, reverse=True)
-
-            for rental in sorted_rentals:
-                status = rental['status']
-                due_date_dt = self.parse_datetime_flexible(rental['due_date'])
-                if status == 'مُعَار' and due_date_dt and due_date_dt.date() < datetime.now().date():
-                    status = "متأخر"
-                
-                tree.insert('', 'end', iid=rental['id'], values=(rental['book_name'], rental['renter_name'], rental['rental_date'], rental['due_date'], status))
-                
-                if status == "متأخر":
-                    tree.item(rental['id'], tags=('late',))
-            
-            tree.tag_configure('late', background=COLORS['warning'], foreground=COLORS['dark'])
+            tree.set_rows(self.store.index.timeline['rentals'].newest_view(), keep_position=True)
 
         update_display()
 
@@ -1451,13 +1554,14 @@ class SalesManagementSystem:
                 messagebox.showwarning("تحذير", "يرجى اختيار إعارة لتسجيل إرجاعها", parent=win)
                 return
             rental_id = tree.selection()[0]
-            rental = next((r for r in self.data['rentals'] if r['id'] == rental_id), None)
+            rental = self.store.index.rental(rental_id)
             
             if rental and rental['status'] != 'تم إرجاعه' and messagebox.askyesno("تأكيد", f"هل تريد تسجيل إرجاع الكتاب '{rental['book_name']}'؟", parent=win):
-                rental['status'] = 'تم إرجاعه'
-                book = next((b for b in self.data['inventory'] if b['id'] == rental['book_id']), None)
-                if book: book['stock'] += 1
-                self.save_data()
+                try:
+                    self.store.return_rental(rental_id)
+                except CoreError as e:
+                    messagebox.showerror("خطأ", str(e), parent=win)
+                    return
                 update_display()
                 self.update_displays()
 
@@ -1481,7 +1585,7 @@ class SalesManagementSystem:
         tk.Label(frame, text="الكتاب:", bg=COLORS['background'], font=('Arial', FONT_SIZES['medium'])).grid(row=0, column=0, padx=5, pady=5, sticky='w')
         book_var = tk.StringVar()
         book_combo = ttk.Combobox(frame, textvariable=book_var, width=30, font=('Arial', FONT_SIZES['medium']))
-        available_books = [p['name'] for p in self.data['inventory'] if p['stock'] > 0]
+        available_books = [p['name'] for p in self.store.data['inventory'] if p['stock'] > 0]
         book_combo['values'] = available_books
         book_combo.grid(row=0, column=1, padx=5, pady=5)
 
@@ -1494,35 +1598,11 @@ class SalesManagementSystem:
         tk.Entry(frame, textvariable=duration_var, width=30, font=('Arial', FONT_SIZES['medium'])).grid(row=2, column=1, padx=5, pady=5)
 
         def save():
-            book_name = book_var.get()
-            renter_name = renter_var.get().strip()
-            duration_str = duration_var.get().strip()
-
-            if not book_name or not renter_name or not duration_str:
-                messagebox.showerror("خطأ", "يرجى ملء جميع الحقول", parent=win)
-                return
-            
             try:
-                duration = int(duration_str)
-                if duration <= 0: raise ValueError()
-            except ValueError:
-                messagebox.showerror("خطأ", "يرجى إدخال مدة صحيحة", parent=win)
-                return
-            
-            book = next((b for b in self.data['inventory'] if b['name'] == book_name), None)
-            if not book:
-                messagebox.showerror("خطأ", "الكتاب غير موجود", parent=win)
+                self.store.add_rental(book_var.get(), renter_var.get(), duration_var.get())
+            except CoreError as e:
+                messagebox.showerror("خطأ", str(e), parent=win)
                 return
-            
-            book['stock'] -= 1
-            self.data['rentals'].append({
-                'id': str(uuid.uuid4()), 'book_id': book['id'], 'book_name': book_name,
-                'renter_name': renter_name, 'rental_date': datetime.now().strftime("%Y-%m-%d"),
-                'due_date': (datetime.now() + timedelta(days=duration)).strftime("%Y-%m-%d"),
-                'status': 'مُعَار'
-            })
-            
-            self.save_data()
             self.update_displays()
             if callback: callback()
             win.destroy()
@@ -1545,7 +1625,7 @@ class SalesManagementSystem:
         
         try:
             with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(self.data, f, ensure_ascii=False, indent=2)
+                json.dump(storage.encode_data(self.store.data), f, ensure_ascii=False, indent=2)
             messagebox.showinfo("نجح", f"تم إنشاء النسخة الاحتياطية بنجاح في:\n{file_path}")
         except Exception as e:
             messagebox.showerror("خطأ", f"خطأ في إنشاء النسخة الاحتياطية: {str(e)}")
@@ -1567,40 +1647,64 @@ class SalesManagementSystem:
 
         try:
             with open(file_path, 'r', encoding='utf-8') as f:
-                self.data = json.load(f)
-            self.save_data()
+                data = storage.decode_data(json.load(f))
+            self.store.replace_data(data)
             self.update_displays()
             messagebox.showinfo("نجح", "تم استعادة البيانات بنجاح من النسخة الاحتياطية.")
         except Exception as e:
             messagebox.showerror("خطأ", f"خطأ في استعادة البيانات: {str(e)}")
 
+    def schedule_product_suggestions(self, *args):
+        """تحديث المقترحات بعد توقف الكاشير عن الكتابة"""
+        if self._suggest_after is not None:
+            self.root.after_cancel(self._suggest_after)
+        self._suggest_after = self.root.after(SEARCH_DEBOUNCE_MS, self.update_product_suggestions)
+
+    def update_product_suggestions(self):
+        """ملء قائمة نقطة البيع بأقرب المنتجات المتوفرة إلى النص المكتوب"""
+        self._suggest_after = None
+        query = self.product_var.get()
+        if query.strip():
+            products = self.store.index.finder.find(query, PRODUCT_SUGGESTIONS, in_stock=True)
+        else:
+            products = islice((item for item in self.store.data['inventory'] if item['stock'] > 0), PRODUCT_SUGGESTIONS)
+        self.product_combo['values'] = [item['name'] for item in products]
+
+    @metrics.measured('refresh')
     def update_displays(self):
         """تحديث جميع عناصر العرض في الواجهة"""
         # تحديث قائمة المنتجات في نقطة البيع
-        product_names = [item['name'] for item in self.data['inventory'] if item['stock'] > 0]
-        self.product_combo['values'] = product_names
+        self.update_product_suggestions()
 
         # تحديث إحصائيات اليوم
         today = datetime.now().date()
-        daily_sales = sum(s['total'] for s in self.data['sales'] if (dt := self.parse_datetime_flexible(s['date'])) and dt.date() == today)
-        daily_expenses = sum(e['amount'] for e in self.data['expenses'] if (dt := self.parse_datetime_flexible(e['date'])) and dt.date() == today)
-        profit = daily_sales - daily_expenses
+        summary = self.store.rollups.day(today)
+        daily_sales = summary.sales_total
+        daily_expenses = summary.expenses_total
+        profit = summary.profit
         self.daily_sales_label.config(text=f"المبيعات: {daily_sales:.2f} ريال")
         self.daily_expenses_label.config(text=f"المصروفات: {daily_expenses:.2f} ريال")
         self.daily_profit_label.config(text=f"الربح: {profit:.2f} ريال")
+        quarantined = len(self.store.index.quarantine)
+        self.quarantine_label.config(text=f"⚠️ سجلات بتواريخ غير صالحة: {quarantined}" if quarantined else "")
 
         # تحديث تنبيهات المخزون
         self.low_stock_listbox.delete(0, tk.END)
-        for item in self.data['inventory']:
+        for item in self.store.data['inventory']:
             if item['stock'] <= 3:
                 self.low_stock_listbox.insert(tk.END, f"{item['name']} (المتبقي: {item['stock']})")
 
         # تحديث آخر المبيعات
         self.recent_sales_listbox.delete(0, tk.END)
-        recent_sales = sorted(self.data['sales'], key=lambda s: self.parse_datetime_flexible(s['date']) or datetime.min, reverse=True)[:8]
+        recent_sales = self.store.index.timeline['sales'].latest(8)
         for sale in recent_sales:
             self.recent_sales_listbox.insert(tk.END, f"{sale['date']} - {sale['customer']} - {sale['total']:.2f} ريال")
 
+        # تحديث الأكثر مبيعاً
+        self.best_sellers_listbox.delete(0, tk.END)
+        for name, units, revenue in self.store.leaderboard.top(5, days=7):
+            self.best_sellers_listbox.insert(tk.END, f"{name} - {units} قطعة - {revenue:.2f} ريال")
+
 if __name__ == "__main__":
     root = tk.Tk()
     app = SalesManagementSystem(root)
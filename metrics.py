@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+قياس زمن العمليات وعدادات خفيفة مع التقاط cProfile عند الطلب
+Lightweight timers, counters and an optional cProfile capture
+
+    with metrics.timed('checkout'):
+        ...
+    @metrics.measured('refresh')
+    def update_displays(self): ...
+    metrics.count('scan')
+    metrics.snapshot()  # {'checkout': {'count': ..., 'p50': ..., 'p95': ..., 'max': ...}}
+"""
+
+import cProfile
+import functools
+import io
+import json
+import pstats
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Dict, Any, Optional
+
+# عدد القياسات الأخيرة المحفوظة لكل عملية (لحساب p50 و p95)
+RING_SIZE = 512
+
+
+class _Series:
+    __slots__ = ('samples', 'count', 'total', 'max', 'last')
+
+    def __init__(self, size: int):
+        self.samples = deque(maxlen=size)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last = 0.0
+
+
+class _Timer:
+    """سياق القياس؛ كائن صغير بدل contextmanager لتقليل الكلفة في المسارات الساخنة."""
+    __slots__ = ('registry', 'name', 'start')
+
+    def __init__(self, registry: "Timings", name: str):
+        self.registry = registry
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.registry.record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+def _percentile(ordered, fraction: float) -> float:
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class Timings:
+    """
+    لكل عملية: العدد والمجموع والأقصى منذ البدء، وآخر RING_SIZE قياس في حلقة
+    ثابتة الحجم تحسب منها p50 و p95. آمن للاستخدام من خيط الحفظ والتصدير.
+    """
+
+    def __init__(self, ring_size: int = RING_SIZE):
+        self.ring_size = ring_size
+        self.started = datetime.now()
+        self._series: Dict[str, _Series] = {}
+        self._counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def timed(self, name: str) -> _Timer:
+        return _Timer(self, name)
+
+    def measured(self, name: str):
+        """مزخرف يقيس كل استدعاء للدالة تحت الاسم name."""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with _Timer(self, name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def record(self, name: str, seconds: float):
+        with self._lock:
+            series = self._series.get(name)
+            if series is None:
+                series = self._series[name] = _Series(self.ring_size)
+            series.samples.append(seconds)
+            series.count += 1
+            series.total += seconds
+            series.last = seconds
+            if seconds > series.max:
+                series.max = seconds
+
+    def count(self, name: str, n: int = 1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+            self._counters.clear()
+            self.started = datetime.now()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """الإحصائيات الحالية بالمللي ثانية؛ p50 و p95 من آخر القياسات فقط."""
+        with self._lock:
+            series = {name: (sorted(s.samples), s.count, s.total, s.max, s.last) for name, s in self._series.items()}
+            counters = dict(self._counters)
+        operations = {}
+        for name, (ordered, count, total, longest, last) in sorted(series.items()):
+            operations[name] = {
+                'count': count,
+                'p50_ms': _percentile(ordered, 0.50) * 1000,
+                'p95_ms': _percentile(ordered, 0.95) * 1000,
+                'max_ms': longest * 1000,
+                'last_ms': last * 1000,
+                'total_ms': total * 1000,
+            }
+        return {'since': self.started.isoformat(timespec='seconds'), 'operations': operations, 'counters': counters}
+
+    def dump(self, path: str):
+        """حفظ الإحصائيات كملف JSON (لإرسالها من نقطة البيع للدعم الفني)."""
+        report = self.snapshot()
+        report['created'] = datetime.now().isoformat(timespec='seconds')
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+class Profiler:
+    """التقاط cProfile للخيط الرئيسي بين start و stop (يبطئ التطبيق أثناء التشغيل)."""
+
+    def __init__(self):
+        self._profile: Optional[cProfile.Profile] = None
+
+    @property
+    def running(self) -> bool:
+        return self._profile is not None
+
+    def start(self):
+        if self._profile is None:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+
+    def stop(self, path: Optional[str] = None, top: int = 30) -> str:
+        """إيقاف الالتقاط وحفظه في path (صيغة pstats) إن حدد؛ يعيد أعلى top دوال حسب الزمن التراكمي."""
+        profile, self._profile = self._profile, None
+        if profile is None:
+            return ''
+        profile.disable()
+        if path:
+            profile.dump_stats(path)
+        out = io.StringIO()
+        pstats.Stats(profile, stream=out).sort_stats('cumulative').print_stats(top)
+        return out.getvalue()
+
+
+# السجل العام للتطبيق
+timings = Timings()
+timed = timings.timed
+measured = timings.measured
+count = timings.count
+snapshot = timings.snapshot
+dump = timings.dump
+profiler = Profiler()
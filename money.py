@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+المبالغ المالية كعدد صحيح من أجزاء المئة (قروش/هللات)
+Exact money values backed by integer minor units
+
+    price = Money.of('12.50')      # من الملف أو من حقل الإدخال
+    total = price * 3              # Money('37.50')
+    Money.sum(item['total'] for item in items)
+    f"{total:.2f}", str(total)     # '37.50' كما تحفظ في الملفات
+"""
+
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from typing import Dict, Iterable
+
+# عدد أجزاء العملة في الوحدة الواحدة
+MINOR_PER_UNIT = 100
+_ONE = Decimal('1')
+# النصوص المحللة مسبقاً: الأسعار والإجماليات تتكرر كثيراً في الملف، و Money ثابت
+# القيمة فتشارك النسخة نفسها. يفرغ عند امتلائه.
+_PARSED: Dict[str, "Money"] = {}
+PARSED_CACHE_SIZE = 1 << 16
+
+
+def _parse_minor(text: str) -> int:
+    """'12.5' أو '-3' إلى أجزاء المئة؛ أكثر من خانتين عشريتين تقرب لأقرب جزء. يرفع ValueError."""
+    body = text.strip()
+    sign = 1
+    if body[:1] in ('-', '+'):
+        sign = -1 if body[0] == '-' else 1
+        body = body[1:]
+    whole, _, fraction = body.partition('.')
+    # المسار السريع: خانتان عشريتان على الأكثر (كل القيم المحفوظة تقريباً)
+    if (whole or fraction) and len(fraction) <= 2 and (not whole or whole.isdigit()) and (not fraction or fraction.isdigit()):
+        return sign * (int(whole or '0') * MINOR_PER_UNIT + int(fraction.ljust(2, '0')))
+    try:
+        value = Decimal(body if sign > 0 else '-' + body)
+    except InvalidOperation:
+        raise ValueError(f"مبلغ غير صالح: {text}")
+    return _decimal_minor(value)
+
+
+def _decimal_minor(value: Decimal) -> int:
+    if not value.is_finite():
+        raise ValueError(f"مبلغ غير صالح: {value}")
+    return int(value.scaleb(2).quantize(_ONE, rounding=ROUND_HALF_UP))
+
+
+class Money:
+    """
+    مبلغ ثابت القيمة بعدد صحيح من أجزاء المئة: جمع وطرح وضرب في الكمية بدقة
+    كاملة دون حد لعدد الخانات. الجمع مع 0 مسموح حتى تعمل sum()، والمقارنة مع
+    الأعداد الصحيحة (price < 0). str() و format(..., '.2f') بخانتين دائماً.
+    """
+
+    __slots__ = ('minor',)
+
+    def __init__(self, minor: int = 0):
+        self.minor = minor
+
+    @classmethod
+    def of(cls, value) -> "Money":
+        """من نص أو عدد أو Decimal (صيغ الملفات الحالية، ومنها 10.0 العشري). يرفع ValueError."""
+        kind = type(value)
+        if kind is Money:
+            return value
+        if kind is int:
+            return cls(value * MINOR_PER_UNIT)
+        if kind is str:
+            money = _PARSED.get(value)
+            if money is None:
+                if len(_PARSED) >= PARSED_CACHE_SIZE:
+                    _PARSED.clear()
+                money = _PARSED[value] = cls(_parse_minor(value)) if value.strip() else ZERO
+            return money
+        if value is None:
+            return ZERO
+        if isinstance(value, Decimal):
+            return cls(_decimal_minor(value))
+        if isinstance(value, float):
+            # repr يعطي أقصر تمثيل (10.1 وليس 10.0999...)
+            return cls(_parse_minor(repr(value)))
+        raise ValueError(f"مبلغ غير صالح: {value!r}")
+
+    @classmethod
+    def sum(cls, values: Iterable["Money"]) -> "Money":
+        """جمع سريع: أعداد صحيحة فقط داخل الحلقة."""
+        return cls(sum(value.minor for value in values))
+
+    def to_decimal(self) -> Decimal:
+        return Decimal(self.minor).scaleb(-2)
+
+    # --- الحساب ---
+    def __add__(self, other):
+        if type(other) is Money:
+            return Money(self.minor + other.minor)
+        if other == 0 and type(other) is int:
+            return self
+        return NotImplemented
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        if type(other) is Money:
+            return Money(self.minor - other.minor)
+        if other == 0 and type(other) is int:
+            return self
+        return NotImplemented
+
+    def __rsub__(self, other):
+        if other == 0 and type(other) is int:
+            return Money(-self.minor)
+        return NotImplemented
+
+    def __mul__(self, quantity):
+        if type(quantity) is int:
+            return Money(self.minor * quantity)
+        return NotImplemented
+
+    __rmul__ = __mul__
+
+    def __neg__(self) -> "Money":
+        return Money(-self.minor)
+
+    def __pos__(self) -> "Money":
+        return self
+
+    def __abs__(self) -> "Money":
+        return Money(abs(self.minor))
+
+    def __bool__(self) -> bool:
+        return self.minor != 0
+
+    def __float__(self) -> float:
+        return self.minor / MINOR_PER_UNIT
+
+    # --- المقارنة ---
+    def _other_minor(self, other):
+        if type(other) is Money:
+            return other.minor
+        if type(other) is int:
+            return other * MINOR_PER_UNIT
+        return None
+
+    def __eq__(self, other):
+        minor = self._other_minor(other)
+        return NotImplemented if minor is None else self.minor == minor
+
+    def __hash__(self):
+        # يساوي hash العدد الصحيح المكافئ حتى يتفق مع Money(500) == 5
+        return hash(self.minor // MINOR_PER_UNIT) if self.minor % MINOR_PER_UNIT == 0 else hash((Money, self.minor))
+
+    def __lt__(self, other):
+        minor = self._other_minor(other)
+        return NotImplemented if minor is None else self.minor < minor
+
+    def __le__(self, other):
+        minor = self._other_minor(other)
+        return NotImplemented if minor is None else self.minor <= minor
+
+    def __gt__(self, other):
+        minor = self._other_minor(other)
+        return NotImplemented if minor is None else self.minor > minor
+
+    def __ge__(self, other):
+        minor = self._other_minor(other)
+        return NotImplemented if minor is None else self.minor >= minor
+
+    # --- العرض ---
+    def __str__(self) -> str:
+        if self.minor < 0:
+            return '-%d.%02d' % divmod(-self.minor, MINOR_PER_UNIT)
+        return '%d.%02d' % divmod(self.minor, MINOR_PER_UNIT)
+
+    def __repr__(self) -> str:
+        return f"Money('{self}')"
+
+    def __format__(self, spec: str) -> str:
+        if spec in ('', '.2f'):
+            return str(self)
+        if spec == ',.2f':
+            units, cents = divmod(abs(self.minor), MINOR_PER_UNIT)
+            return f"{'-' if self.minor < 0 else ''}{units:,}.{cents:02d}"
+        return format(self.to_decimal(), spec)
+
+    def __reduce__(self):
+        return Money, (self.minor,)
+
+
+ZERO = Money(0)
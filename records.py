@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+سجلات البيانات كفئات بحقول ثابتة (__slots__) بدل قاموس لكل سجل
+Slotted record types for products, sales, sale items, expenses and rentals
+
+    sale = Sale.from_json(raw)     # من الملف: المبالغ Money والنصوص المتكررة مشتركة
+    sale.total, sale['total']      # كخاصية في المسارات الساخنة أو كقاموس في الواجهة
+    raw = sale.to_json()           # إلى JSON: المبالغ نصوص "12.50"
+
+ترتيب FIELDS يبدأ بأعمدة snapshot.SCHEMAS بالترتيب نفسه، فتبنى السجلات من
+أعمدة اللقطة مباشرة بالمواقع.
+"""
+
+from operator import attrgetter
+from sys import intern
+from typing import Any, Dict, List, Optional, Tuple
+
+from money import Money
+
+
+def _intern(value):
+    return intern(value) if type(value) is str else value
+
+
+class Record:
+    """
+    أساس السجلات: حقول المخطط في __slots__ وأي مفاتيح أخرى من الملف في extra
+    (قاموس أو None). يدعم عمليات القاموس التي تستخدمها الواجهة (record['name']
+    و get و in و update و dict(record)). حقول المخطط موجودة دائماً ولو كانت None
+    (تكتب null في JSON)، و KeyError للمفاتيح غير المعروفة فقط. get وحدها تعيد
+    default للحقل الفارغ، كما تتوقع شاشات العرض (get('description', '')).
+    """
+
+    __slots__ = ('extra',)
+
+    FIELDS: Tuple[str, ...] = ()
+    # الحقول المالية (Money في الذاكرة، نص في JSON) والنصوص المتكررة بين السجلات
+    MONEY: Tuple[str, ...] = ()
+    INTERNED: Tuple[str, ...] = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.FIELDSET = frozenset(cls.FIELDS)
+        # قراءة كل الحقول كصف واحد (attrgetter أسرع من getattr في حلقة)
+        cls._values = attrgetter(*cls.FIELDS)
+        cls._decoders = tuple((field, Money.of if field in cls.MONEY else _intern if field in cls.INTERNED else None)
+                              for field in cls.FIELDS)
+
+    # --- التحويل من وإلى JSON ---
+    @classmethod
+    def from_json(cls, raw: Dict[str, Any]) -> "Record":
+        get = raw.get
+        record = cls(*[get(field) if decode is None else decode(get(field)) for field, decode in cls._decoders])
+        if not raw.keys() <= cls.FIELDSET:
+            record.extra = {key: value for key, value in raw.items() if key not in cls.FIELDSET}
+        return record
+
+    def to_json(self) -> Dict[str, Any]:
+        raw = {}
+        for field, value in zip(self.FIELDS, self._values(self)):
+            raw[field] = str(Money.of(value)) if field in self.MONEY else value
+        if self.extra:
+            raw.update(self.extra)
+        return raw
+
+    def copy(self) -> "Record":
+        record = type(self)(*self._values(self))
+        if self.extra is not None:
+            record.extra = dict(self.extra)
+        return record
+
+    # --- عمليات القاموس ---
+    def __getitem__(self, key: str):
+        if key in self.FIELDSET:
+            return getattr(self, key)
+        if self.extra is not None and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key: str, value):
+        if key in self.FIELDSET:
+            setattr(self, key, value)
+        elif self.extra is None:
+            self.extra = {key: value}
+        else:
+            self.extra[key] = value
+
+    def get(self, key: str, default=None):
+        if key in self.FIELDSET:
+            value = getattr(self, key)
+            return default if value is None else value
+        return default if self.extra is None else self.extra.get(key, default)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.FIELDSET or (self.extra is not None and key in self.extra)
+
+    def keys(self) -> List[str]:
+        keys = list(self.FIELDS)
+        if self.extra:
+            keys.extend(self.extra)
+        return keys
+
+    def leftover(self, stored) -> Dict[str, Any]:
+        """
+        الحقول خارج الأعمدة stored لعمود extra في التخزين الثنائي: حقول المخطط الفارغة
+        لا تكتب لأن القراءة تعيدها None، أما مفاتيح extra فتحفظ كما هي ولو كانت null.
+        """
+        fields = {field: value for field, value in zip(self.FIELDS, self._values(self))
+                  if value is not None and field not in stored}
+        if self.extra:
+            fields.update((key, value) for key, value in self.extra.items() if key not in stored)
+        return fields
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def update(self, fields: Dict[str, Any]):
+        for key, value in fields.items():
+            self[key] = value
+
+    def __eq__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+        return self._values(self) == other._values(other) and (self.extra or None) == (other.extra or None)
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({dict(self)!r})"
+
+
+class Product(Record):
+    FIELDS = ('id', 'name', 'price', 'stock', 'description', 'barcode')
+    __slots__ = FIELDS
+    MONEY = ('price',)
+    # معرف المنتج واسمه يتكرران في كل بند فاتورة
+    INTERNED = ('id', 'name')
+
+    def __init__(self, id=None, name=None, price=None, stock=None, description=None, barcode=None,
+                 extra: Optional[Dict[str, Any]] = None):
+        self.id = id
+        self.name = name
+        self.price = price
+        self.stock = stock
+        self.description = description
+        self.barcode = barcode
+        self.extra = extra
+
+
+class SaleItem(Record):
+    FIELDS = ('id', 'name', 'price', 'quantity', 'total')
+    __slots__ = FIELDS
+    MONEY = ('price', 'total')
+    INTERNED = ('id', 'name')
+
+    def __init__(self, id=None, name=None, price=None, quantity=None, total=None,
+                 extra: Optional[Dict[str, Any]] = None):
+        self.id = id
+        self.name = name
+        self.price = price
+        self.quantity = quantity
+        self.total = total
+        self.extra = extra
+
+    @classmethod
+    def from_json(cls, raw: Dict[str, Any]) -> "SaleItem":
+        # نفس Record.from_json مكتوبة صراحة: البنود أكثر السجلات عدداً
+        get = raw.get
+        item = cls(_intern(get('id')), _intern(get('name')), Money.of(get('price')), get('quantity'), Money.of(get('total')))
+        if not raw.keys() <= cls.FIELDSET:
+            item.extra = {key: value for key, value in raw.items() if key not in cls.FIELDSET}
+        return item
+
+
+class Sale(Record):
+    FIELDS = ('id', 'date', 'customer', 'payment_method', 'status', 'total', 'items', 'bank_details')
+    __slots__ = FIELDS
+    MONEY = ('total',)
+    INTERNED = ('customer', 'payment_method', 'status')
+
+    def __init__(self, id=None, date=None, customer=None, payment_method=None, status=None, total=None,
+                 items: Optional[List[SaleItem]] = None, bank_details=None, extra: Optional[Dict[str, Any]] = None):
+        self.id = id
+        self.date = date
+        self.customer = customer
+        self.payment_method = payment_method
+        self.status = status
+        self.total = total
+        self.items = [] if items is None else items
+        self.bank_details = bank_details
+        self.extra = extra
+
+    @classmethod
+    def from_json(cls, raw: Dict[str, Any]) -> "Sale":
+        get = raw.get
+        items = get('items')
+        sale = cls(get('id'), get('date'), _intern(get('customer')), _intern(get('payment_method')),
+                   _intern(get('status')), Money.of(get('total')),
+                   list(map(SaleItem.from_json, items)) if items else [], get('bank_details'))
+        if not raw.keys() <= cls.FIELDSET:
+            sale.extra = {key: value for key, value in raw.items() if key not in cls.FIELDSET}
+        return sale
+
+    def to_json(self) -> Dict[str, Any]:
+        raw = super().to_json()
+        raw['items'] = [item.to_json() for item in self.items]
+        return raw
+
+    def copy(self) -> "Sale":
+        sale = super().copy()
+        sale.items = [item.copy() for item in self.items]
+        return sale
+
+
+class Expense(Record):
+    FIELDS = ('id', 'date', 'description', 'amount')
+    __slots__ = FIELDS
+    MONEY = ('amount',)
+    INTERNED = ('description',)
+
+    def __init__(self, id=None, date=None, description=None, amount=None, extra: Optional[Dict[str, Any]] = None):
+        self.id = id
+        self.date = date
+        self.description = description
+        self.amount = amount
+        self.extra = extra
+
+
+class Rental(Record):
+    FIELDS = ('id', 'book_id', 'book_name', 'renter_name', 'rental_date', 'due_date', 'status', 'amount')
+    __slots__ = FIELDS
+    MONEY = ('amount',)
+    INTERNED = ('book_id', 'book_name', 'status')
+
+    def __init__(self, id=None, book_id=None, book_name=None, renter_name=None, rental_date=None, due_date=None,
+                 status=None, amount=None, extra: Optional[Dict[str, Any]] = None):
+        self.id = id
+        self.book_id = book_id
+        self.book_name = book_name
+        self.renter_name = renter_name
+        self.rental_date = rental_date
+        self.due_date = due_date
+        self.status = status
+        self.amount = amount
+        self.extra = extra
+
+
+# فئة السجل لكل مجموعة في البيانات (وبنود الفواتير في اللقطة)
+RECORD_TYPES = {
+    'inventory': Product,
+    'sales': Sale,
+    'sale_items': SaleItem,
+    'expenses': Expense,
+    'rentals': Rental,
+}
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ملخصات مالية يومية وشهرية وترتيب المنتجات الأكثر مبيعاً، تحدث تدريجياً
+Incrementally maintained daily/monthly financial rollups and best-sellers leaderboard
+"""
+
+import heapq
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Any, Optional, Tuple
+
+from money import Money
+from records import Expense, Sale
+
+
+class Bucket:
+    """
+    إجماليات فترة واحدة (يوم أو شهر أو كل الفترات). المجاميع أعداد صحيحة
+    بالهللات حتى يبقى التحديث جمع أعداد فقط، وتعرض كـ Money عند القراءة.
+    """
+
+    __slots__ = ('sales_minor', 'sales_count', 'expenses_minor', 'expenses_count', 'payment_minor')
+
+    def __init__(self):
+        self.sales_minor = 0
+        self.sales_count = 0
+        self.expenses_minor = 0
+        self.expenses_count = 0
+        self.payment_minor: Dict[str, int] = {}
+
+    @property
+    def sales_total(self) -> Money:
+        return Money(self.sales_minor)
+
+    @property
+    def expenses_total(self) -> Money:
+        return Money(self.expenses_minor)
+
+    @property
+    def profit(self) -> Money:
+        return Money(self.sales_minor - self.expenses_minor)
+
+    @property
+    def by_payment(self) -> Dict[str, Money]:
+        return {method: Money(minor) for method, minor in self.payment_minor.items()}
+
+
+EMPTY = Bucket()
+
+
+class Rollups:
+    """
+    مخزن إجماليات مفهرس باليوم والشهر. يبنى من البيانات الخام عند التحميل فقط،
+    ثم يحدث في O(1) عند كل بيع أو إضافة مصروف أو حذفه.
+    """
+
+    def __init__(self):
+        self.days: Dict[date, Bucket] = {}
+        self.months: Dict[Tuple[int, int], Bucket] = {}
+        self.all_time = Bucket()
+
+    def rebuild(self, data: Dict[str, List[Dict[str, Any]]], when):
+        """
+        إعادة البناء من البيانات الخام. when(collection, record) تعيد التاريخ
+        المحلل مسبقاً (DataIndex.when).
+        """
+        self.days.clear()
+        self.months.clear()
+        self.all_time = Bucket()
+        for sale in data['sales']:
+            self.add_sale(sale, when('sales', sale))
+        for expense in data['expenses']:
+            self.add_expense(expense, when('expenses', expense))
+
+    def _buckets(self, dt: Optional[datetime]) -> List[Bucket]:
+        # السجلات بتاريخ غير صالح تحتسب في الإجمالي العام فقط
+        if dt is None:
+            return [self.all_time]
+        day = dt.date()
+        month = (dt.year, dt.month)
+        day_bucket = self.days.get(day)
+        if day_bucket is None:
+            day_bucket = self.days[day] = Bucket()
+        month_bucket = self.months.get(month)
+        if month_bucket is None:
+            month_bucket = self.months[month] = Bucket()
+        return [day_bucket, month_bucket, self.all_time]
+
+    def add_sale(self, sale: Sale, dt: Optional[datetime], sign: int = 1):
+        total = sale.total.minor * sign
+        method = sale.payment_method or ''
+        for bucket in self._buckets(dt):
+            bucket.sales_minor += total
+            bucket.sales_count += sign
+            bucket.payment_minor[method] = bucket.payment_minor.get(method, 0) + total
+
+    def remove_sale(self, sale: Sale, dt: Optional[datetime]):
+        self.add_sale(sale, dt, sign=-1)
+
+    def add_expense(self, expense: Expense, dt: Optional[datetime], sign: int = 1):
+        amount = expense.amount.minor * sign
+        for bucket in self._buckets(dt):
+            bucket.expenses_minor += amount
+            bucket.expenses_count += sign
+
+    def remove_expense(self, expense: Expense, dt: Optional[datetime]):
+        self.add_expense(expense, dt, sign=-1)
+
+    def add_archived(self, month: Tuple[int, int], sales: Optional[Dict[str, Any]], expenses: Optional[Dict[str, Any]]):
+        """إضافة إجماليات شهر مؤرشف (من manifest الأرشيف) دون تحميل سجلاته."""
+        month_bucket = self.months.get(month)
+        if month_bucket is None:
+            month_bucket = self.months[month] = Bucket()
+        for summary, total_field, count_field in ((sales, 'sales_minor', 'sales_count'), (expenses, 'expenses_minor', 'expenses_count')):
+            if not summary:
+                continue
+            for day_text, (amount, count) in summary['days'].items():
+                day = date.fromisoformat(day_text)
+                day_bucket = self.days.get(day)
+                if day_bucket is None:
+                    day_bucket = self.days[day] = Bucket()
+                setattr(day_bucket, total_field, getattr(day_bucket, total_field) + Money.of(amount).minor)
+                setattr(day_bucket, count_field, getattr(day_bucket, count_field) + count)
+            for bucket in (month_bucket, self.all_time):
+                setattr(bucket, total_field, getattr(bucket, total_field) + Money.of(summary['total']).minor)
+                setattr(bucket, count_field, getattr(bucket, count_field) + summary['count'])
+        if sales:
+            for method, amount in sales['by_payment'].items():
+                for bucket in (month_bucket, self.all_time):
+                    bucket.payment_minor[method] = bucket.payment_minor.get(method, 0) + Money.of(amount).minor
+
+    # --- الاستعلام ---
+    def day(self, day: date) -> Bucket:
+        return self.days.get(day, EMPTY)
+
+    def month(self, year: int, month: int) -> Bucket:
+        return self.months.get((year, month), EMPTY)
+
+
+class Tally:
+    """مبيعات منتج واحد: عدد القطع والإيراد (بالهللات)."""
+
+    __slots__ = ('units', 'revenue_minor')
+
+    def __init__(self):
+        self.units = 0
+        self.revenue_minor = 0
+
+    @property
+    def revenue(self) -> Money:
+        return Money(self.revenue_minor)
+
+
+class Leaderboard:
+    """
+    عدادات مبيعات لكل منتج تحدث عند كل بيع، إجمالية ولكل يوم.
+    استعلام الأكثر مبيعاً يجمع أيام النافذة فقط (7 أو 30 يوماً) ثم يختار
+    أعلى n بكومة (heapq) دون ترتيب كل المنتجات.
+    """
+
+    def __init__(self):
+        self.all_time: Dict[str, Tally] = {}
+        self.days: Dict[date, Dict[str, Tally]] = {}
+        # آخر اسم معروف لكل منتج (قد يحذف المنتج من المخزون لاحقاً)
+        self.names: Dict[str, str] = {}
+
+    def rebuild(self, sales: List[Sale], when):
+        """إعادة البناء من الفواتير. when(collection, record) تعيد التاريخ المحلل (DataIndex.when)."""
+        self.all_time.clear()
+        self.days.clear()
+        self.names.clear()
+        for sale in sales:
+            self.add_sale(sale, when('sales', sale))
+
+    def add_sale(self, sale: Sale, dt: Optional[datetime], sign: int = 1):
+        # الفواتير بتاريخ غير صالح تحتسب في الترتيب الإجمالي فقط
+        day_tallies = None
+        if dt is not None:
+            day_tallies = self.days.get(dt.date())
+            if day_tallies is None:
+                day_tallies = self.days[dt.date()] = {}
+        for item in sale.items:
+            product_id = item.id or item.name
+            self.names[product_id] = item.name
+            units = item.quantity * sign
+            revenue = item.total.minor * sign
+            for tallies in (self.all_time, day_tallies):
+                if tallies is None:
+                    continue
+                tally = tallies.get(product_id)
+                if tally is None:
+                    tally = tallies[product_id] = Tally()
+                tally.units += units
+                tally.revenue_minor += revenue
+
+    def remove_sale(self, sale: Sale, dt: Optional[datetime]):
+        self.add_sale(sale, dt, sign=-1)
+
+    def add_archived(self, sales: Dict[str, Any]):
+        """إضافة مبيعات شهر مؤرشف إلى الترتيب الإجمالي (النوافذ المتحركة تغطيها البيانات الحالية)."""
+        for product_id, (name, units, revenue) in sales['products'].items():
+            self.names.setdefault(product_id, name)
+            tally = self.all_time.get(product_id)
+            if tally is None:
+                tally = self.all_time[product_id] = Tally()
+            tally.units += units
+            tally.revenue_minor += Money.of(revenue).minor
+
+    def top(self, n: int = 10, days: Optional[int] = None, by: str = 'units',
+            today: Optional[date] = None) -> List[Tuple[str, int, Money]]:
+        """
+        أعلى n منتجات كـ (الاسم، القطع، الإيراد). days=None للترتيب الإجمالي،
+        أو عدد الأيام الأخيرة (شاملة اليوم). by هو 'units' أو 'revenue'.
+        """
+        if days is None:
+            tallies = self.all_time
+        else:
+            today = today or date.today()
+            tallies = {}
+            for offset in range(days):
+                for product_id, tally in self.days.get(today - timedelta(days=offset), {}).items():
+                    total = tallies.get(product_id)
+                    if total is None:
+                        total = tallies[product_id] = Tally()
+                    total.units += tally.units
+                    total.revenue_minor += tally.revenue_minor
+        field = 'revenue_minor' if by == 'revenue' else by
+        best = heapq.nlargest(n, tallies.items(), key=lambda pair: getattr(pair[1], field))
+        return [(self.names[product_id], tally.units, tally.revenue) for product_id, tally in best if tally.units > 0]
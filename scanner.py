@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+التقاط قراءات ماسح الباركود (لوحة مفاتيح) في نقطة البيع
+Keyboard-wedge barcode scanner capture for the point of sale
+"""
+
+from typing import Callable, List
+
+# أقصى فاصل بين ضغطتين متتاليتين من الماسح (بالمللي ثانية)
+MAX_KEY_INTERVAL_MS = 50
+# أقل طول مقبول لرمز الباركود
+MIN_CODE_LENGTH = 4
+
+
+def normalize_barcode(code) -> str:
+    """توحيد الباركود/ISBN: حذف المسافات والشرطات."""
+    return ''.join(ch for ch in str(code or '') if ch not in ' -').upper()
+
+
+class ScanListener:
+    """
+    يميز دفعات الماسح (ضغطات سريعة جداً تنتهي بـ Enter) عن كتابة المستخدم
+    في النافذة الرئيسية فقط (لا في الحوارات مثل حوار إضافة منتج).
+    عند اكتمال دفعة تحذف أحرفها من الحقل الذي كتبت فيه ويستدعى on_scan(code).
+    الكتابة العادية تمر دون تغيير.
+    """
+
+    def __init__(self, widget, on_scan: Callable[[str], None],
+                 max_interval_ms: int = MAX_KEY_INTERVAL_MS, min_length: int = MIN_CODE_LENGTH):
+        self.on_scan = on_scan
+        self.max_interval_ms = max_interval_ms
+        self.min_length = min_length
+        self.enabled = True
+        self.buffer: List[str] = []
+        self.last_time = None
+        self.toplevel = str(widget.winfo_toplevel())
+        widget.bind_all('<Key>', self._on_key, add='+')
+
+    def _on_key(self, event):
+        if not self.enabled:
+            return None
+        try:
+            if str(event.widget.winfo_toplevel()) != self.toplevel:
+                return None
+        except Exception:
+            # أحداث من عناصر داخلية بلا كائن Python (مثل قائمة Combobox المنسدلة)
+            return None
+        fast = self.last_time is not None and 0 <= event.time - self.last_time <= self.max_interval_ms
+        self.last_time = event.time
+        if event.keysym in ('Return', 'KP_Enter'):
+            code = ''.join(self.buffer)
+            self.buffer = []
+            if fast and len(code) >= self.min_length:
+                self._strip_from(event.widget, code)
+                self.on_scan(code)
+            return None
+        if len(event.char) != 1 or not event.char.isprintable():
+            return None
+        if not fast:
+            # ضغطة بطيئة: بداية دفعة جديدة محتملة
+            self.buffer = []
+        self.buffer.append(event.char)
+        return None
+
+    @staticmethod
+    def _strip_from(widget, code: str):
+        """حذف أحرف الدفعة التي وصلت إلى حقل الإدخال قبل التعرف عليها."""
+        try:
+            text = widget.get()
+            if isinstance(text, str) and text.endswith(code):
+                widget.delete(len(text) - len(code), 'end')
+        except Exception:
+            pass
@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+فهارس البحث النصي (n-gram) في الفواتير والمنتجات
+N-gram search indexes over sales and products
+"""
+
+import heapq
+import re
+from bisect import bisect_left, insort
+from typing import Dict, List, Any, Iterable, Optional, Set, Tuple
+
+from records import Sale
+
+GRAM = 3
+
+# التشكيل وعلامة المد (ـ) تحذف، وصور الحرف الواحد توحد
+ARABIC_MARKS = re.compile('[\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06ed\u0640]')
+ARABIC_LETTERS = str.maketrans({
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ة': 'ه', 'ى': 'ي', 'ؤ': 'و', 'ئ': 'ي',
+})
+
+
+def normalize_text(text: Any) -> str:
+    """
+    توحيد النص للبحث: تجاهل حالة الأحرف والمسافات الزائدة والتشكيل والتطويل،
+    وتوحيد صور الألف والهمزة والتاء المربوطة والألف المقصورة.
+    """
+    text = ARABIC_MARKS.sub('', str(text or '')).translate(ARABIC_LETTERS)
+    return ' '.join(text.split()).casefold()
+
+
+def grams(text: str) -> Set[str]:
+    """المقاطع الثلاثية للنص (النص القصير يعيد نفسه)."""
+    if len(text) <= GRAM:
+        return {text} if text else set()
+    return {text[i:i + GRAM] for i in range(len(text) - GRAM + 1)}
+
+
+class TextIndex:
+    """
+    فهرس مقاطع ثلاثية فوق النصوص المميزة فقط: كل نص يرتبط بمجموعة مفاتيح
+    (معرفات سجلات). أسماء العملاء والمنتجات تتكرر كثيراً، فالفهرس يبقى صغيراً
+    مهما زاد عدد الفواتير.
+    """
+
+    def __init__(self):
+        self.keys_of: Dict[str, Set[str]] = {}
+        self.texts_of_gram: Dict[str, Set[str]] = {}
+
+    def add(self, text: str, key: str):
+        keys = self.keys_of.get(text)
+        if keys is None:
+            keys = self.keys_of[text] = set()
+            for gram in grams(text):
+                self.texts_of_gram.setdefault(gram, set()).add(text)
+        keys.add(key)
+
+    def discard(self, text: str, key: str):
+        keys = self.keys_of.get(text)
+        if keys is None:
+            return
+        keys.discard(key)
+        if not keys:
+            del self.keys_of[text]
+            for gram in grams(text):
+                texts = self.texts_of_gram.get(gram)
+                if texts is not None:
+                    texts.discard(text)
+                    if not texts:
+                        del self.texts_of_gram[gram]
+
+    def matching_texts(self, query: str) -> Iterable[str]:
+        """النصوص التي تحتوي الاستعلام كنص فرعي."""
+        if len(query) < GRAM:
+            # الاستعلام القصير يفحص النصوص المميزة مباشرة
+            return [text for text in self.keys_of if query in text]
+        candidates: Optional[Set[str]] = None
+        for gram in sorted(grams(query), key=lambda g: len(self.texts_of_gram.get(g, ()))):
+            texts = self.texts_of_gram.get(gram)
+            if not texts:
+                return []
+            candidates = set(texts) if candidates is None else candidates & texts
+            if not candidates:
+                return []
+        return [text for text in candidates if query in text]
+
+    def search(self, query: str) -> Set[str]:
+        result: Set[str] = set()
+        for text in self.matching_texts(query):
+            result |= self.keys_of[text]
+        return result
+
+
+class SalesSearch:
+    """
+    البحث في الفواتير باسم العميل أو أسماء المنتجات (نص فرعي) أو بداية رقم الفاتورة.
+    يبنى عند أول بحث (حتى لا يبطئ بدء التشغيل) ثم يحدث عند كل بيع.
+    """
+
+    def __init__(self, sales: Optional[List[Dict[str, Any]]] = None):
+        self.rebuild(sales if sales is not None else [])
+
+    def rebuild(self, sales: List[Dict[str, Any]]):
+        """ربط الفهرس بقائمة الفواتير؛ البناء الفعلي مؤجل حتى أول بحث."""
+        self.sales = sales
+        self.built = False
+
+    def _build(self):
+        sales = self.sales
+        self.text = TextIndex()
+        # أرقام الفواتير مرتبة للبحث بالبادئة
+        self.ids: List[str] = sorted(normalize_text(sale['id']) for sale in sales)
+        self.id_map: Dict[str, str] = {}
+        # الأسماء تتكرر كثيراً، فيحفظ ناتج التوحيد لكل نص خام
+        self.normalized: Dict[Any, str] = {}
+        for sale in sales:
+            self._index(sale)
+        self.built = True
+
+    def _normalize(self, text: Any) -> str:
+        result = self.normalized.get(text)
+        if result is None:
+            result = self.normalized[text] = normalize_text(text)
+        return result
+
+    def _terms(self, sale: Sale) -> Set[str]:
+        terms = {self._normalize(sale.customer)}
+        terms.update(self._normalize(item.name) for item in sale.items)
+        terms.discard('')
+        return terms
+
+    def _index(self, sale: Dict[str, Any]):
+        self.id_map[normalize_text(sale['id'])] = sale['id']
+        for term in self._terms(sale):
+            self.text.add(term, sale['id'])
+
+    def add(self, sale: Dict[str, Any]):
+        if not self.built:
+            return
+        insort(self.ids, normalize_text(sale['id']))
+        self._index(sale)
+
+    def remove(self, sale: Dict[str, Any]):
+        if not self.built:
+            return
+        key = normalize_text(sale['id'])
+        pos = bisect_left(self.ids, key)
+        if pos < len(self.ids) and self.ids[pos] == key:
+            del self.ids[pos]
+        self.id_map.pop(key, None)
+        for term in self._terms(sale):
+            self.text.discard(term, sale['id'])
+
+    def search(self, query: str) -> Set[str]:
+        """معرفات الفواتير المطابقة للاستعلام."""
+        query = normalize_text(query)
+        if not query:
+            return set()
+        if not self.built:
+            self._build()
+        result = self.text.search(query)
+        pos = bisect_left(self.ids, query)
+        while pos < len(self.ids) and self.ids[pos].startswith(query):
+            result.add(self.id_map[self.ids[pos]])
+            pos += 1
+        return result
+
+
+class ProductFinder:
+    """
+    البحث التقريبي عن المنتجات بالاسم لنقطة البيع. الترتيب: تطابق تام، ثم بداية
+    الاسم، ثم نص فرعي، ثم التشابه بالمقاطع الثلاثية (لتحمل الأخطاء الإملائية).
+    يبنى عند أول بحث، ثم يحدث مع كل إضافة أو تعديل أو حذف عبر DataIndex.
+    """
+
+    # أقل نسبة مقاطع مشتركة لقبول نتيجة تقريبية
+    MIN_SIMILARITY = 0.4
+    # المقاطع الموجودة في أكثر من هذه النسبة من المنتجات لا تفيد في التشابه (مثل "ال")
+    COMMON_GRAM = 0.05
+
+    def __init__(self, products: Optional[List[Dict[str, Any]]] = None):
+        self.source = products if products is not None else []
+        self.built = False
+
+    def _build(self):
+        self.products: Dict[str, Dict[str, Any]] = {}
+        self.names: Dict[str, str] = {}
+        self.gram_count: Dict[str, int] = {}
+        self.postings: Dict[str, Set[str]] = {}
+        self.built = True
+        for product in self.source:
+            self.add(product)
+
+    @staticmethod
+    def _grams(name: str) -> Set[str]:
+        # الحشو بمسافات يعطي وزناً لبداية الكلمات ونهايتها
+        return grams(f" {name} ")
+
+    def add(self, product: Dict[str, Any]):
+        if not self.built:
+            return
+        name = normalize_text(product['name'])
+        product_grams = self._grams(name)
+        self.products[product['id']] = product
+        self.names[product['id']] = name
+        self.gram_count[product['id']] = len(product_grams)
+        for gram in product_grams:
+            self.postings.setdefault(gram, set()).add(product['id'])
+
+    def remove(self, product: Dict[str, Any]):
+        if not self.built:
+            return
+        name = self.names.pop(product['id'], None)
+        self.products.pop(product['id'], None)
+        self.gram_count.pop(product['id'], None)
+        if name is None:
+            return
+        for gram in self._grams(name):
+            ids = self.postings.get(gram)
+            if ids is not None:
+                ids.discard(product['id'])
+                if not ids:
+                    del self.postings[gram]
+
+    def rename(self, product: Dict[str, Any]):
+        """إعادة فهرسة المنتج بعد تغيير اسمه."""
+        self.remove(product)
+        self.add(product)
+
+    def _containing(self, query: str) -> Iterable[str]:
+        """معرفات المنتجات التي يحتوي اسمها الاستعلام (تقاطع القوائم من الأندر)."""
+        if len(query) < GRAM:
+            return [pid for pid, name in self.names.items() if query in name]
+        candidates: Optional[Set[str]] = None
+        for gram in sorted(grams(query), key=lambda g: len(self.postings.get(g, ()))):
+            ids = self.postings.get(gram)
+            if not ids:
+                return []
+            candidates = set(ids) if candidates is None else candidates & ids
+            if len(candidates) <= 1:
+                break
+        if len(query) == GRAM:
+            return candidates
+        return [pid for pid in candidates if query in self.names[pid]]
+
+    def _similar(self, query: str, exclude: Set[str]) -> List[Tuple[float, str]]:
+        """المنتجات المتشابهة بالمقاطع النادرة فقط، مع نسبة التشابه."""
+        query_grams = self._grams(query)
+        common = max(50, int(len(self.products) * self.COMMON_GRAM))
+        selective = [gram for gram in query_grams if len(self.postings.get(gram, ())) <= common]
+        shared: Dict[str, int] = {}
+        for gram in selective:
+            for pid in self.postings.get(gram, ()):
+                shared[pid] = shared.get(pid, 0) + 1
+        result = []
+        for pid, count in shared.items():
+            if pid in exclude:
+                continue
+            similarity = count / len(selective)
+            if similarity >= self.MIN_SIMILARITY:
+                # عند التساوي يفضل الاسم الأقرب طولاً إلى الاستعلام
+                result.append((similarity, -abs(self.gram_count[pid] - len(query_grams)), pid))
+        return result
+
+    def find(self, query: str, limit: int = 20, in_stock: bool = False) -> List[Dict[str, Any]]:
+        """أفضل المنتجات المطابقة للاستعلام مرتبة حسب الصلة."""
+        query = normalize_text(query)
+        if not query:
+            return []
+        if not self.built:
+            self._build()
+
+        def available(pid):
+            return not in_stock or self.products[pid].get('stock', 0) > 0
+
+        matches = [pid for pid in self._containing(query) if available(pid)]
+        ranked = heapq.nsmallest(limit, matches, key=lambda pid: (
+            0 if self.names[pid] == query else 1 if self.names[pid].startswith(query) else 2,
+            len(self.names[pid]), self.names[pid]))
+        if len(ranked) < limit:
+            similar = [entry for entry in self._similar(query, set(matches)) if available(entry[2])]
+            ranked += [entry[2] for entry in heapq.nlargest(limit - len(ranked), similar)]
+        return [self.products[pid] for pid in ranked]
+
+    def best(self, query: str) -> Optional[Dict[str, Any]]:
+        """
+        المنتج الذي يطابق اسمه الاستعلام بعد التوحيد فقط. الأسماء الجزئية والمشابهة
+        لا تختار تلقائياً (تعرض في الاقتراحات ليختار البائع منها).
+        """
+        matches = self.find(query, limit=1)
+        if matches and self.names[matches[0]['id']] == normalize_text(query):
+            return matches[0]
+        return None
@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+خادم نقاط البيع: يملك ملف البيانات وتتصل به عدة أجهزة بيع عبر HTTP
+Local store server shared by several POS terminals
+
+    python server.py --data sales_data.json --host 0.0.0.0 --port 8765 --token سر
+
+الواجهات (JSON):
+    GET  /data                 كل البيانات مع رقم آخر تغيير (seq) ومعرف تشغيل الخادم (instance)
+    GET  /changes?since=N&wait=25
+                               التغييرات بعد N؛ ينتظر حتى wait ثانية إن لم يوجد جديد
+
+التسلسل يبدأ من الصفر مع كل تشغيل للخادم، فكل رد يحمل instance؛ إذا تغير
+عن آخر تحميل فعلى الجهاز إعادة التحميل بدل مقارنة أرقام التسلسل.
+    POST /checkout             {"items": [{"id", "quantity"}], "customer", "payment_method", "status", "bank_details"}
+    POST /batch                {"ops": [{"op", "args"}, ...]} تنفذ بالترتيب دون تداخل مع غيرها
+
+كل العمليات تنفذ تحت قفل واحد، فالتحقق من المخزون وخصمه وتسجيل الفاتورة
+خطوة واحدة لا يتداخل معها بيع من جهاز آخر. الحفظ يتم في الخيط الخلفي.
+"""
+
+import argparse
+import hmac
+import ipaddress
+import json
+import os
+import sys
+import threading
+import uuid
+from collections import deque
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Any, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import metrics
+import storage
+from core import Cart, CoreError, Store
+
+DEFAULT_PORT = 8765
+# عدد التغييرات المحفوظة للأجهزة المتأخرة؛ الأقدم منها يتطلب إعادة تحميل كاملة
+CHANGE_LOG_SIZE = 20000
+# أقصى انتظار لطلب /changes (بالثواني)
+MAX_WAIT = 30.0
+TOKEN_HEADER = 'X-BookBliss-Token'
+
+
+class ChangeFeed:
+    """
+    سجل التغييرات المرقمة بالتسلسل. كل عنصر (seq، المجموعة، العملية، السجل بصيغة JSON).
+    العملية 'reset' تعني أن البيانات استبدلت (استعادة أو أرشفة) وعلى الأجهزة إعادة التحميل.
+    """
+
+    def __init__(self, size: int = CHANGE_LOG_SIZE):
+        # يتغير مع كل تشغيل، فالجهاز يعرف أن التسلسل بدأ من جديد
+        self.instance = uuid.uuid4().hex
+        self.seq = 0
+        self.entries: "deque[Tuple[int, Optional[str], str, Any]]" = deque(maxlen=size)
+        self._cond = threading.Condition()
+
+    def publish(self, changes: List[storage.Change]):
+        """يستدعى تحت قفل المخزن، فالسجلات تنسخ بصيغة JSON قبل أي تعديل لاحق."""
+        with self._cond:
+            for collection, action, payload in changes:
+                self.seq += 1
+                if action != 'delete':
+                    payload = storage.encode_record(collection, payload)
+                self.entries.append((self.seq, collection, action, payload))
+            self._cond.notify_all()
+
+    def reset(self):
+        with self._cond:
+            self.seq += 1
+            self.entries.append((self.seq, None, 'reset', None))
+            self._cond.notify_all()
+
+    def since(self, seq: int, wait: float = 0.0) -> Dict[str, Any]:
+        with self._cond:
+            if seq > self.seq:
+                # رقم من تشغيل سابق للخادم
+                return {'instance': self.instance, 'seq': self.seq, 'reset': True, 'changes': []}
+            if wait > 0 and self.seq <= seq:
+                self._cond.wait_for(lambda: self.seq > seq, timeout=wait)
+            oldest = self.entries[0][0] if self.entries else self.seq + 1
+            if seq + 1 < oldest and seq < self.seq:
+                # الجهاز تأخر أكثر من حجم السجل
+                return {'instance': self.instance, 'seq': self.seq, 'reset': True, 'changes': []}
+            changes = [list(entry) for entry in self.entries if entry[0] > seq]
+        return {'instance': self.instance, 'seq': self.seq, 'reset': False, 'changes': changes}
+
+
+# --- العمليات المتاحة عبر /batch ---
+def _product(store: Store, product_id: str) -> Dict[str, Any]:
+    product = store.index.product(product_id)
+    if product is None:
+        raise CoreError("المنتج غير موجود")
+    return product
+
+
+def op_checkout(store: Store, args: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    السلة تبنى من مخزون الخادم وأسعاره، فالتحقق من الكمية يتم على الرصيد الحالي.
+    الرد يحمل الفاتورة كاملة فلا يعتمد الجهاز على وصولها في سجل التغييرات.
+    """
+    cart = Cart()
+    for item in args.get('items', []):
+        cart.add(_product(store, item['id']), int(item['quantity']))
+    sale = store.checkout(cart, args.get('customer', ''), args.get('payment_method', 'نقدي'),
+                          args.get('status'), args.get('bank_details'))
+    return {'id': sale['id'], 'sale': storage.encode_record('sales', sale)}
+
+
+def op_save_product(store: Store, args: Dict[str, Any]) -> Dict[str, Any]:
+    product = _product(store, args['id']) if args.get('id') else None
+    record = store.save_product(args.get('name', ''), args.get('price'), args.get('stock'),
+                                args.get('description', ''), args.get('barcode', ''), product=product)
+    return {'id': record['id']}
+
+
+def op_delete_product(store: Store, args: Dict[str, Any]):
+    store.delete_product(args['id'])
+
+
+def op_add_expense(store: Store, args: Dict[str, Any]) -> Dict[str, Any]:
+    return {'id': store.add_expense(args.get('description', ''), args.get('amount'))['id']}
+
+
+def op_delete_expense(store: Store, args: Dict[str, Any]):
+    store.delete_expense(args['id'])
+
+
+def op_add_rental(store: Store, args: Dict[str, Any]) -> Dict[str, Any]:
+    return {'id': store.add_rental(args.get('book_name', ''), args.get('renter_name', ''), args.get('duration'))['id']}
+
+
+def op_return_rental(store: Store, args: Dict[str, Any]) -> bool:
+    return store.return_rental(args['id'])
+
+
+def op_recompute_stock(store: Store, args: Dict[str, Any]) -> int:
+    return store.recompute_stock({key: int(value) for key, value in args['opening'].items()},
+                                 datetime.fromisoformat(args['since']))
+
+
+def op_import_products(store: Store, args: Dict[str, Any]) -> Dict[str, Any]:
+    report = store.import_products([(int(number), row) for number, row in args['rows']], args.get('skip_invalid', False))
+    return {'created': report.created, 'updated': report.updated, 'errors': report.errors, 'applied': report.applied}
+
+
+def op_archive_closed(store: Store, args: Dict[str, Any]) -> int:
+    return store.archive_closed(datetime.fromisoformat(args['before']))
+
+
+def op_replace_data(store: Store, args: Dict[str, Any]):
+    store.replace_data(storage.decode_data(args['data']))
+
+
+OPERATIONS: Dict[str, Callable[[Store, Dict[str, Any]], Any]] = {
+    'checkout': op_checkout,
+    'save_product': op_save_product,
+    'delete_product': op_delete_product,
+    'add_expense': op_add_expense,
+    'delete_expense': op_delete_expense,
+    'add_rental': op_add_rental,
+    'return_rental': op_return_rental,
+    'recompute_stock': op_recompute_stock,
+    'import_products': op_import_products,
+    'archive_closed': op_archive_closed,
+    'replace_data': op_replace_data,
+}
+# عمليات تعيد بناء البيانات كاملة فتنشر 'reset' بدل التغييرات المفردة
+RESETTING = ('archive_closed', 'replace_data')
+
+
+class StoreService:
+    """المخزن المشترك: قفل واحد لكل العمليات وسجل التغييرات للأجهزة."""
+
+    def __init__(self, store: Store, token: Optional[str] = None):
+        self.store = store
+        self.token = token
+        self.feed = ChangeFeed()
+        self.lock = threading.Lock()
+        self._resetting = False
+        store.listeners.append(self._on_commit)
+
+    def _on_commit(self, changes: List[storage.Change]):
+        if not self._resetting:
+            self.feed.publish(changes)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            return {'instance': self.feed.instance, 'seq': self.feed.seq, 'data': storage.encode_data(self.store.data)}
+
+    def run_batch(self, ops: List[Dict[str, Any]]) -> Tuple[List[Any], Optional[Tuple[int, str]]]:
+        """تنفيذ العمليات بالترتيب تحت القفل. يتوقف عند أول خطأ ويعيد (النتائج، (الموقع، الرسالة))."""
+        results: List[Any] = []
+        with self.lock:
+            for position, op in enumerate(ops):
+                if not isinstance(op, dict) or not isinstance(op.get('args') or {}, dict):
+                    return results, (position, "طلب غير صالح: كل عملية كائن فيه op و args")
+                name = op.get('op')
+                handler = OPERATIONS.get(name) if isinstance(name, str) else None
+                if handler is None:
+                    return results, (position, f"عملية غير معروفة: {name}")
+                self._resetting = name in RESETTING
+                try:
+                    with metrics.timed(f"server.{name}"):
+                        results.append(handler(self.store, op.get('args') or {}))
+                except CoreError as e:
+                    return results, (position, str(e))
+                except (KeyError, TypeError, ValueError, AttributeError) as e:
+                    return results, (position, f"طلب غير صالح: {e}")
+                except Exception as e:
+                    # أي خطأ آخر يرد على الجهاز بدل قطع الاتصال
+                    return results, (position, f"خطأ في الخادم: {e}")
+                finally:
+                    if self._resetting:
+                        self._resetting = False
+                        self.feed.reset()
+        return results, None
+
+
+class Handler(BaseHTTPRequestHandler):
+    server: "StoreServer"
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: Any):
+        payload = json.dumps(body, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _authorized(self) -> bool:
+        token = self.server.service.token
+        if token and not hmac.compare_digest(self.headers.get(TOKEN_HEADER, ''), token):
+            self._send(401, {'error': "رمز الدخول غير صحيح"})
+            return False
+        return True
+
+    def do_GET(self):
+        if not self._authorized():
+            return
+        url = urlparse(self.path)
+        service = self.server.service
+        if url.path == '/data':
+            self._send(200, service.snapshot())
+        elif url.path == '/changes':
+            query = parse_qs(url.query)
+            try:
+                since = int(query.get('since', ['0'])[0])
+                wait = min(float(query.get('wait', ['0'])[0]), MAX_WAIT)
+            except ValueError:
+                self._send(400, {'error': "طلب غير صالح"})
+                return
+            self._send(200, service.feed.since(since, wait))
+        else:
+            self._send(404, {'error': "غير موجود"})
+
+    def do_POST(self):
+        if not self._authorized():
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            body = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            self._send(400, {'error': "طلب غير صالح"})
+            return
+        path = urlparse(self.path).path
+        if path not in ('/checkout', '/batch'):
+            self._send(404, {'error': "غير موجود"})
+            return
+        if not isinstance(body, dict):
+            self._send(400, {'error': "طلب غير صالح: الجسم يجب أن يكون كائن JSON"})
+            return
+        if path == '/checkout':
+            ops = [{'op': 'checkout', 'args': body}]
+        else:
+            ops = body.get('ops', [])
+            if not isinstance(ops, list):
+                self._send(400, {'error': "طلب غير صالح: ops يجب أن تكون قائمة"})
+                return
+        results, error = self.server.service.run_batch(ops)
+        if error is None:
+            self._send(200, {'results': results, 'seq': self.server.service.feed.seq})
+        else:
+            position, message = error
+            self._send(409, {'error': message, 'index': position, 'results': results,
+                             'seq': self.server.service.feed.seq})
+
+
+def is_loopback(host: str) -> bool:
+    """هل العنوان محلي فقط (لا تصله أجهزة الشبكة)؟"""
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+class StoreServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, service: StoreService, host: str = '127.0.0.1', port: int = DEFAULT_PORT):
+        self.service = service
+        super().__init__((host, port), Handler)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="BookBliss - خادم نقاط البيع المشترك")
+    parser.add_argument('--data', default="sales_data.json", help="ملف البيانات")
+    parser.add_argument('--backend', default=os.environ.get('BOOKBLISS_STORAGE', 'json'),
+                        choices=('json', 'sqlite', 'journal', 'sharded', 'binary'))
+    parser.add_argument('--host', default='127.0.0.1', help="0.0.0.0 للسماح لأجهزة الشبكة المحلية (يتطلب --token)")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--token', default=os.environ.get('BOOKBLISS_TOKEN'), help="رمز مشترك تطلبه الأجهزة")
+    parser.add_argument('--save-window', type=float, default=1.0, help="نافذة دمج الحفظ بالثواني")
+    args = parser.parse_args(argv)
+    if not args.token and not is_loopback(args.host):
+        # بدون رمز يستطيع أي جهاز في الشبكة تعديل المخزون والفواتير
+        parser.error(f"الاستماع على {args.host} يتطلب --token (أو BOOKBLISS_TOKEN)")
+
+    def report(error):
+        print(f"خطأ في الحفظ: {error}", file=sys.stderr)
+
+    store = Store(args.data, args.backend, background=True, on_error=report, save_window=args.save_window)
+    store.load()
+    if store.load_error is not None:
+        print(f"خطأ في تحميل البيانات: {store.load_error}", file=sys.stderr)
+        return 1
+    server = StoreServer(StoreService(store, args.token), args.host, args.port)
+    print(f"الخادم يعمل على http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        store.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
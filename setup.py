@@ -40,6 +40,8 @@ setup(
     entry_points={
         "console_scripts": [
             "sales-system=main:main",
+            "bookbliss=cli:main",
+            "bookbliss-server=server:main",
         ],
     },
     include_package_data=True,
@@ -0,0 +1,381 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+صيغة لقطة ثنائية مضغوطة لتسريع بدء التشغيل
+Compact binary snapshot format for fast cold start
+
+التخطيط (كل الأعداد little-endian):
+    MAGIC (6 بايت) | VERSION (u16) | عدد المجموعات (u8)
+    لكل مجموعة: الاسم (نص) | عدد الصفوف (u32) | الأعمدة بترتيب المخطط | عمود الحقول الموجودة | عمود الحقول الإضافية
+    كل عمود: النوع (u8) | الطول بالبايت (u64) | البيانات
+
+المبالغ تخزن كعدد صحيح بالوحدات الصغرى مع أس عشري (-2 لقيم Money)، والتواريخ
+كعدد ثوانٍ منذ epoch مع رمز التنسيق الأصلي حتى يعاد إنتاج النص نفسه.
+"""
+
+import calendar
+import json
+import os
+import struct
+import sys
+from array import array
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Dict, List, Any, Tuple
+
+from money import Money
+from records import RECORD_TYPES
+
+MAGIC = b'BBSNAP'
+VERSION = 1
+
+STR, INT, MONEY, DATE = 1, 2, 3, 4
+
+SCHEMAS = {
+    'inventory': (('id', STR), ('name', STR), ('price', MONEY), ('stock', INT), ('description', STR)),
+    'sales': (('id', STR), ('date', DATE), ('customer', STR), ('payment_method', STR), ('status', STR), ('total', MONEY)),
+    'sale_items': (('id', STR), ('name', STR), ('price', MONEY), ('quantity', INT), ('total', MONEY)),
+    'expenses': (('id', STR), ('date', DATE), ('description', STR), ('amount', MONEY)),
+    'rentals': (('id', STR), ('book_id', STR), ('book_name', STR), ('renter_name', STR),
+                ('rental_date', DATE), ('due_date', DATE), ('status', STR), ('amount', MONEY)),
+}
+SECTIONS = ('inventory', 'sales', 'sale_items', 'expenses', 'rentals')
+
+# رمز 0 يعني أن التاريخ حفظ كنص كما هو
+DATE_FORMATS = {1: "%Y-%m-%d %H:%M:%S", 2: "%Y-%m-%dT%H:%M:%S.%f", 3: "%Y-%m-%d"}
+EPOCH = datetime(1970, 1, 1)
+
+INT64_MIN, INT64_MAX = -(1 << 63), (1 << 63) - 1
+
+
+class SnapshotError(ValueError):
+    """ملف لقطة غير صالح أو بإصدار غير مدعوم."""
+
+
+# ------------------------------------------------------------------
+# --- ترميز القيم ---
+# ------------------------------------------------------------------
+def _encode_money(value) -> Tuple[int, int]:
+    if type(value) is Money:
+        if not INT64_MIN <= value.minor <= INT64_MAX:
+            raise OverflowError
+        return value.minor, -2
+    sign, digits, exponent = value.as_tuple()
+    if not isinstance(exponent, int) or not -128 <= exponent <= 127:
+        raise OverflowError
+    coefficient = int(''.join(map(str, digits)) or '0')
+    coefficient = -coefficient if sign else coefficient
+    if not INT64_MIN <= coefficient <= INT64_MAX:
+        raise OverflowError
+    return coefficient, exponent
+
+
+def _encode_date(value: str) -> Tuple[int, int]:
+    for code, fmt in DATE_FORMATS.items():
+        try:
+            dt = datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+        epoch = calendar.timegm(dt.timetuple())
+        if code == 2:
+            epoch = epoch * 1000000 + dt.microsecond
+        if _format_date(code, epoch) == value:
+            return code, epoch
+    return 0, 0
+
+
+def _format_date(code: int, epoch: int) -> str:
+    # EPOCH + timedelta بدل time.gmtime: الأخير يرفض الثواني السالبة (قبل 1970) في Windows
+    if code == 2:
+        return (EPOCH + timedelta(microseconds=epoch)).strftime("%Y-%m-%dT%H:%M:%S.%f")
+    return (EPOCH + timedelta(seconds=epoch)).strftime(DATE_FORMATS[code])
+
+
+def _fits(kind: int, value) -> bool:
+    """هل يمكن تخزين القيمة في عمود من هذا النوع؟ وإلا تحفظ في الحقول الإضافية."""
+    if kind == STR or kind == DATE:
+        return isinstance(value, str) and '\x00' not in value
+    if kind == INT:
+        return type(value) is int and INT64_MIN <= value <= INT64_MAX
+    if type(value) is Money or (isinstance(value, Decimal) and value.is_finite()):
+        try:
+            _encode_money(value)
+            return True
+        except OverflowError:
+            return False
+    return False
+
+
+# ------------------------------------------------------------------
+# --- الكتابة ---
+# ------------------------------------------------------------------
+def _pack_str(text: str) -> bytes:
+    raw = text.encode('utf-8')
+    return struct.pack('<I', len(raw)) + raw
+
+
+def _column(kind: int, payload: bytes) -> bytes:
+    return struct.pack('<BQ', kind, len(payload)) + payload
+
+
+def _pack_strings(values: List[str]) -> bytes:
+    return '\x00'.join(values).encode('utf-8')
+
+
+def _encode_section(name: str, records: List[Dict[str, Any]]) -> bytes:
+    schema = SCHEMAS[name]
+    columns: List[list] = [[] for _ in schema]
+    masks = array('I')
+    extras = []
+    for record in records:
+        mask = 0
+        stored = {'items'}
+        for j, (field, kind) in enumerate(schema):
+            value = record.get(field)
+            present = _fits(kind, value)
+            if present:
+                mask |= 1 << j
+                stored.add(field)
+            columns[j].append(value if present else None)
+        masks.append(mask)
+        extra = record.leftover(stored)
+        extras.append(json.dumps(extra, ensure_ascii=False, default=str) if extra else '')
+
+    out = [_pack_str(name), struct.pack('<I', len(records))]
+    for (field, kind), values in zip(schema, columns):
+        if kind == STR:
+            out.append(_column(STR, _pack_strings([v if v is not None else '' for v in values])))
+        elif kind == INT:
+            out.append(_column(INT, array('q', [v if v is not None else 0 for v in values]).tobytes()))
+        elif kind == MONEY:
+            coefficients, exponents = array('q'), array('b')
+            for v in values:
+                c, e = _encode_money(v) if v is not None else (0, 0)
+                coefficients.append(c)
+                exponents.append(e)
+            out.append(_column(MONEY, coefficients.tobytes() + exponents.tobytes()))
+        else:
+            codes, epochs, raw = array('B'), array('q'), []
+            for v in values:
+                code, epoch = _encode_date(v) if v is not None else (0, 0)
+                codes.append(code)
+                epochs.append(epoch)
+                if code == 0:
+                    raw.append(v if v is not None else '')
+            raw_bytes = _pack_strings(raw)
+            out.append(_column(DATE, codes.tobytes() + epochs.tobytes() + struct.pack('<I', len(raw)) + raw_bytes))
+    out.append(_column(INT, masks.tobytes()))
+    out.append(_column(STR, _pack_strings(extras)))
+    return b''.join(out)
+
+
+def dumps(data: Dict[str, List[Dict[str, Any]]]) -> bytes:
+    """ترميز البيانات الداخلية (مع Money) إلى بايتات اللقطة."""
+    sections = dict(data)
+    sections['sale_items'] = [item for sale in data['sales'] for item in sale['items']]
+    counts = array('I', [len(sale['items']) for sale in data['sales']])
+    out = [MAGIC, struct.pack('<HB', VERSION, len(SECTIONS))]
+    for name in SECTIONS:
+        out.append(_encode_section(name, sections.get(name, [])))
+    out.append(_column(INT, counts.tobytes()))
+    return b''.join(out)
+
+
+def dump(data: Dict[str, List[Dict[str, Any]]], path: str):
+    """كتابة اللقطة إلى ملف مؤقت ثم استبداله بالملف الأصلي."""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(dumps(data))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+# ------------------------------------------------------------------
+# --- القراءة ---
+# ------------------------------------------------------------------
+class _Reader:
+    def __init__(self, buf: bytes):
+        self.buf = memoryview(buf)
+        self.pos = 0
+
+    def unpack(self, fmt: str):
+        values = struct.unpack_from(fmt, self.buf, self.pos)
+        self.pos += struct.calcsize(fmt)
+        return values
+
+    def take(self, size: int) -> memoryview:
+        if self.pos + size > len(self.buf):
+            raise SnapshotError("ملف اللقطة مقطوع")
+        chunk = self.buf[self.pos:self.pos + size]
+        self.pos += size
+        return chunk
+
+    def string(self) -> str:
+        (size,) = self.unpack('<I')
+        return str(self.take(size), 'utf-8')
+
+    def column(self, expected: int) -> memoryview:
+        kind, size = self.unpack('<BQ')
+        if kind != expected:
+            raise SnapshotError("نوع عمود غير متوقع في اللقطة")
+        return self.take(size)
+
+
+def _split_strings(chunk: memoryview, count: int) -> List[str]:
+    if count == 0:
+        return []
+    return str(chunk, 'utf-8').split('\x00')
+
+
+def _decode_money(chunk: memoryview, count: int) -> List[Money]:
+    coefficients = array('q')
+    coefficients.frombytes(chunk[:count * 8])
+    exponents = array('b')
+    exponents.frombytes(chunk[count * 8:])
+    # الأسعار تتكرر كثيراً، فننشئ Money واحداً لكل قيمة مختلفة؛ اللقطات الأقدم
+    # قد تحمل أساً غير -2 (من Decimal) فتحول بالتقريب لأقرب جزء
+    pairs = list(zip(coefficients, exponents))
+    unique = {pair: Money(pair[0]) if pair[1] == -2 else Money.of(Decimal(f"{pair[0]}E{pair[1]}"))
+              for pair in set(pairs)}
+    return [unique[pair] for pair in pairs]
+
+
+def _decode_dates(chunk: memoryview, count: int) -> List[str]:
+    codes = array('B')
+    codes.frombytes(chunk[:count])
+    epochs = array('q')
+    epochs.frombytes(chunk[count:count * 9])
+    (raw_count,) = struct.unpack_from('<I', chunk, count * 9)
+    raw = iter(_split_strings(chunk[count * 9 + 4:], raw_count))
+    # الجزء الخاص باليوم يتكرر بين الفواتير، فنحسبه مرة واحدة لكل يوم
+    days: Dict[int, str] = {}
+    values = []
+    for code, epoch in zip(codes, epochs):
+        if code == 0:
+            values.append(next(raw))
+            continue
+        micros = 0
+        if code == 2:
+            epoch, micros = divmod(epoch, 1000000)
+        day, seconds = divmod(epoch, 86400)
+        prefix = days.get(day)
+        if prefix is None:
+            prefix = days[day] = (EPOCH + timedelta(days=day)).strftime("%Y-%m-%d")
+        if code == 3:
+            values.append(prefix)
+            continue
+        hours, seconds = divmod(seconds, 3600)
+        minutes, seconds = divmod(seconds, 60)
+        if code == 1:
+            values.append(f"{prefix} {hours:02d}:{minutes:02d}:{seconds:02d}")
+        else:
+            values.append(f"{prefix}T{hours:02d}:{minutes:02d}:{seconds:02d}.{micros:06d}")
+    return values
+
+
+def _decode_section(reader: _Reader) -> Tuple[str, List[Dict[str, Any]]]:
+    name = reader.string()
+    schema = SCHEMAS.get(name)
+    if schema is None:
+        raise SnapshotError(f"مجموعة غير معروفة في اللقطة: {name}")
+    (count,) = reader.unpack('<I')
+    columns = []
+    for _, kind in schema:
+        chunk = reader.column(kind)
+        if kind == STR:
+            columns.append(_split_strings(chunk, count))
+        elif kind == INT:
+            ints = array('q')
+            ints.frombytes(chunk)
+            columns.append(ints)
+        elif kind == MONEY:
+            columns.append(_decode_money(chunk, count))
+        else:
+            columns.append(_decode_dates(chunk, count))
+    masks = array('I')
+    masks.frombytes(reader.column(INT))
+    extras = _split_strings(reader.column(STR), count)
+
+    names = tuple(field for field, _ in schema)
+    # الأسماء والمعرفات المتكررة (بنود الفواتير خاصة) تشارك النص نفسه
+    record_type = RECORD_TYPES[name]
+    for j, field in enumerate(names):
+        if field in record_type.INTERNED:
+            columns[j] = list(map(sys.intern, columns[j]))
+    # أعمدة المخطط هي أول حقول السجل بالترتيب نفسه (records.FIELDS)
+    full = (1 << len(names)) - 1
+    if all(mask == full for mask in masks) and not any(extras):
+        return name, [record_type(*values) for values in zip(*columns)]
+
+    # الحقول الإضافية غالباً متطابقة (مثل bank_details = null) فنحللها مرة واحدة
+    parsed: Dict[str, Dict[str, Any]] = {}
+    records = []
+    for values, mask, extra in zip(zip(*columns), masks, extras):
+        if mask == full:
+            record = record_type(*values)
+        else:
+            record = record_type(*[v if (mask >> j) & 1 else None for j, v in enumerate(values)])
+        if extra:
+            fields = parsed.get(extra)
+            if fields is None:
+                fields = json.loads(extra)
+                if any(isinstance(v, (dict, list)) for v in fields.values()):
+                    record.update(fields)
+                    records.append(record)
+                    continue
+                parsed[extra] = fields
+            record.update(fields)
+        records.append(record)
+    return name, records
+
+
+def loads(buf: bytes) -> Dict[str, List[Dict[str, Any]]]:
+    """فك ترميز بايتات اللقطة إلى البيانات الداخلية."""
+    if buf[:len(MAGIC)] != MAGIC:
+        raise SnapshotError("الملف ليس لقطة BookBliss")
+    reader = _Reader(buf)
+    reader.pos = len(MAGIC)
+    version, section_count = reader.unpack('<HB')
+    if version != VERSION:
+        raise SnapshotError(f"إصدار لقطة غير مدعوم: {version}")
+    sections = dict(_decode_section(reader) for _ in range(section_count))
+    counts = array('I')
+    counts.frombytes(reader.column(INT))
+
+    items = sections.pop('sale_items', [])
+    pos = 0
+    for sale, count in zip(sections['sales'], counts):
+        sale.items = items[pos:pos + count]
+        pos += count
+    return sections
+
+
+def load(path: str) -> Dict[str, List[Dict[str, Any]]]:
+    with open(path, 'rb') as f:
+        return loads(f.read())
+
+
+# ------------------------------------------------------------------
+# --- التحويل من وإلى JSON ---
+# ------------------------------------------------------------------
+def json_to_snapshot(json_path: str, snapshot_path: str):
+    """تحويل ملف البيانات JSON إلى لقطة ثنائية."""
+    import storage
+    dump(storage.JsonStorage(json_path).load(), snapshot_path)
+
+
+def snapshot_to_json(snapshot_path: str, json_path: str, indent: int = 4):
+    """تحويل لقطة ثنائية إلى ملف بيانات JSON بالصيغة الحالية."""
+    import storage
+    storage.JsonStorage(json_path, indent=indent).save_all(load(snapshot_path))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 4 or sys.argv[1] not in ('to-binary', 'to-json'):
+        print("الاستخدام: python snapshot.py to-binary|to-json <المصدر> <الهدف>")
+        sys.exit(1)
+    if sys.argv[1] == 'to-binary':
+        json_to_snapshot(sys.argv[2], sys.argv[3])
+    else:
+        snapshot_to_json(sys.argv[2], sys.argv[3])
@@ -0,0 +1,997 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+طبقة تخزين البيانات لنظام إدارة المبيعات
+Storage backends for the Sales Management System
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, List, Any, Optional, Tuple
+
+import metrics
+import snapshot
+from locking import FileLock
+from money import Money
+from records import RECORD_TYPES, Record
+
+COLLECTIONS = ("inventory", "sales", "expenses", "rentals")
+
+# الحقول المالية في كل مجموعة
+MONEY_FIELDS = {
+    "inventory": ("price",),
+    "sales": ("total",),
+    "sale_items": ("price", "total"),
+    "expenses": ("amount",),
+    "rentals": ("amount",),
+}
+
+# رقم إصدار ملف JSON؛ يزيد مع كل كتابة ليكشف الكتابة من نسخة أخرى من البرنامج
+GENERATION_KEY = "_generation"
+# محاولات الحفظ بعد الدمج قبل الدمج والكتابة تحت القفل مباشرة
+COMMIT_RETRIES = 3
+
+# التغيير الواحد هو (المجموعة، العملية، السجل أو المعرف)
+# مثال: ("sales", "upsert", sale_record) أو ("inventory", "delete", product_id)
+Change = Tuple[str, str, Any]
+
+
+class StockConflict(ValueError):
+    """
+    فواتير رفضت عند الدمج لأن نسخة أخرى باعت القطع نفسها فصار الرصيد المدمج سالباً.
+    بقية التغييرات حفظت، و changes تعيد بيانات المستدعي إلى ما حفظ فعلاً
+    (تحذف الفواتير المرفوضة وتعيد رصيد منتجاتها).
+    """
+
+    def __init__(self, sales: List[Record], names: List[str], changes: List[Change]):
+        super().__init__(f"ألغيت {len(sales)} فاتورة لأن المخزون نفد في نسخة أخرى من البرنامج: {'، '.join(names)}")
+        self.sales = sales
+        self.changes = changes
+
+
+def decode_record(collection: str, record: Dict[str, Any]) -> Record:
+    """تحويل سجل خام واحد إلى سجل داخلي (records) مع Money للمبالغ."""
+    return RECORD_TYPES[collection].from_json(record)
+
+
+def encode_record(collection: str, record: Record) -> Dict[str, Any]:
+    """تحويل سجل داخلي واحد إلى صيغة JSON (المبالغ كنصوص بخانتين: "12.50")."""
+    return record.to_json()
+
+
+def decode_data(raw: Dict[str, Any]) -> Dict[str, List[Record]]:
+    """
+    تحويل البيانات الخام (JSON) إلى قوائم السجلات الداخلية. تفرغ raw أثناء التحويل:
+    كل سجل خام يحرر بعد تحويله فلا تجتمع النسختان كاملتين في الذاكرة.
+    """
+    data = {}
+    for name in COLLECTIONS:
+        pending = list(raw.pop(name, None) or ())
+        pending.reverse()
+        decode = RECORD_TYPES[name].from_json
+        data[name] = records = []
+        while pending:
+            records.append(decode(pending.pop()))
+    return data
+
+
+def encode_data(data: Dict[str, List[Record]]) -> Dict[str, Any]:
+    """تحويل السجلات الداخلية إلى صيغة قابلة للحفظ في JSON (المبالغ كنصوص)."""
+    return {name: [r.to_json() for r in data[name]] for name in COLLECTIONS}
+
+
+def copy_record(record: Record) -> Record:
+    """نسخة مستقلة من السجل (مع نسخ عناصر الفاتورة) يمكن حفظها من خيط آخر."""
+    return record.copy()
+
+
+def copy_data(data: Dict[str, List[Record]]) -> Dict[str, List[Record]]:
+    return {name: [r.copy() for r in data.get(name, [])] for name in COLLECTIONS}
+
+
+def write_json_atomic(path: str, obj: Any, indent: Optional[int] = None):
+    """كتابة JSON إلى ملف مؤقت ثم استبداله بالملف الأصلي حتى لا يبقى ملف نصف مكتوب."""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(obj, f, ensure_ascii=False, indent=indent)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def diff_data(old: Dict[str, List[Dict[str, Any]]], new: Dict[str, List[Dict[str, Any]]]) -> List[Change]:
+    """التغييرات التي تحول old إلى new (مقارنة السجلات حسب المعرف)."""
+    changes: List[Change] = []
+    for name in COLLECTIONS:
+        before = {r['id']: r for r in old[name]}
+        for record in new[name]:
+            previous = before.pop(record['id'], None)
+            if previous is None or (previous is not record and previous != record):
+                changes.append((name, 'upsert', record))
+        changes.extend((name, 'delete', record_id) for record_id in before)
+    return changes
+
+
+def apply_change(data: Dict[str, List[Dict[str, Any]]], change: Change, positions: Optional[Dict[str, Dict[str, int]]] = None):
+    """
+    تطبيق تغيير واحد على القاموس الداخلي (يستخدم عند إعادة تشغيل السجل).
+    positions خريطة اختيارية من المعرف إلى موقع السجل لتسريع التطبيق المتكرر.
+    """
+    collection, action, payload = change
+    records = data[collection]
+    if positions is None:
+        index = {r['id']: i for i, r in enumerate(records)}
+    else:
+        index = positions.setdefault(collection, {r['id']: i for i, r in enumerate(records)})
+    if action == 'delete':
+        pos = index.pop(payload, None)
+        if pos is not None:
+            records.pop(pos)
+            for record in records[pos:]:
+                index[record['id']] -= 1
+        return
+    pos = index.get(payload['id'])
+    if pos is None:
+        index[payload['id']] = len(records)
+        records.append(payload)
+    else:
+        records[pos] = payload
+
+
+class JsonStorage:
+    """
+    التخزين التقليدي: ملف JSON واحد يعاد كتابته بالكامل عند كل حفظ.
+
+    عدة نسخ من البرنامج على نفس الملف: الملف يحمل رقم إصدار (_generation) يزيد
+    مع كل كتابة، والكتابة تتم تحت قفل استشاري (path.lock). التحويل إلى JSON يتم
+    خارج القفل، وداخله يكفي فحص os.stat ثم الكتابة. إذا كتبت نسخة أخرى منذ آخر
+    قراءة يعاد تحميل الملف وتدمج تغييراتنا فيه حسب المعرف (الرصيد يدمج بالفرق)
+    ثم تعاد المحاولة، ويعيد commit التغييرات القادمة من النسخة الأخرى. الفاتورة
+    التي تجعل الرصيد المدمج سالباً لا تحفظ ويرفع StockConflict بعد حفظ الباقي.
+    """
+
+    # commit يحتاج البيانات كاملة لأنه يعيد كتابة الملف
+    needs_full_data = True
+
+    def __init__(self, path: str, indent: Optional[int] = 4):
+        self.path = path
+        self.indent = indent
+        self.lock_path = path + '.lock'
+        # آخر إصدار قرأناه أو كتبناه، وختم الملف عندها (mtime، الحجم، inode)
+        self.generation = 0
+        self._stamp: Optional[Tuple[int, int, int]] = None
+        # رصيد كل منتج في آخر نسخة معروفة من الملف، لدمج المبيعات المتزامنة بالفرق
+        self._base_stock: Dict[str, int] = {}
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def _file_stamp(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size, st.st_ino
+
+    def _read(self) -> Tuple[int, Dict[str, List[Dict[str, Any]]]]:
+        with open(self.path, 'r', encoding='utf-8') as f:
+            raw = json.load(f)
+        return raw.get(GENERATION_KEY, 0), decode_data(raw)
+
+    def _remember(self, generation: int, stamp, inventory: List[Dict[str, Any]]):
+        self.generation = generation
+        self._stamp = stamp
+        self._base_stock = {p['id']: p['stock'] for p in inventory}
+
+    def _encode(self, data: Dict[str, List[Dict[str, Any]]], generation: int) -> str:
+        raw = encode_data(data)
+        raw[GENERATION_KEY] = generation
+        return json.dumps(raw, ensure_ascii=False, indent=self.indent)
+
+    def _write(self, text: str):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def load(self) -> Dict[str, List[Dict[str, Any]]]:
+        """قراءة الملف بالكامل. يرفع ValueError إذا كان الملف تالفاً."""
+        stamp = self._file_stamp()
+        if stamp is None:
+            self._remember(0, None, [])
+            return {name: [] for name in COLLECTIONS}
+        generation, data = self._read()
+        self._remember(generation, stamp, data['inventory'])
+        return data
+
+    def save_all(self, data: Dict[str, List[Dict[str, Any]]]):
+        """إعادة كتابة الملف بالكامل (الاستعادة): تستبدل ما في الملف دون دمج."""
+        with FileLock(self.lock_path):
+            generation = self.generation
+            if self._file_stamp() not in (None, self._stamp):
+                generation = max(generation, self._read()[0])
+            self._write(self._encode(data, generation + 1))
+            self._remember(generation + 1, self._file_stamp(), data['inventory'])
+
+    def commit(self, data: Dict[str, List[Dict[str, Any]]], changes: List[Change]) -> Optional[List[Change]]:
+        """
+        حفظ data بعد التأكد أن الملف لم يتغير منذ آخر قراءة. عند وجود كتابة من نسخة
+        أخرى يعيد التغييرات اللازمة لتحويل data إلى ما حفظ فعلاً (ولا يعدل data نفسها).
+        إذا رفضت فواتير عند الدمج يرفع StockConflict ومعه هذه التغييرات.
+        """
+        current = data
+        rejected: List[Record] = []
+        oversold: Dict[str, str] = {}
+        for attempt in range(COMMIT_RETRIES + 1):
+            last = attempt == COMMIT_RETRIES
+            # التحويل إلى JSON خارج القفل؛ في المحاولة الأخيرة يبقى القفل حتى الكتابة
+            text = None if last else self._encode(current, self.generation + 1)
+            with FileLock(self.lock_path):
+                stamp = self._file_stamp()
+                if stamp is not None and stamp != self._stamp:
+                    disk_generation, disk = self._read()
+                    if disk_generation != self.generation:
+                        metrics.count('save_conflicts')
+                        base_stock = self._base_stock
+                        self._remember(disk_generation, stamp, disk['inventory'])
+                        current, changes = self._merge(disk, changes, base_stock, rejected, oversold)
+                        if not last:
+                            continue
+                if text is None:
+                    text = self._encode(current, self.generation + 1)
+                self._write(text)
+                self._remember(self.generation + 1, self._file_stamp(), current['inventory'])
+            break
+        external = diff_data(data, current) if current is not data else None
+        if rejected:
+            metrics.count('oversell_rejected', len(rejected))
+            raise StockConflict(rejected, sorted(oversold.values()), external or [])
+        return external
+
+    def _merge(self, disk: Dict[str, List[Dict[str, Any]]], changes: List[Change], base_stock: Dict[str, int],
+               rejected: List[Record], oversold: Dict[str, str]):
+        """
+        تطبيق تغييراتنا على نسخة الملف. الرصيد: رصيد الملف + (رصيدنا - الرصيد الذي بدأنا منه).
+        إذا صار الرصيد المدمج سالباً ترفض فواتيرنا الجديدة على المنتج (الأحدث أولاً) ويعاد
+        رصيدها حتى لا يبقى سالباً؛ المرفوضة تضاف إلى rejected وأسماء منتجاتها إلى oversold.
+        """
+        positions: Dict[str, Dict[str, int]] = {}
+        index = positions.setdefault('inventory', {r['id']: i for i, r in enumerate(disk['inventory'])})
+        merged_changes = []
+        products: Dict[str, Record] = {}
+        negative = set()
+        for collection, action, payload in changes:
+            if action != 'delete' and collection == 'inventory':
+                pos = index.get(payload['id'])
+                base = base_stock.get(payload['id'])
+                # نسخة دائماً: قد يعاد رصيدها أدناه، والأصل من بيانات المستدعي
+                payload = payload.copy()
+                if pos is not None and base is not None:
+                    on_disk = disk['inventory'][pos]['stock']
+                    if on_disk != base:
+                        payload.stock = on_disk + payload.stock - base
+                        if payload.stock < 0:
+                            negative.add(payload['id'])
+                products[payload['id']] = payload
+            merged_changes.append((collection, action, payload))
+        if negative:
+            on_disk_sales = {r['id'] for r in disk['sales']}
+            dropped = set()
+            for collection, action, sale in reversed(merged_changes):
+                if collection != 'sales' or action == 'delete' or sale['id'] in on_disk_sales:
+                    continue
+                if not any(item.id in negative and products[item.id].stock < 0 for item in sale.items):
+                    continue
+                dropped.add(sale['id'])
+                rejected.append(sale)
+                for item in sale.items:
+                    product = products.get(item.id)
+                    if product is not None:
+                        product.stock += item.quantity
+                        if item.id in negative:
+                            oversold[item.id] = product.name
+            merged_changes = [change for change in merged_changes
+                              if not (change[0] == 'sales' and change[1] != 'delete' and change[2]['id'] in dropped)]
+        for change in merged_changes:
+            apply_change(disk, change, positions)
+        return disk, merged_changes
+
+    def close(self):
+        pass
+
+
+class JournalStorage(JsonStorage):
+    """
+    ملف JSON كلقطة (snapshot) مع سجل عمليات إلحاقي بجانبه.
+    كل تعديل يضاف كسطر JSON واحد مع fsync، فتكلفة إتمام البيع ثابتة
+    مهما كبر السجل. عند تجاوز السجل حجماً معيناً يتم دمجه في لقطة جديدة
+    في خيط خلفي.
+    """
+
+    needs_full_data = False
+
+    def __init__(self, path: str, indent: Optional[int] = 4, compact_threshold: int = 1024 * 1024):
+        super().__init__(path, indent)
+        self.journal_path = path + '.journal'
+        # السجل المجمد أثناء الدمج؛ وجوده عند البدء يعني أن الدمج لم يكتمل
+        self.frozen_path = path + '.journal.1'
+        self.compact_threshold = compact_threshold
+        self._journal = None
+        self._compactor: Optional[threading.Thread] = None
+        # خطأ آخر دمج فشل في الخيط الخلفي؛ يرفع في commit أو flush التالي
+        self.compact_error: Optional[Exception] = None
+        self._lock = threading.Lock()
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path) or os.path.exists(self.journal_path)
+
+    def _replay(self, data: Dict[str, List[Dict[str, Any]]], journal_path: str):
+        """إعادة تطبيق العمليات المسجلة على البيانات. السطر الأخير غير المكتمل يتم تجاهله."""
+        if not os.path.exists(journal_path):
+            return
+        positions: Dict[str, Dict[str, int]] = {}
+        with open(journal_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break
+                payload = entry['record']
+                if entry['op'] != 'delete':
+                    payload = decode_record(entry['collection'], payload)
+                apply_change(data, (entry['collection'], entry['op'], payload), positions)
+
+    def read_snapshot(self) -> Dict[str, List[Dict[str, Any]]]:
+        return JsonStorage.load(self)
+
+    def write_snapshot(self, data: Dict[str, List[Dict[str, Any]]]):
+        write_json_atomic(self.path, encode_data(data), self.indent)
+
+    def load(self) -> Dict[str, List[Dict[str, Any]]]:
+        """تحميل آخر لقطة ثم إعادة تطبيق السجل فوقها."""
+        data = self.read_snapshot()
+        self._replay(data, self.frozen_path)
+        self._replay(data, self.journal_path)
+        return data
+
+    def _open_journal(self):
+        if self._journal is None:
+            self._journal = open(self.journal_path, 'a', encoding='utf-8')
+        return self._journal
+
+    def commit(self, data: Dict[str, List[Dict[str, Any]]], changes: List[Change]):
+        """
+        إلحاق التغييرات بالسجل ثم fsync. إذا فشل دمج سابق يرفع خطأه أولاً دون
+        كتابة شيء، فيعيد المستدعي المحاولة (BackgroundStorage يعيدها تلقائياً).
+        """
+        self.raise_compact_error()
+        lines = []
+        for collection, action, payload in changes:
+            record = payload if action == 'delete' else encode_record(collection, payload)
+            lines.append(json.dumps({'collection': collection, 'op': action, 'record': record}, ensure_ascii=False) + '\n')
+        with self._lock:
+            journal = self._open_journal()
+            journal.write(''.join(lines))
+            journal.flush()
+            os.fsync(journal.fileno())
+            size = journal.tell()
+        if size >= self.compact_threshold:
+            self.compact()
+
+    def compact(self, wait: bool = False):
+        """
+        دمج السجل في لقطة جديدة. يجمد السجل الحالي بإعادة تسميته حتى تستمر
+        الكتابات الجديدة في سجل فارغ، ثم يبني اللقطة من الملفات في خيط خلفي.
+        """
+        if self._compactor is not None and self._compactor.is_alive():
+            if wait:
+                self._compactor.join()
+                self.raise_compact_error()
+            return
+        with self._lock:
+            if os.path.exists(self.frozen_path):
+                # دمج سابق لم يكتمل: نكمله أولاً قبل تجميد سجل جديد
+                pass
+            elif os.path.exists(self.journal_path):
+                if self._journal is not None:
+                    self._journal.close()
+                    self._journal = None
+                os.replace(self.journal_path, self.frozen_path)
+            else:
+                return
+        self._compactor = threading.Thread(target=self._compact_frozen, name="journal-compactor", daemon=True)
+        self._compactor.start()
+        if wait:
+            self._compactor.join()
+            self.raise_compact_error()
+
+    def _compact_frozen(self):
+        try:
+            data = self.read_snapshot()
+            self._replay(data, self.frozen_path)
+            self.write_snapshot(data)
+            os.remove(self.frozen_path)
+        except Exception as e:
+            # لا أحد ينتظر هذا الخيط؛ السجل المجمد يبقى ويعاد دمجه في المرة التالية
+            self.compact_error = e
+            metrics.count('compact_failed')
+
+    def raise_compact_error(self):
+        """رفع خطأ آخر دمج فشل مرة واحدة."""
+        error, self.compact_error = self.compact_error, None
+        if error is not None:
+            raise error
+
+    def flush(self):
+        """الكتابة متزامنة؛ يرفع خطأ الدمج الخلفي إن فشل."""
+        self.raise_compact_error()
+
+    def save_all(self, data: Dict[str, List[Dict[str, Any]]]):
+        """كتابة لقطة كاملة وحذف السجل (للاستعادة والاستيراد)."""
+        if self._compactor is not None:
+            self._compactor.join()
+        with self._lock:
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+            self.write_snapshot(data)
+            for path in (self.frozen_path, self.journal_path):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def close(self):
+        if self._compactor is not None:
+            self._compactor.join()
+        with self._lock:
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+
+
+class BinaryJournalStorage(JournalStorage):
+    """السجل الإلحاقي نفسه لكن مع لقطة ثنائية مضغوطة (snapshot.py) لبدء تشغيل أسرع."""
+
+    def read_snapshot(self) -> Dict[str, List[Dict[str, Any]]]:
+        if not os.path.exists(self.path):
+            return {name: [] for name in COLLECTIONS}
+        return snapshot.load(self.path)
+
+    def write_snapshot(self, data: Dict[str, List[Dict[str, Any]]]):
+        snapshot.dump(data, self.path)
+
+
+class ShardedStorage:
+    """
+    تخزين مقسم: كل مجموعة في ملف مستقل، والمبيعات والمصروفات في ملف لكل شهر.
+    التعديلات تضع علامة "متسخ" على الأجزاء التي تلمسها فقط، والحفظ يكتب هذه
+    الأجزاء وحدها (ملف مؤقت ثم إعادة تسمية).
+    """
+
+    MONTHLY = ('sales', 'expenses')
+
+    def __init__(self, directory: str, indent: Optional[int] = None):
+        self.directory = directory
+        self.indent = indent
+        self.shards: Dict[str, List[Dict[str, Any]]] = {}
+        self.shard_of: Dict[Tuple[str, str], str] = {}
+        self.dirty = set()
+
+    def exists(self) -> bool:
+        return os.path.isdir(self.directory)
+
+    def shard_key(self, collection: str, record: Dict[str, Any]) -> str:
+        """اسم الجزء الذي ينتمي إليه السجل، مثل sales/2024-12 أو inventory."""
+        if collection in self.MONTHLY:
+            month = str(record.get('date', ''))[:7]
+            return f"{collection}/{month if len(month) == 7 else 'undated'}"
+        return collection
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, *key.split('/')) + '.json'
+
+    def _keys_on_disk(self, collection: str) -> List[str]:
+        if collection not in self.MONTHLY:
+            return [collection] if os.path.exists(self._path(collection)) else []
+        folder = os.path.join(self.directory, collection)
+        if not os.path.isdir(folder):
+            return []
+        return [f"{collection}/{name[:-5]}" for name in sorted(os.listdir(folder)) if name.endswith('.json')]
+
+    def load(self) -> Dict[str, List[Dict[str, Any]]]:
+        """تحميل كل الأجزاء وبناء خريطة السجل إلى الجزء."""
+        data = {name: [] for name in COLLECTIONS}
+        self.shards.clear()
+        self.shard_of.clear()
+        self.dirty.clear()
+        for collection in COLLECTIONS:
+            for key in self._keys_on_disk(collection):
+                with open(self._path(key), 'r', encoding='utf-8') as f:
+                    records = [decode_record(collection, r) for r in json.load(f)]
+                self.shards[key] = records
+                for record in records:
+                    self.shard_of[(collection, record['id'])] = key
+                data[collection].extend(records)
+        return data
+
+    # --- تتبع الأجزاء المتسخة ---
+    def _remove(self, collection: str, record_id: str):
+        key = self.shard_of.pop((collection, record_id), None)
+        if key is None:
+            return
+        self.shards[key] = [r for r in self.shards[key] if r['id'] != record_id]
+        self.dirty.add(key)
+
+    def _place(self, collection: str, record: Dict[str, Any]):
+        key = self.shard_key(collection, record)
+        old_key = self.shard_of.get((collection, record['id']))
+        if old_key is not None and old_key != key:
+            self._remove(collection, record['id'])
+            old_key = None
+        shard = self.shards.setdefault(key, [])
+        if old_key is None:
+            shard.append(record)
+        else:
+            for i, existing in enumerate(shard):
+                if existing['id'] == record['id']:
+                    shard[i] = record
+                    break
+        self.shard_of[(collection, record['id'])] = key
+        self.dirty.add(key)
+
+    def flush(self):
+        """كتابة الأجزاء المتسخة فقط."""
+        for key in sorted(self.dirty):
+            collection = key.split('/')[0]
+            path = self._path(key)
+            records = self.shards.get(key)
+            if records:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                write_json_atomic(path, [encode_record(collection, r) for r in records], self.indent)
+            else:
+                self.shards.pop(key, None)
+                if os.path.exists(path):
+                    os.remove(path)
+        self.dirty.clear()
+
+    def commit(self, data: Dict[str, List[Dict[str, Any]]], changes: List[Change]):
+        """تعليم الأجزاء المتأثرة بالتغييرات ثم حفظها."""
+        for collection, action, payload in changes:
+            if action == 'delete':
+                self._remove(collection, payload)
+            else:
+                self._place(collection, payload)
+        self.flush()
+
+    def save_all(self, data: Dict[str, List[Dict[str, Any]]]):
+        """إعادة بناء كل الأجزاء من البيانات وحذف الأجزاء التي لم تعد مستخدمة."""
+        stale = {key for collection in COLLECTIONS for key in self._keys_on_disk(collection)}
+        self.shards.clear()
+        self.shard_of.clear()
+        for collection in COLLECTIONS:
+            for record in data.get(collection, []):
+                self._place(collection, record)
+        self.dirty |= stale
+        self.flush()
+
+    def close(self):
+        pass
+
+
+class SqliteStorage:
+    """
+    تخزين معاملاتي فوق sqlite3 بوضع WAL.
+    كل عملية تكتب الصفوف التي تغيرت فقط داخل معاملة واحدة.
+    """
+
+    # الأعمدة الأساسية لكل جدول؛ أي مفاتيح أخرى في السجل تحفظ في عمود extra كـ JSON
+    COLUMNS = {
+        'inventory': ('id', 'name', 'price', 'stock', 'description'),
+        'sales': ('id', 'date', 'customer', 'payment_method', 'total'),
+        'expenses': ('id', 'date', 'description', 'amount'),
+        'rentals': ('id', 'book_id', 'book_name', 'renter_name', 'rental_date', 'due_date', 'status', 'amount'),
+    }
+    ITEM_COLUMNS = ('id', 'name', 'price', 'quantity', 'total')
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS inventory (
+            id TEXT PRIMARY KEY, name TEXT NOT NULL, price TEXT NOT NULL,
+            stock INTEGER NOT NULL, description TEXT, extra TEXT
+        );
+        CREATE TABLE IF NOT EXISTS sales (
+            id TEXT PRIMARY KEY, date TEXT NOT NULL, customer TEXT,
+            payment_method TEXT, total TEXT NOT NULL, extra TEXT
+        );
+        CREATE TABLE IF NOT EXISTS sale_items (
+            sale_id TEXT NOT NULL REFERENCES sales(id) ON DELETE CASCADE,
+            position INTEGER NOT NULL, id TEXT, name TEXT, price TEXT NOT NULL,
+            quantity INTEGER NOT NULL, total TEXT NOT NULL, extra TEXT,
+            PRIMARY KEY (sale_id, position)
+        );
+        CREATE TABLE IF NOT EXISTS expenses (
+            id TEXT PRIMARY KEY, date TEXT NOT NULL, description TEXT,
+            amount TEXT NOT NULL, extra TEXT
+        );
+        CREATE TABLE IF NOT EXISTS rentals (
+            id TEXT PRIMARY KEY, book_id TEXT, book_name TEXT, renter_name TEXT,
+            rental_date TEXT, due_date TEXT, status TEXT, amount TEXT, extra TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_sales_date ON sales(date);
+        CREATE INDEX IF NOT EXISTS idx_expenses_date ON expenses(date);
+    """
+
+    def __init__(self, path: str, synchronous: str = 'FULL'):
+        self.path = path
+        is_new = not os.path.exists(path)
+        # يسمح باستخدام الاتصال من خيط الحفظ الخلفي (BackgroundStorage)؛ الكتابات تتم من خيط واحد
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        # FULL: كل معاملة مؤكدة تبقى بعد انقطاع الكهرباء. NORMAL أسرع في وضع WAL لكنه
+        # قد يفقد آخر المعاملات المؤكدة (مبيعات مسجلة) إذا انقطع التيار قبل نقطة التفتيش
+        if synchronous.upper() not in ('FULL', 'NORMAL', 'EXTRA'):
+            raise ValueError(f"قيمة synchronous غير معروفة: {synchronous}")
+        self.conn.execute(f"PRAGMA synchronous={synchronous.upper()}")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        self.conn.executescript(self.SCHEMA)
+        self.is_new = is_new
+
+    def exists(self) -> bool:
+        return not self.is_new
+
+    # --- التحويل بين السجلات والصفوف ---
+    @staticmethod
+    def _to_row(record: Dict[str, Any], columns, collection: str) -> tuple:
+        money = MONEY_FIELDS.get(collection, ())
+        values = []
+        for col in columns:
+            value = record.get(col)
+            if col in money:
+                value = str(Money.of(value))
+            elif col == 'description' and value is None:
+                value = ''
+            values.append(value)
+        extra = record.leftover(columns + ('items',))
+        values.append(json.dumps(extra, ensure_ascii=False, default=str) if extra else None)
+        return tuple(values)
+
+    @staticmethod
+    def _from_row(row: tuple, columns) -> Dict[str, Any]:
+        record = dict(zip(columns, row[:len(columns)]))
+        extra = row[len(columns)]
+        if extra:
+            record.update(json.loads(extra))
+        return record
+
+    def _upsert(self, collection: str, record: Dict[str, Any]):
+        columns = self.COLUMNS[collection]
+        placeholders = ", ".join("?" for _ in range(len(columns) + 1))
+        updates = ", ".join(f"{c}=excluded.{c}" for c in columns[1:] + ('extra',))
+        self.conn.execute(
+            f"INSERT INTO {collection} ({', '.join(columns)}, extra) VALUES ({placeholders}) "
+            f"ON CONFLICT(id) DO UPDATE SET {updates}",
+            self._to_row(record, columns, collection),
+        )
+        if collection == 'sales':
+            self._write_items(record)
+
+    def _write_items(self, sale: Dict[str, Any]):
+        self.conn.execute("DELETE FROM sale_items WHERE sale_id = ?", (sale['id'],))
+        self.conn.executemany(
+            f"INSERT INTO sale_items (sale_id, position, {', '.join(self.ITEM_COLUMNS)}, extra) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [(sale['id'], pos) + self._to_row(item, self.ITEM_COLUMNS, 'sale_items')
+             for pos, item in enumerate(sale.get('items', []))],
+        )
+
+    def _delete(self, collection: str, record_id: str):
+        self.conn.execute(f"DELETE FROM {collection} WHERE id = ?", (record_id,))
+
+    # --- الواجهة العامة ---
+    def load(self) -> Dict[str, List[Dict[str, Any]]]:
+        """تحميل كل الجداول بترتيب الإدخال."""
+        raw = {}
+        for collection in ('inventory', 'expenses', 'rentals'):
+            columns = self.COLUMNS[collection]
+            rows = self.conn.execute(f"SELECT {', '.join(columns)}, extra FROM {collection} ORDER BY rowid")
+            raw[collection] = [self._from_row(row, columns) for row in rows]
+
+        items_by_sale: Dict[str, List[Dict[str, Any]]] = {}
+        rows = self.conn.execute(
+            f"SELECT sale_id, {', '.join(self.ITEM_COLUMNS)}, extra FROM sale_items ORDER BY sale_id, position"
+        )
+        for row in rows:
+            items_by_sale.setdefault(row[0], []).append(self._from_row(row[1:], self.ITEM_COLUMNS))
+
+        columns = self.COLUMNS['sales']
+        raw['sales'] = []
+        for row in self.conn.execute(f"SELECT {', '.join(columns)}, extra FROM sales ORDER BY rowid"):
+            sale = self._from_row(row, columns)
+            sale['items'] = items_by_sale.get(sale['id'], [])
+            raw['sales'].append(sale)
+        return decode_data(raw)
+
+    def commit(self, data: Dict[str, List[Dict[str, Any]]], changes: List[Change]):
+        """كتابة السجلات المتغيرة فقط داخل معاملة واحدة."""
+        with self.conn:
+            for collection, action, payload in changes:
+                if action == 'delete':
+                    self._delete(collection, payload)
+                else:
+                    self._upsert(collection, payload)
+
+    def save_all(self, data: Dict[str, List[Dict[str, Any]]]):
+        """استبدال محتوى قاعدة البيانات بالكامل (للاستيراد والاستعادة)."""
+        with self.conn:
+            for collection in ('sale_items',) + COLLECTIONS:
+                self.conn.execute(f"DELETE FROM {collection}")
+            for collection in COLLECTIONS:
+                for record in data.get(collection, []):
+                    self._upsert(collection, record)
+
+    def close(self):
+        self.conn.close()
+
+
+class BackgroundStorage:
+    """
+    غلاف يحفظ في خيط خلفي حتى لا تتوقف الواجهة أثناء الكتابة.
+    التغييرات تنسخ عند الاستلام (في خيط الواجهة) ثم تدمج حسب المعرف خلال
+    نافذة زمنية، فعدة فواتير متتالية تنتج كتابة واحدة. الكتابات تنفذ بالترتيب
+    في خيط واحد، و close() ينتظر حتى تكتمل. الأخطاء ترسل إلى on_error
+    (من الخيط الخلفي، فعلى المستدعي تمريرها للواجهة عبر root.after).
+
+    إذا أعاد المحرك تغييرات كتبتها نسخة أخرى من البرنامج ترسل إلى
+    on_external(changes, deltas, seq) من الخيط الخلفي أيضاً، حيث deltas فرق
+    الرصيد لكل منتج. على الواجهة إضافة الفرق إلى رصيدها (لا استبداله) ثم
+    استدعاء absorbed(seq)؛ رصيد التغييرات التي التقطت قبل ذلك يصحح هنا.
+    """
+
+    def __init__(self, backend, on_error: Optional[Callable[[Exception], None]] = None, window: float = 1.0,
+                 on_external: Optional[Callable[[List[Change], Dict[str, int], int], None]] = None):
+        self.backend = backend
+        self.on_error = on_error
+        self.on_external = on_external
+        self.window = window
+        # نسخة البيانات الخاصة بالخيط الخلفي، فقط للمحركات التي تعيد كتابة كل شيء
+        self.mirror: Optional[Dict[str, List[Dict[str, Any]]]] = None
+        if getattr(backend, 'needs_full_data', False):
+            self.mirror = {name: [] for name in COLLECTIONS}
+        self.positions: Dict[str, Dict[str, int]] = {}
+        self.writes = 0
+        self.last_error: Optional[Exception] = None
+        self._failures = 0
+        # يبلغ on_error عند أول فشل فقط حتى تنجح كتابة، لا عند كل إعادة محاولة
+        self._failing = False
+        self._pending: Dict[Tuple[str, Any], Change] = {}
+        # فروق الرصيد من النسخ الأخرى: (seq، {المعرف: الفرق})، وآخر seq طبقته الواجهة،
+        # ولكل منتج معلق آخر seq كانت الواجهة قد طبقته عند التقاطه
+        self._external_seq = 0
+        self._absorbed = 0
+        self._deltas: List[Tuple[int, Dict[str, int]]] = []
+        self._views: Dict[Any, int] = {}
+        self._full: Optional[Dict[str, List[Dict[str, Any]]]] = None
+        self._first_at: Optional[float] = None
+        self._flush_requested = False
+        self._closing = False
+        self._busy = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="storage-writer", daemon=True)
+        self._thread.start()
+
+    def exists(self) -> bool:
+        return self.backend.exists()
+
+    def load(self) -> Dict[str, List[Dict[str, Any]]]:
+        """التحميل متزامن (قبل بدء أي كتابة)."""
+        data = self.backend.load()
+        if getattr(self.backend, 'needs_full_data', False):
+            self.mirror = copy_data(data)
+            self.positions = {}
+        return data
+
+    def commit(self, data: Dict[str, List[Dict[str, Any]]], changes: List[Change]):
+        """جدولة التغييرات للحفظ؛ يعود فوراً."""
+        copies = [(collection, action, payload if action == 'delete' else copy_record(payload))
+                  for collection, action, payload in changes]
+        with self._cond:
+            for change in copies:
+                collection, action, payload = change
+                key = (collection, payload if action == 'delete' else payload['id'])
+                self._pending[key] = change
+                if collection == 'inventory':
+                    self._views[payload if action == 'delete' else payload['id']] = self._absorbed
+            if self._first_at is None:
+                self._first_at = time.monotonic()
+            self._cond.notify_all()
+
+    def save_all(self, data: Dict[str, List[Dict[str, Any]]]):
+        """استبدال كل البيانات (الاستعادة)؛ يلغي التغييرات المعلقة ويكتب فوراً."""
+        snapshot_copy = copy_data(data)
+        with self._cond:
+            self._pending.clear()
+            self._views.clear()
+            self._full = snapshot_copy
+            self._first_at = time.monotonic() - self.window
+            self._cond.notify_all()
+
+    def flush(self):
+        """الانتظار حتى تكتب كل التغييرات المعلقة. يرفع آخر خطأ إذا فشلت الكتابة."""
+        with self._cond:
+            failures = self._failures
+            self._flush_requested = True
+            self._cond.notify_all()
+            while (self._pending or self._full is not None or self._busy) and self._failures == failures:
+                self._cond.wait()
+            self._flush_requested = False
+            if self._failures != failures:
+                raise self.last_error
+        if hasattr(self.backend, 'raise_compact_error'):
+            # دمج السجل يعمل في خيط المحرك نفسه، فخطؤه لا يمر بالكتابات هنا
+            self.backend.raise_compact_error()
+
+    def close(self, discard: bool = False):
+        """حفظ كل ما تبقى ثم إغلاق المحرك. مع discard=True تهمل التغييرات المعلقة (بعد فشل flush)."""
+        try:
+            if not discard:
+                self.flush()
+        finally:
+            with self._cond:
+                self._pending.clear()
+                self._views.clear()
+                self._full = None
+                self._closing = True
+                self._cond.notify_all()
+            self._thread.join()
+            self.backend.close()
+
+    def _next_batch(self):
+        with self._cond:
+            while True:
+                if self._closing and not self._pending and self._full is None:
+                    return None
+                if self._pending or self._full is not None:
+                    remaining = self._first_at + self.window - time.monotonic()
+                    if self._flush_requested or self._closing or remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                else:
+                    self._cond.wait()
+            full, changes = self._full, list(self._pending.values())
+            self._full, self._pending, self._first_at = None, {}, None
+            self._rebase(changes)
+            self._busy = True
+            return full, changes
+
+    def absorbed(self, seq: int):
+        """تبلغ الواجهة أنها أضافت فروق الرصيد حتى seq إلى بياناتها."""
+        with self._cond:
+            self._absorbed = max(self._absorbed, seq)
+            oldest = min([self._absorbed, *self._views.values()])
+            self._deltas = [entry for entry in self._deltas if entry[0] > oldest]
+
+    def _rebase(self, changes: List[Change]):
+        """
+        رصيد المنتج المعلق محسوب على بيانات الواجهة وقت الالتقاط؛ تضاف إليه فروق
+        النسخ الأخرى التي لم تكن الواجهة قد طبقتها بعد (تحت _cond).
+        """
+        views, self._views = self._views, {}
+        if not self._deltas:
+            return
+        for collection, action, payload in changes:
+            if collection == 'inventory' and action != 'delete':
+                seen = views.get(payload['id'], self._external_seq)
+                payload.stock += sum(delta.get(payload['id'], 0) for seq, delta in self._deltas if seq > seen)
+
+    def _emit(self, external: List[Change]):
+        """تطبيق تغييرات النسخ الأخرى على النسخة الخلفية وإرسالها إلى on_external."""
+        current = {r['id']: r['stock'] for r in self.mirror['inventory']}
+        deltas = {p['id']: p['stock'] - current[p['id']] for c, a, p in external
+                  if c == 'inventory' and a != 'delete' and p['id'] in current}
+        for change in external:
+            apply_change(self.mirror, change, self.positions)
+        with self._cond:
+            self._external_seq += 1
+            seq = self._external_seq
+            if deltas:
+                self._deltas.append((seq, deltas))
+        if self.on_external is not None:
+            self.on_external([(c, a, p if a == 'delete' else copy_record(p)) for c, a, p in external], deltas, seq)
+        else:
+            self.absorbed(seq)
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            full, changes = batch
+            try:
+                started = time.perf_counter()
+                if full is not None:
+                    self.backend.save_all(full)
+                    if self.mirror is not None:
+                        self.mirror, self.positions = full, {}
+                external, failed = None, None
+                if changes:
+                    if self.mirror is not None:
+                        for change in changes:
+                            apply_change(self.mirror, change, self.positions)
+                    try:
+                        external = self.backend.commit(self.mirror, changes)
+                    except StockConflict as conflict:
+                        # الباقي حفظ؛ الفواتير المرفوضة تحذف من الواجهة مع التغييرات الخارجية
+                        external, failed = conflict.changes, conflict
+                if external:
+                    self._emit(external)
+                self.writes += 1
+                metrics.timings.record('save', time.perf_counter() - started)
+                metrics.count('save_changes', len(changes))
+                report = failed is not None
+                self._failing = False
+            except Exception as e:
+                failed = e
+                with self._cond:
+                    # إعادة الدفعة الفاشلة للمحاولة لاحقاً دون تغطية تغييرات أحدث
+                    merged = {(c, p if a == 'delete' else p['id']): (c, a, p) for c, a, p in changes}
+                    merged.update(self._pending)
+                    self._pending = merged
+                    for collection, action, payload in changes:
+                        if collection == 'inventory':
+                            # الرصيد صحح مسبقاً حتى آخر فرق معروف
+                            self._views.setdefault(payload if action == 'delete' else payload['id'], self._external_seq)
+                    if self._full is None:
+                        self._full = full
+                    self._first_at = time.monotonic()
+                    self.last_error = e
+                    self._failures += 1
+                metrics.count('save_failed')
+                report = not self._failing
+                self._failing = True
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self._cond.notify_all()
+            if report and self.on_error is not None:
+                self.on_error(failed)
+
+
+def import_json(json_path: str, db_path: str) -> int:
+    """استيراد ملف JSON الحالي إلى قاعدة SQLite مرة واحدة. يعيد عدد الفواتير المستوردة."""
+    data = JsonStorage(json_path).load()
+    target = SqliteStorage(db_path)
+    try:
+        target.save_all(data)
+    finally:
+        target.close()
+    return len(data['sales'])
+
+
+def open_storage(data_file: str, backend: str = 'json', indent: Optional[int] = 4):
+    """
+    فتح طبقة التخزين المطلوبة لملف البيانات.
+    عند اختيار sqlite أو sharded لأول مرة يتم استيراد ملف JSON الموجود تلقائياً،
+    أما journal فيستخدم ملف JSON نفسه كلقطة أساسية، و binary يحوله مرة واحدة إلى لقطة ثنائية.
+    """
+    if backend == 'sqlite':
+        db_path = os.path.splitext(data_file)[0] + '.db'
+        if not os.path.exists(db_path) and os.path.exists(data_file):
+            import_json(data_file, db_path)
+        return SqliteStorage(db_path, synchronous=os.environ.get('BOOKBLISS_SQLITE_SYNC', 'FULL'))
+    if backend == 'sharded':
+        sharded = ShardedStorage(os.path.splitext(data_file)[0] + '_shards')
+        if not sharded.exists() and os.path.exists(data_file):
+            sharded.save_all(JsonStorage(data_file).load())
+        return sharded
+    if backend == 'binary':
+        snapshot_path = os.path.splitext(data_file)[0] + '.bbs'
+        if not os.path.exists(snapshot_path) and os.path.exists(data_file):
+            snapshot.json_to_snapshot(data_file, snapshot_path)
+        return BinaryJournalStorage(snapshot_path)
+    if backend == 'journal':
+        return JournalStorage(data_file, indent=indent)
+    if backend == 'json':
+        return JsonStorage(data_file, indent=indent)
+    raise ValueError(f"نوع تخزين غير معروف: {backend}")
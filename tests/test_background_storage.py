@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+دمج عمليات الحفظ في الخيط الخلفي (BackgroundStorage)
+Write coalescing in BackgroundStorage
+"""
+
+import json
+
+from money import Money
+from records import Expense, Product
+from storage import BackgroundStorage, JsonStorage
+
+
+class RecordingStorage(JsonStorage):
+    """JsonStorage يسجل كل دفعة تصله من الخيط الخلفي."""
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.batches = []
+
+    def commit(self, data, changes):
+        self.batches.append([(c, a, p if a == 'delete' else p.copy()) for c, a, p in changes])
+        return super().commit(data, changes)
+
+
+def open_background(tmp_path, window):
+    backend = RecordingStorage(str(tmp_path / 'data.json'))
+    background = BackgroundStorage(backend, window=window)
+    return backend, background, background.load()
+
+
+def test_commits_in_window_are_written_once(tmp_path):
+    backend, background, data = open_background(tmp_path, window=60)
+    product = Product(id='p1', name='كتاب', price=Money.of('10'), stock=50, description='')
+    data['inventory'].append(product)
+    background.commit(data, [('inventory', 'upsert', product)])
+    for i in range(20):
+        product.stock -= 1
+        expense = Expense(id=f"e{i}", date='2024-01-01 10:00:00', description='شحن', amount=Money.of(i + 1))
+        data['expenses'].append(expense)
+        background.commit(data, [('inventory', 'upsert', product), ('expenses', 'upsert', expense)])
+    background.flush()
+
+    assert background.writes == 1
+    assert len(backend.batches) == 1
+    (batch,) = backend.batches
+    # المنتج نفسه مرة واحدة بآخر رصيد، وكل مصروف مرة واحدة
+    products = [p for c, a, p in batch if c == 'inventory']
+    assert [p.stock for p in products] == [30]
+    assert len([p for c, a, p in batch if c == 'expenses']) == 20
+    background.close()
+
+    with open(backend.path, 'r', encoding='utf-8') as f:
+        raw = json.load(f)
+    assert raw['inventory'][0]['stock'] == 30
+    assert len(raw['expenses']) == 20
+
+
+def test_commit_copies_records(tmp_path):
+    backend, background, data = open_background(tmp_path, window=60)
+    product = Product(id='p1', name='كتاب', price=Money.of('10'), stock=5, description='')
+    data['inventory'].append(product)
+    background.commit(data, [('inventory', 'upsert', product)])
+    # تعديل بعد commit دون commit جديد لا يصل إلى الملف
+    product.stock = 0
+    background.flush()
+    assert backend.batches[0][0][2].stock == 5
+    background.close()
+
+
+def test_delete_replaces_pending_upsert(tmp_path):
+    backend, background, data = open_background(tmp_path, window=60)
+    product = Product(id='p1', name='كتاب', price=Money.of('10'), stock=5, description='')
+    data['inventory'].append(product)
+    background.commit(data, [('inventory', 'upsert', product)])
+    data['inventory'].remove(product)
+    background.commit(data, [('inventory', 'delete', 'p1')])
+    background.close()
+
+    assert backend.batches == [[('inventory', 'delete', 'p1')]]
+    with open(backend.path, 'r', encoding='utf-8') as f:
+        assert json.load(f)['inventory'] == []
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+البيع والإعارة عند نقص المخزون
+Checkout and rentals against the current stock
+"""
+
+import pytest
+
+from core import Cart, CoreError, Store
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = Store(str(tmp_path / 'data.json'))
+    store.load()
+    store.save_product('كتاب', '10', 3)
+    store.save_product('دفتر', '2', 10)
+    yield store
+    store.close()
+
+
+def fill(store, *lines):
+    cart = Cart()
+    for name, quantity in lines:
+        cart.add(store.index.product_named(name), quantity)
+    return cart
+
+
+def test_checkout_rechecks_stock(store):
+    cart = fill(store, ('دفتر', 2), ('كتاب', 3))
+    # المخزون عدل بعد الإضافة إلى السلة
+    book = store.index.product_named('كتاب')
+    store.save_product('كتاب', '10', 1, product=book)
+    with pytest.raises(CoreError, match='كتاب'):
+        store.checkout(cart)
+    assert store.data['sales'] == []
+    assert book.stock == 1
+    assert store.index.product_named('دفتر').stock == 10
+    assert len(cart) == 2
+
+
+def test_checkout_of_deleted_product(store):
+    cart = fill(store, ('كتاب', 1))
+    store.delete_product(store.index.product_named('كتاب')['id'])
+    with pytest.raises(CoreError, match='لم يعد موجوداً'):
+        store.checkout(cart)
+    assert store.data['sales'] == []
+
+
+def test_rental_needs_a_copy_in_stock(store):
+    book = store.index.product_named('كتاب')
+    store.save_product('كتاب', '10', 0, product=book)
+    with pytest.raises(CoreError, match='كتاب'):
+        store.add_rental('كتاب', 'سارة', 7)
+    assert store.data['rentals'] == []
+    assert book.stock == 0
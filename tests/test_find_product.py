@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+"""
+البحث عن المنتج عند الإضافة إلى السلة
+Resolving the product typed by the cashier
+"""
+
+import pytest
+
+from core import Store
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = Store(str(tmp_path / 'data.json'))
+    store.load()
+    store.save_product('مئة عام من العزلة', '40', 5)
+    store.save_product('الأمير الصغير', '25', 5, barcode='9780156012195')
+    yield store
+    store.close()
+
+
+def test_exact_name_and_barcode_resolve(store):
+    assert store.find_product('  الأمير   الصغير ')['name'] == 'الأمير الصغير'
+    # توحيد الهمزة والتشكيل يبقى تطابقاً تاماً
+    assert store.find_product('الامير الصَّغير')['name'] == 'الأمير الصغير'
+    assert store.find_product('9780156012195')['name'] == 'الأمير الصغير'
+
+
+@pytest.mark.parametrize('text', ['عزلة', 'امير صغ', 'الأمير الصغيرة'])
+def test_partial_or_similar_name_is_not_picked(store, text):
+    assert store.find_product(text) is None
+    # لكنه يظهر في الاقتراحات ليختاره البائع
+    assert store.index.finder.find(text)
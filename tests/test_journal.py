@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""
+إعادة تشغيل السجل الإلحاقي بعد انقطاع البرنامج
+Journal replay after a crash
+"""
+
+import multiprocessing
+import os
+
+import pytest
+
+from core import Cart, Store
+from money import Money
+from records import Expense
+from storage import BackgroundStorage, JournalStorage
+
+
+def sell_then_crash(path, sales):
+    """عملية تبيع ثم تنقطع أثناء كتابة سطر في السجل (دون close)."""
+    store = Store(path, backend='journal')
+    store.load()
+    product = store.index.product_named('كتاب')
+    for _ in range(sales):
+        cart = Cart()
+        cart.add(product, 1)
+        store.checkout(cart)
+    with open(path + '.journal', 'a', encoding='utf-8') as f:
+        f.write('{"collection": "sales", "op": "upsert", "record": {"id": "torn"')
+    os._exit(1)
+
+
+def make_store(path):
+    store = Store(path, backend='journal')
+    store.load()
+    store.save_product('كتاب', '10', 20)
+    store.close()
+
+
+def test_replay_after_crash_ignores_torn_line(tmp_path):
+    path = str(tmp_path / 'data.json')
+    make_store(path)
+    process = multiprocessing.get_context('spawn').Process(target=sell_then_crash, args=(path, 3))
+    process.start()
+    process.join(30)
+    assert process.exitcode == 1
+
+    store = Store(path, backend='journal')
+    store.load()
+    assert store.load_error is None
+    assert len(store.data['sales']) == 3
+    assert 'torn' not in store.index.by_id['sales']
+    assert store.index.product_named('كتاب').stock == 17
+    assert store.rollups.all_time.sales_total == 30
+    store.close()
+
+
+def test_replay_of_interrupted_compaction(tmp_path):
+    path = str(tmp_path / 'data.json')
+    make_store(path)
+    store = Store(path, backend='journal')
+    store.load()
+    for quantity in (1, 2):
+        cart = Cart()
+        cart.add(store.index.product_named('كتاب'), quantity)
+        store.checkout(cart)
+    store.close()
+    # الدمج جمد السجل ثم انقطع البرنامج قبل كتابة اللقطة
+    os.replace(path + '.journal', path + '.journal.1')
+    store = Store(path, backend='journal')
+    store.load()
+    cart = Cart()
+    cart.add(store.index.product_named('كتاب'), 4)
+    store.checkout(cart)
+    store.close()
+
+    data = JournalStorage(path).load()
+    assert len(data['sales']) == 3
+    assert data['inventory'][0].stock == 13
+
+    # الدمج التالي يكمل السجل المجمد أولاً
+    backend = JournalStorage(path)
+    backend.compact(wait=True)
+    backend.compact(wait=True)
+    assert not os.path.exists(path + '.journal.1')
+    assert not os.path.exists(path + '.journal')
+    data = JournalStorage(path).load()
+    assert len(data['sales']) == 3
+    assert data['inventory'][0].stock == 13
+
+
+class DiskFull(JournalStorage):
+    """كتابة اللقطة تفشل (امتلاء القرص) حتى يسمح بها."""
+
+    full = True
+
+    def write_snapshot(self, data):
+        if self.full:
+            raise OSError(28, "No space left on device")
+        super().write_snapshot(data)
+
+
+def expense(number):
+    return Expense(id=f"e{number}", date='2024-01-01 10:00:00', description='شحن', amount=Money.of(number))
+
+
+def test_failed_compaction_is_raised_on_next_commit(tmp_path):
+    path = str(tmp_path / 'data.json')
+    backend = DiskFull(path, compact_threshold=1)
+    data = backend.load()
+    backend.commit(data, [('expenses', 'upsert', expense(1))])
+    backend._compactor.join()
+
+    # الخطأ يرفع مرة واحدة قبل كتابة أي شيء
+    with pytest.raises(OSError):
+        backend.commit(data, [('expenses', 'upsert', expense(2))])
+    backend.compact_threshold = 1024 * 1024
+    backend.commit(data, [('expenses', 'upsert', expense(2))])
+    backend.flush()
+    assert os.path.exists(path + '.journal.1')
+    assert [e.id for e in JournalStorage(path).load()['expenses']] == ['e1', 'e2']
+
+    backend.full = False
+    backend.compact(wait=True)
+    backend.close()
+    assert not os.path.exists(path + '.journal.1')
+    assert [e.id for e in JournalStorage(path).read_snapshot()['expenses']] == ['e1']
+
+
+def test_background_flush_reports_failed_compaction(tmp_path):
+    backend = DiskFull(str(tmp_path / 'data.json'), compact_threshold=1)
+    data = backend.load()
+    backend.commit(data, [('expenses', 'upsert', expense(1))])
+    backend._compactor.join()
+    backend.compact_threshold = 1024 * 1024
+
+    # لا تغييرات معلقة، لكن flush يبلغ عن الدمج الفاشل
+    background = BackgroundStorage(backend, window=0)
+    with pytest.raises(OSError):
+        background.flush()
+    background.commit(data, [('expenses', 'upsert', expense(2))])
+    background.close()
+    assert [e.id for e in JournalStorage(backend.path).load()['expenses']] == ['e1', 'e2']
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""
+دمج الحفظ بين نسختين من البرنامج على نفس ملف JSON
+Merging commits from two processes sharing one JSON data file
+"""
+
+import json
+import multiprocessing
+import uuid
+
+import pytest
+
+from core import Cart, CoreError, Store, now_text
+from money import Money
+from records import Expense, Sale
+from storage import StockConflict
+
+
+def read_raw(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def stock_on_disk(path, name):
+    return next(p['stock'] for p in read_raw(path)['inventory'] if p['name'] == name)
+
+
+def sell(store, *lines):
+    cart = Cart()
+    for name, quantity in lines:
+        cart.add(store.index.product_named(name), quantity)
+    return store.checkout(cart)
+
+
+def sale_record(store, *lines):
+    cart = Cart()
+    for name, quantity in lines:
+        cart.add(store.index.product_named(name), quantity)
+    return Sale(id=str(uuid.uuid4()), date=now_text(), customer="عميل", payment_method="نقدي",
+                items=list(cart), total=cart.total)
+
+
+def sell_in_child(path, name, quantity):
+    """بيع في عملية مستقلة (نسخة أخرى من البرنامج)."""
+    store = Store(path)
+    store.load()
+    sell(store, (name, quantity))
+    store.close()
+
+
+def run_child(*args):
+    process = multiprocessing.get_context('spawn').Process(target=sell_in_child, args=args)
+    process.start()
+    process.join(30)
+    assert process.exitcode == 0
+
+
+@pytest.fixture
+def data_file(tmp_path):
+    path = str(tmp_path / 'data.json')
+    store = Store(path)
+    store.load()
+    store.save_product('كتاب', '10', 1)
+    store.save_product('دفتر', '2', 10)
+    store.close()
+    return path
+
+
+def test_oversell_from_another_process_is_rejected(data_file):
+    store = Store(data_file)
+    store.load()
+    # عملية أخرى تبيع آخر نسخة بعد أن حملنا الملف
+    run_child(data_file, 'كتاب', 1)
+
+    cart = Cart()
+    cart.add(store.index.product_named('كتاب'), 1)
+    cart.add(store.index.product_named('دفتر'), 2)
+    with pytest.raises(CoreError, match='كتاب'):
+        store.checkout(cart)
+
+    raw = read_raw(data_file)
+    assert len(raw['sales']) == 1
+    assert stock_on_disk(data_file, 'كتاب') == 0
+    assert stock_on_disk(data_file, 'دفتر') == 10
+    # البيانات المحلية تتبع الملف، والسلة تبقى ليعدلها البائع
+    assert [s.id for s in store.data['sales']] == [s['id'] for s in raw['sales']]
+    assert store.index.product_named('كتاب').stock == 0
+    assert store.index.product_named('دفتر').stock == 10
+    assert store.rollups.all_time.sales_total == sum(s.total for s in store.data['sales'])
+    assert len(cart) == 2
+    store.close()
+
+
+def test_other_changes_in_the_batch_are_kept(data_file):
+    first, second = Store(data_file), Store(data_file)
+    first.load()
+    second.load()
+    sell(first, ('كتاب', 1))
+    # دفعة واحدة: فاتورة ترفض ومصروف وفاتورة أخرى تحفظان
+    changes = second.record_sale(sale_record(second, ('كتاب', 1)))
+    changes += second.record_sale(sale_record(second, ('دفتر', 3)))
+    expense = Expense(id=str(uuid.uuid4()), date=now_text(), description='إيجار', amount=Money.of('50'))
+    second.index.insert('expenses', expense)
+    changes.append(('expenses', 'upsert', expense))
+    with pytest.raises(CoreError):
+        second.commit(changes)
+
+    raw = read_raw(data_file)
+    assert len(raw['sales']) == 2
+    assert len(raw['expenses']) == 1
+    assert stock_on_disk(data_file, 'كتاب') == 0
+    assert stock_on_disk(data_file, 'دفتر') == 7
+    assert {s['id'] for s in raw['sales']} == {s.id for s in second.data['sales']}
+
+
+def test_background_oversell_is_reported_and_rolled_back(data_file):
+    errors = []
+    store = Store(data_file, background=True, on_error=errors.append, save_window=0)
+    store.load()
+    run_child(data_file, 'كتاب', 1)
+
+    sell(store, ('كتاب', 1))
+    store.flush()
+    assert [type(e) for e in errors] == [StockConflict]
+    assert store.poll()
+    assert len(store.data['sales']) == 1
+    assert store.index.product_named('كتاب').stock == 0
+    store.close()
+    assert len(read_raw(data_file)['sales']) == 1
+    assert stock_on_disk(data_file, 'كتاب') == 0
+
+
+def test_concurrent_sales_within_stock_merge(data_file):
+    store = Store(data_file)
+    store.load()
+    run_child(data_file, 'دفتر', 4)
+    sell(store, ('دفتر', 5))
+    assert stock_on_disk(data_file, 'دفتر') == 1
+    assert len(read_raw(data_file)['sales']) == 2
+    assert store.index.product_named('دفتر').stock == 1
+    store.close()
+
+
+def sell_many(path, worker, sales, background):
+    store = Store(path, background=background, save_window=0.02)
+    store.load()
+    for i in range(sales):
+        store.poll()
+        sell(store, ('دفتر', 1))
+        if i % 5 == 0:
+            store.add_expense(f"عامل {worker} - {i}", '1')
+    store.flush()
+    store.close()
+
+
+@pytest.mark.parametrize('background', [False, True])
+def test_parallel_processes_lose_nothing(tmp_path, background):
+    path = str(tmp_path / 'data.json')
+    store = Store(path)
+    store.load()
+    store.save_product('دفتر', '2', 1000)
+    store.close()
+    context = multiprocessing.get_context('spawn')
+    workers = [context.Process(target=sell_many, args=(path, n, 40, background)) for n in range(3)]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join(60)
+        assert process.exitcode == 0
+
+    raw = read_raw(path)
+    assert len(raw['sales']) == 120
+    assert len(raw['expenses']) == 24
+    assert stock_on_disk(path, 'دفتر') == 880
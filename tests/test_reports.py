@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""
+تقارير سطر الأوامر وتصديره لفترات تشمل أشهراً مؤرشفة
+CLI reports and exports over ranges that include archived months
+"""
+
+import csv
+import uuid
+from datetime import datetime
+
+import pytest
+
+import cli
+from core import Cart, Store
+from money import Money
+from records import Expense, Sale
+
+SALES = [('2024-01-10 10:00:00', 1), ('2024-02-05 10:00:00', 2), ('2024-02-20 10:00:00', 3),
+         ('2024-03-15 10:00:00', 4)]
+
+
+@pytest.fixture
+def data_file(tmp_path):
+    path = str(tmp_path / 'data.json')
+    store = Store(path)
+    store.load()
+    book = store.save_product('كتاب', '10', 100)
+    for date, quantity in SALES:
+        cart = Cart()
+        cart.add(book, quantity)
+        sale = Sale(id=str(uuid.uuid4()), date=date, customer="عميل", payment_method="نقدي",
+                    items=list(cart), total=cart.total)
+        store.commit(store.record_sale(sale))
+    for date, amount in (('2024-02-10 09:00:00', '7'), ('2024-03-01 09:00:00', '5')):
+        expense = Expense(id=str(uuid.uuid4()), date=date, description='شحن', amount=Money.of(amount))
+        store.index.insert('expenses', expense)
+        store.commit([('expenses', 'upsert', expense)])
+    # يناير وفبراير في الأرشيف، ومارس في البيانات الحالية
+    assert store.archive_closed(datetime(2024, 3, 1)) == 4
+    store.close()
+    return path
+
+
+def report(data_file, capsys, *options):
+    assert cli.main(['--data', data_file, 'report', *options]) == 0
+    return capsys.readouterr().out
+
+
+def test_report_includes_whole_archived_month(data_file, capsys):
+    out = report(data_file, capsys, '--from', '2024-02-01', '--to', '2024-03-31')
+    assert "المبيعات: 90.00 (3 فاتورة)" in out
+    assert "المصروفات: 12.00" in out
+    assert "كتاب: 9" in out
+
+
+def test_report_cuts_archived_month_at_range_start(data_file, capsys):
+    out = report(data_file, capsys, '--from', '2024-02-10', '--to', '2024-03-31')
+    assert "المبيعات: 70.00 (2 فاتورة)" in out
+    assert "نقدي: 70.00" in out
+    assert "كتاب: 7" in out
+
+
+def test_export_includes_archived_rows(data_file, tmp_path):
+    output = str(tmp_path / 'sales.csv')
+    assert cli.main(['--data', data_file, 'export', 'sales', output, '--from', '2024-01-15']) == 0
+    with open(output, 'r', newline='', encoding='utf-8-sig') as f:
+        rows = list(csv.reader(f))[1:]
+    assert [row[1] for row in rows] == [date for date, _ in SALES[1:]]
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+جهاز بيع متصل بالخادم عبر RemoteStore
+A POS terminal talking to server.py
+"""
+
+import threading
+
+import pytest
+
+from client import RemoteStore
+from core import Cart, Store
+from server import StoreServer, StoreService
+
+
+class Running:
+    """خادم في خيط على منفذ عشوائي فوق ملف بيانات."""
+
+    def __init__(self, path, port=0):
+        self.store = Store(path)
+        self.store.load()
+        self.server = StoreServer(StoreService(self.store), '127.0.0.1', port)
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.store.close()
+
+
+@pytest.fixture
+def data_file(tmp_path):
+    path = str(tmp_path / 'data.json')
+    store = Store(path)
+    store.load()
+    store.save_product('كتاب', '10', 20)
+    store.save_product('دفتر', '2', 10)
+    store.close()
+    return path
+
+
+def sell(terminal, name, quantity):
+    cart = Cart()
+    cart.add(terminal.index.product_named(name), quantity)
+    return terminal.checkout(cart)
+
+
+def test_checkout_returns_the_sale(data_file):
+    server = Running(data_file)
+    terminal = RemoteStore(f"http://127.0.0.1:{server.port}")
+    terminal.load()
+    sale = sell(terminal, 'كتاب', 2)
+    assert sale['items'][0]['quantity'] == 2
+    assert terminal.index.product_named('كتاب').stock == 18
+    terminal.close()
+    server.stop()
+
+
+def test_terminal_follows_a_restarted_server(data_file):
+    server = Running(data_file)
+    port = server.port
+    terminal = RemoteStore(f"http://127.0.0.1:{port}")
+    terminal.load()
+    # الجهاز يتقدم في التسلسل ثم يعاد تشغيل الخادم من الصفر
+    for _ in range(3):
+        sell(terminal, 'دفتر', 1)
+    server.stop()
+    server = Running(data_file, port)
+
+    # جهاز آخر يتجاوز رقم الجهاز الأول في التشغيل الجديد
+    other = RemoteStore(f"http://127.0.0.1:{port}")
+    other.load()
+    for _ in range(4):
+        sell(other, 'كتاب', 1)
+    other.close()
+
+    sale = sell(terminal, 'كتاب', 1)
+    assert sale['id'] in terminal.index.by_id['sales']
+    assert len(terminal.data['sales']) == 8
+    assert terminal.index.product_named('كتاب').stock == 15
+    assert terminal.index.product_named('دفتر').stock == 7
+    terminal.close()
+    server.stop()
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+جدول افتراضي يعرض الصفوف الظاهرة فقط
+Virtualized, paged view over ttk.Treeview
+"""
+
+import tkinter as tk
+from tkinter import ttk
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+
+class VirtualTree:
+    """
+    جدول فوق ttk.Treeview لا ينشئ إلا صفوف الصفحة الظاهرة، ويعيد ملأها
+    عند التمرير. زمن الفتح لا يعتمد على عدد السجلات.
+
+    rows: أي تسلسل يدعم len() والفهرسة (قائمة أو عرض من TimeIndex).
+    row_values(record) تعيد قيم الأعمدة، وrow_tags(record) تعيد وسوم الصف.
+    التحديد يحفظ بمعرف السجل، لذلك يبقى بعد التمرير وإعادة التحميل.
+    """
+
+    def __init__(self, parent, columns: Tuple[str, ...], row_values: Callable[[Dict[str, Any]], tuple],
+                 width: int = 150, height: int = 15,
+                 row_tags: Optional[Callable[[Dict[str, Any]], tuple]] = None):
+        self.row_values = row_values
+        self.row_tags = row_tags
+        self.rows: Sequence[Dict[str, Any]] = []
+        self.offset = 0
+        self.page = height
+        self.selected: Set[str] = set()
+        # معرف السجل المعروض في كل صف ظاهر
+        self.visible_ids: List[str] = []
+        self._rendering = False
+
+        self.tree = ttk.Treeview(parent, columns=columns, show='headings', height=height)
+        for col in columns:
+            self.tree.heading(col, text=col)
+            self.tree.column(col, width=width, anchor='center')
+        self.scrollbar = ttk.Scrollbar(parent, orient=tk.VERTICAL, command=self.yview)
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+        self.tree.bind('<<TreeviewSelect>>', self._on_select)
+        self.tree.bind('<Configure>', self._on_resize)
+        self.tree.bind('<MouseWheel>', lambda e: self.scroll(-3 if e.delta > 0 else 3))
+        self.tree.bind('<Button-4>', lambda e: self.scroll(-3))
+        self.tree.bind('<Button-5>', lambda e: self.scroll(3))
+        self.tree.bind('<Up>', lambda e: self._move_selection(-1))
+        self.tree.bind('<Down>', lambda e: self._move_selection(1))
+        self.tree.bind('<Prior>', lambda e: self._move_selection(-self.page))
+        self.tree.bind('<Next>', lambda e: self._move_selection(self.page))
+        self.tree.bind('<Home>', lambda e: self._move_selection(-len(self.rows)))
+        self.tree.bind('<End>', lambda e: self._move_selection(len(self.rows)))
+
+    # --- البيانات ---
+    def set_rows(self, rows: Sequence[Dict[str, Any]], keep_position: bool = False):
+        """استبدال السجلات المعروضة. التحديد يبقى للسجلات التي ما زالت موجودة."""
+        self.rows = rows
+        if not keep_position:
+            self.offset = 0
+        self._render()
+
+    def refresh(self):
+        """إعادة رسم الصفحة الحالية بعد تعديل السجلات."""
+        self._render()
+
+    def selection(self) -> List[str]:
+        """معرفات السجلات المحددة (بما فيها غير الظاهرة حالياً)."""
+        visible = [rid for rid in self.visible_ids if rid in self.selected]
+        return visible + [rid for rid in self.selected if rid not in self.visible_ids]
+
+    def clear_selection(self):
+        self.selected.clear()
+        self._render()
+
+    # --- التمرير ---
+    def scroll(self, rows: int):
+        self._scroll_to(self.offset + rows)
+        return 'break'
+
+    def yview(self, *args):
+        """واجهة أمر شريط التمرير (moveto / scroll)."""
+        if not args:
+            return
+        if args[0] == 'moveto':
+            self._scroll_to(int(float(args[1]) * len(self.rows)))
+        elif args[0] == 'scroll':
+            step = self.page if args[2] == 'pages' else 1
+            self._scroll_to(self.offset + int(args[1]) * step)
+
+    def _scroll_to(self, offset: int):
+        offset = max(0, min(offset, len(self.rows) - self.page))
+        if offset != self.offset:
+            self.offset = offset
+            self._render()
+
+    def _move_selection(self, step: int):
+        total = len(self.rows)
+        if not total:
+            return 'break'
+        current = self.tree.focus()
+        index = self.offset + int(current[1:]) if current.startswith('r') else self.offset - (1 if step > 0 else 0)
+        index = max(0, min(index + step, total - 1))
+        if index < self.offset:
+            self.offset = index
+        elif index >= self.offset + self.page:
+            self.offset = index - self.page + 1
+        self.selected = {self.rows[index]['id']}
+        self._render()
+        self.tree.focus(f"r{index - self.offset}")
+        return 'break'
+
+    # --- الرسم ---
+    def _render(self):
+        total = len(self.rows)
+        self.offset = max(0, min(self.offset, total - self.page))
+        end = min(total, self.offset + self.page)
+        tree = self.tree
+        self._rendering = True
+        try:
+            # الصفوف الظاهرة لها معرفات ثابتة (r0, r1, ...) تعدل قيمها في مكانها
+            self.visible_ids = []
+            shown = []
+            for slot, index in enumerate(range(self.offset, end)):
+                record = self.rows[index]
+                iid = f"r{slot}"
+                tags = self.row_tags(record) if self.row_tags else ()
+                if tree.exists(iid):
+                    tree.item(iid, values=self.row_values(record), tags=tags)
+                else:
+                    tree.insert('', 'end', iid=iid, values=self.row_values(record), tags=tags)
+                self.visible_ids.append(record['id'])
+                if record['id'] in self.selected:
+                    shown.append(iid)
+            for slot in range(end - self.offset, len(tree.get_children())):
+                tree.delete(f"r{slot}")
+            tree.selection_set(shown)
+        finally:
+            self._rendering = False
+        if total:
+            self.scrollbar.set(self.offset / total, end / total)
+        else:
+            self.scrollbar.set(0, 1)
+
+    def _on_select(self, event=None):
+        if self._rendering:
+            return
+        chosen = {self.visible_ids[int(iid[1:])] for iid in self.tree.selection() if int(iid[1:]) < len(self.visible_ids)}
+        # تحديد النقر يستبدل التحديد السابق كما في Treeview العادي
+        if chosen != self.selected & set(self.visible_ids):
+            self.selected = chosen
+
+    def _on_resize(self, event=None):
+        children = self.tree.get_children()
+        if not children:
+            return
+        bbox = self.tree.bbox(children[0])
+        if not bbox:
+            return
+        page = max(1, (self.tree.winfo_height() - bbox[1]) // bbox[3])
+        if page != self.page:
+            self.page = page
+            self._render()